@@ -1,8 +1,10 @@
+import os
 import pandas as pd
-from metapub import PubMedFetcher
 import time
 from pathlib import Path
 import re
+from scripts.mesh_lists import decode_mesh_list, encode_mesh_list, mesh_lists_to_parquet
+from scripts.eutils_client import EUtilsFetcher
 
 def extract_pmid_from_doi(doi):
     """
@@ -15,7 +17,8 @@ def extract_pmid_from_doi(doi):
 def get_mesh_terms(fetch, title, author=None, doi=None, max_retries=3):
     """
     Retrieve MeSH terms for a paper by searching PubMed
-    Returns a tuple of (mesh_terms_string, mesh_ids_string)
+    Returns a tuple of (mesh_terms, mesh_ids) lists, kept as lists because
+    many MeSH headings contain commas
     """
     for attempt in range(max_retries):
         try:
@@ -75,10 +78,10 @@ def get_mesh_terms(fetch, title, author=None, doi=None, max_retries=3):
                                             #     mesh_terms.append(term)
                                         
                                         if mesh_terms:
-                                            return (', '.join(mesh_terms), ', '.join(mesh_ids))
+                                            return (mesh_terms, mesh_ids)
             
-            # If no results, return empty strings
-            return ('', '')
+            # If no results, return empty lists
+            return ([], [])
             
         except Exception as e:
             if attempt < max_retries - 1:
@@ -86,14 +89,33 @@ def get_mesh_terms(fetch, title, author=None, doi=None, max_retries=3):
                 continue
             else:
                 print(f"Error retrieving MeSH terms for '{title[:50]}...': {str(e)}")
-                return ('', '')
+                return ([], [])
     
-    return ('', '')
+    return ([], [])
+
+def make_fetcher(base_url=None):
+    """
+    PubMed fetcher for get_mesh_terms
+
+    metapub's PubMedFetcher talks to NCBI; with a base_url (or the
+    EUTILS_BASE_URL environment variable) the E-utilities client from
+    scripts/eutils_client.py is used instead, e.g. against the local
+    stand-in server in benchmarks/fake_eutils_server.py.
+    """
+    base_url = base_url or os.environ.get("EUTILS_BASE_URL")
+    if base_url:
+        return EUtilsFetcher(base_url)
+    from metapub import PubMedFetcher
+    return PubMedFetcher()
 
 def process_csv_with_mesh(input_file, output_file=None, errors_file=None, 
-                          start_row=0, end_row=None, checkpoint_frequency=100):
+                          start_row=0, end_row=None, checkpoint_frequency=100, parquet_file=None,
+                          base_url=None, request_interval=0.35):
     """
     Process CSV file and add MeSH terms
+
+    MESH and MESH_ID are stored as JSON arrays (e.g. ["Behavior, Animal"]),
+    so headings containing commas stay intact.
     
     Parameters:
     -----------
@@ -109,6 +131,12 @@ def process_csv_with_mesh(input_file, output_file=None, errors_file=None,
         Row to end processing at (useful for testing on subset)
     checkpoint_frequency : int
         Save progress every N rows
+    parquet_file : str or Path, optional
+        Also write the final table to Parquet, with MESH and MESH_ID as list columns
+    base_url : str, optional
+        E-utilities base URL to query instead of NCBI (see make_fetcher)
+    request_interval : float
+        Seconds to wait after each paper
     """
     
     # Read the CSV file
@@ -125,7 +153,9 @@ def process_csv_with_mesh(input_file, output_file=None, errors_file=None,
         df['MESH_ID'] = ''
     
     # Initialize PubMed fetcher
-    fetch = PubMedFetcher()
+    fetch = make_fetcher(base_url)
+    # EUtilsFetcher retries rate limits and server errors per request itself
+    paper_retries = 1 if isinstance(fetch, EUtilsFetcher) else 3
     
     # Determine output file names
     if output_file is None:
@@ -155,7 +185,7 @@ def process_csv_with_mesh(input_file, output_file=None, errors_file=None,
     
     for idx in range(start_row, end_row):
         # Skip if already has MeSH terms (in case of resuming)
-        if pd.notna(df.loc[idx, 'MESH']) and df.loc[idx, 'MESH'].strip():
+        if decode_mesh_list(df.loc[idx, 'MESH']):
             processed_count += 1
             found_mesh_count += 1
             continue
@@ -165,9 +195,9 @@ def process_csv_with_mesh(input_file, output_file=None, errors_file=None,
         doi = df.loc[idx, 'Doi'] if 'Doi' in df.columns else ''
         
         # Get MeSH terms and IDs
-        mesh_terms, mesh_ids = get_mesh_terms(fetch, title, author, doi)
-        df.loc[idx, 'MESH'] = mesh_terms
-        df.loc[idx, 'MESH_ID'] = mesh_ids
+        mesh_terms, mesh_ids = get_mesh_terms(fetch, title, author, doi, max_retries=paper_retries)
+        df.loc[idx, 'MESH'] = encode_mesh_list(mesh_terms)
+        df.loc[idx, 'MESH_ID'] = encode_mesh_list(mesh_ids)
         
         processed_count += 1
         if mesh_terms:
@@ -193,10 +223,13 @@ def process_csv_with_mesh(input_file, output_file=None, errors_file=None,
                 print(f"  → Errors saved to {errors_file} ({len(error_rows)} papers without MeSH)")
         
         # Rate limiting (PubMed allows 3 requests per second without API key)
-        time.sleep(0.35)
+        time.sleep(request_interval)
     
     # Final save
     df.to_csv(output_file, sep=',', index=False)  # Changed from '\t' to ','
+    if parquet_file is not None:
+        mesh_lists_to_parquet(df, parquet_file)
+        print(f"Parquet copy with list columns saved to: {parquet_file}")
     
     # Save all papers without MeSH terms to errors.csv
     if error_rows:
@@ -233,7 +266,7 @@ if __name__ == "__main__":
     
     # Display sample results
     print("\nSample of papers with MeSH terms:")
-    sample_df = df[df['MESH'] != ''][['Label', 'MESH', 'MESH_ID']].head(10)
+    sample_df = df[df['MESH'].map(decode_mesh_list).map(bool)][['Label', 'MESH', 'MESH_ID']].head(10)
     if not sample_df.empty:
         print(sample_df.to_string())
     else:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Measure MeSH retrieval throughput and retries against the local E-utilities stand-in.
+
+Starts fake_eutils_server.py in-process with fixtures written from the first
+--papers rows of a synthetic corpus (generate_corpus.py), then runs
+get_mesh_terms() from add_mesh_node_attributtes.py for every title on
+--workers threads. Failed requests are retried by the E-utilities client
+only (get_mesh_terms makes one attempt, as process_csv_with_mesh does with
+that client), so the retry counts are those of a single layer.
+The number of papers per second, per-paper latency percentiles, the client
+retry counts and the server's responses per status are printed and written
+as JSON to benchmarks/results/.
+
+Usage:
+    python benchmarks/eutils_load_test.py [--papers 500] [--workers 1,4,16] [--latency 0.05]
+        [--jitter 0.02] [--rate-limit 10] [--error-rate 0.02] [--backoff 0.1] [--seed 0]
+        [--out results.json]
+"""
+import io
+import sys
+import json
+import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+for path in (BENCH_DIR, REPO_ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import numpy as np
+import pandas as pd
+
+from add_mesh_node_attributtes import get_mesh_terms
+from fake_eutils_server import FakeEUtilsServer, fixtures_from_csv
+from generate_corpus import load_or_generate
+from run_benchmarks import DATA_DIR, RESULTS_DIR, SIZES, git_commit
+from scripts.eutils_client import EUtilsFetcher
+
+CORPUS_SIZE = "10k"
+
+
+def run_load(fixtures_path, titles, workers, fault_options, backoff) -> dict:
+    """Look up every title on `workers` threads against a fresh server; returns the measurements."""
+    server = FakeEUtilsServer([fixtures_path], **fault_options)
+    server.start_background()
+    fetcher = EUtilsFetcher(server.base_url, backoff=backoff)
+    latencies = []
+
+    def lookup(title):
+        start = time.perf_counter()
+        # the client does the retrying, so get_mesh_terms makes a single attempt
+        mesh_terms, _ = get_mesh_terms(fetcher, title, max_retries=1)
+        latencies.append(time.perf_counter() - start)
+        return bool(mesh_terms)
+
+    try:
+        start = time.perf_counter()
+        # get_mesh_terms prints the papers it gives up on
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(workers) as pool:
+            found = sum(pool.map(lookup, titles))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "workers": workers,
+        "papers": len(titles),
+        "found": found,
+        "seconds": elapsed,
+        "papers_per_second": len(titles) / elapsed,
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p95": float(np.percentile(latencies, 95)),
+        "client": dict(fetcher.stats),
+        "server": server.snapshot(),
+    }
+
+
+def main(argv):
+    n_papers = 500
+    workers = [1, 4, 16]
+    fault_options = {"latency": 0.05, "jitter": 0.02, "rate_limit": 10.0, "error_rate": 0.02, "seed": 0}
+    fault_flags = {'--latency': 'latency', '--jitter': 'jitter', '--rate-limit': 'rate_limit',
+                   '--error-rate': 'error_rate'}
+    backoff = 0.1
+    out_path = None
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in fault_flags:
+            fault_options[fault_flags[arg]] = float(next(args))
+        elif arg == '--seed':
+            fault_options['seed'] = int(next(args))
+        elif arg == '--papers':
+            n_papers = int(next(args))
+        elif arg == '--workers':
+            workers = [int(w) for w in next(args).split(',')]
+        elif arg == '--backoff':
+            backoff = float(next(args))
+        elif arg == '--out':
+            out_path = Path(next(args))
+        else:
+            print(f"Unknown argument: {arg}")
+            print(__doc__)
+            return 1
+    if not fault_options['rate_limit']:
+        fault_options['rate_limit'] = None
+
+    corpus_dir = DATA_DIR / CORPUS_SIZE
+    corpus = load_or_generate(SIZES[CORPUS_SIZE], corpus_dir)
+    csv_path = corpus_dir / corpus["files"]["csv"]
+    fixtures_path = corpus_dir / "pubmed_fixtures.xml"
+    n_articles = fixtures_from_csv(csv_path, fixtures_path, limit=n_papers)
+    titles = pd.read_csv(csv_path, usecols=["Label"], nrows=n_papers)["Label"].tolist()
+    print(f"Serving {n_articles} fixture articles with {fault_options}")
+
+    runs = []
+    for n_workers in workers:
+        result = run_load(fixtures_path, titles, n_workers, fault_options, backoff)
+        runs.append(result)
+        print(f"{n_workers:>3} workers: {result['papers_per_second']:7.1f} papers/s, "
+              f"found {result['found']}/{result['papers']}, "
+              f"p50 {result['latency_p50'] * 1000:.0f} ms, p95 {result['latency_p95'] * 1000:.0f} ms, "
+              f"retries {result['client'].get('retries', 0)}, failed {result['client'].get('failed', 0)}")
+
+    commit = git_commit()
+    if out_path is None:
+        out_path = RESULTS_DIR / f"eutils-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump({"meta": {"commit": commit, "faults": fault_options, "backoff": backoff}, "runs": runs},
+                  f, indent=1)
+    print(f"Saved results to {out_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Local stand-in for the PubMed E-utilities (esearch + efetch), backed by fixture XML.
+
+The fixtures are PubmedArticleSet files in the efetch format, such as
+benchmarks/fixtures/pubmed_articles.xml or ones written from a synthetic
+corpus with --from-csv. They are served as:
+
+  GET esearch.fcgi?term=...&retmax=N   PMIDs whose title matches the term:
+                                       a quoted term must equal the title,
+                                       an unquoted one must contain all of its
+                                       words (after lowercasing and dropping
+                                       punctuation)
+  GET efetch.fcgi?id=1,2,3             the PubmedArticle elements of the ids
+  GET stats                            request counts per endpoint and status
+
+Faults are injected reproducibly from a seeded generator:
+
+  --latency S --jitter S   sleep S + uniform(0, jitter) seconds per request
+  --rate-limit R           allow R requests per second (a token bucket like
+                           NCBI's 3/s, or 10/s with an API key); beyond it
+                           answer 429 with a Retry-After header
+  --error-rate P           answer a fraction P of requests with 500/502/503
+
+Point the retrieval at it with EUTILS_BASE_URL=http://127.0.0.1:PORT/ (see
+scripts/eutils_client.py), or run eutils_load_test.py.
+
+Usage:
+    python benchmarks/fake_eutils_server.py fixtures.xml [more.xml ...] [--port 8765]
+        [--latency 0.1] [--jitter 0.05] [--rate-limit 3] [--error-rate 0.05] [--seed 0]
+    python benchmarks/fake_eutils_server.py --from-csv node_attributes.csv fixtures.xml [--limit N]
+"""
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+from lxml import etree
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.mesh_lists import decode_mesh_list
+
+DEFAULT_FIXTURES = BENCH_DIR / "fixtures" / "pubmed_articles.xml"
+FIRST_SYNTHETIC_PMID = 10_000_000
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase words without punctuation, as get_mesh_terms compares titles."""
+    return ' '.join(PUNCTUATION_RE.sub('', title.lower()).split())
+
+
+def article_xml(pmid, title, mesh, doi=None, authors=(), journal=None, year=None) -> etree._Element:
+    """
+    <PubmedArticle> element in the efetch layout.
+
+    Args:
+        mesh: list of (descriptor UI, descriptor name) or metapub's
+            {UI: {"descriptor_name", "descriptor_major_topic", "qualifiers"}}
+    """
+    article = etree.Element('PubmedArticle')
+    citation = etree.SubElement(article, 'MedlineCitation', Status='MEDLINE', Owner='NLM')
+    etree.SubElement(citation, 'PMID', Version='1').text = str(pmid)
+    article_el = etree.SubElement(citation, 'Article', PubModel='Print')
+    journal_el = etree.SubElement(article_el, 'Journal')
+    if year:
+        issue = etree.SubElement(journal_el, 'JournalIssue', CitedMedium='Print')
+        etree.SubElement(etree.SubElement(issue, 'PubDate'), 'Year').text = str(year)
+    if journal:
+        etree.SubElement(journal_el, 'Title').text = journal
+    etree.SubElement(article_el, 'ArticleTitle').text = title
+    if authors:
+        author_list = etree.SubElement(article_el, 'AuthorList', CompleteYN='Y')
+        for author in authors:
+            last_name, _, initials = author.rpartition(' ')
+            author_el = etree.SubElement(author_list, 'Author', ValidYN='Y')
+            etree.SubElement(author_el, 'LastName').text = last_name or initials
+            if last_name:
+                etree.SubElement(author_el, 'Initials').text = initials
+    if isinstance(mesh, dict):
+        mesh = [(ui, term.get('descriptor_name'), term.get('descriptor_major_topic', False),
+                 term.get('qualifiers', [])) for ui, term in mesh.items()]
+    else:
+        mesh = [(ui, name, False, []) for ui, name in mesh]
+    if mesh:
+        heading_list = etree.SubElement(citation, 'MeshHeadingList')
+        for ui, name, major, qualifiers in mesh:
+            heading = etree.SubElement(heading_list, 'MeshHeading')
+            etree.SubElement(heading, 'DescriptorName', UI=ui, MajorTopicYN='Y' if major else 'N').text = name
+            for q in qualifiers:
+                etree.SubElement(heading, 'QualifierName', UI=q.get('qualifier_ui', ''),
+                                 MajorTopicYN='Y' if q.get('qualifier_major_topic') else 'N'
+                                 ).text = q.get('qualifier_name')
+    ids = etree.SubElement(etree.SubElement(article, 'PubmedData'), 'ArticleIdList')
+    etree.SubElement(ids, 'ArticleId', IdType='pubmed').text = str(pmid)
+    if doi:
+        etree.SubElement(ids, 'ArticleId', IdType='doi').text = doi
+    return article
+
+
+def write_article_set(articles, path):
+    root = etree.Element('PubmedArticleSet')
+    root.extend(articles)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    etree.ElementTree(root).write(str(path), xml_declaration=True, encoding='utf-8', pretty_print=True)
+
+
+def fixtures_from_csv(csv_path, out_path, limit=None) -> int:
+    """
+    Write the papers of a node CSV that have MeSH terms as fixture articles.
+
+    Row i gets PMID FIRST_SYNTHETIC_PMID + i. MESH and MESH_ID are read as
+    written by add_mesh_node_attributtes.py (or generate_corpus.py).
+
+    Returns:
+        number of articles written
+    """
+    df = pd.read_csv(csv_path, keep_default_na=False, nrows=limit)
+    articles = []
+    for i, row in enumerate(df.itertuples(index=False)):
+        terms, uis = decode_mesh_list(row.MESH), decode_mesh_list(row.MESH_ID)
+        if not terms or len(terms) != len(uis):
+            continue
+        articles.append(article_xml(FIRST_SYNTHETIC_PMID + i, row.Label, list(zip(uis, terms)),
+                                    doi=row.Doi or None, authors=[row.Author] if row.Author else ()))
+    write_article_set(articles, out_path)
+    return len(articles)
+
+
+class ArticleIndex:
+    """Fixture articles by PMID, with exact-title and title-word lookups."""
+
+    def __init__(self, paths):
+        self.articles = {}
+        self.by_title = defaultdict(list)
+        self.by_word = defaultdict(set)
+        for path in paths:
+            for article in etree.parse(str(path)).getroot().iterfind('PubmedArticle'):
+                pmid = article.findtext('MedlineCitation/PMID')
+                title = normalize_title(''.join(article.find('.//ArticleTitle').itertext()))
+                self.articles[pmid] = etree.tostring(article, encoding='utf-8')
+                self.by_title[title].append(pmid)
+                for word in title.split():
+                    self.by_word[word].add(pmid)
+
+    def search(self, term: str, retmax: int) -> list:
+        quoted = len(term) > 1 and term[0] == term[-1] == '"'
+        query = normalize_title(term.strip('"'))
+        if not query:
+            return []
+        pmids = list(self.by_title.get(query, []))
+        if not pmids and not quoted:
+            words = sorted(set(query.split()), key=lambda w: len(self.by_word.get(w, ())))
+            matches = set(self.by_word.get(words[0], ()))
+            for word in words[1:]:
+                matches &= self.by_word.get(word, set())
+            pmids = sorted(matches, key=int)
+        return pmids[:retmax]
+
+    def fetch(self, pmids) -> bytes:
+        return (b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+                + b''.join(self.articles[p] for p in pmids if p in self.articles)
+                + b'</PubmedArticleSet>\n')
+
+
+class FaultInjector:
+    """Latency, token-bucket rate limit and random failures shared by all handler threads."""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._last_refill = time.monotonic()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def take_token(self) -> bool:
+        """False when the request exceeds the rate limit."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._last_refill) * self.rate_limit)
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def failure_status(self):
+        """An HTTP error status for a failed request, or None."""
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._rng.random() < self.error_rate:
+                return self._rng.choice((500, 502, 503))
+        return None
+
+
+class EUtilsHandler(BaseHTTPRequestHandler):
+    server_version = "FakeEUtils/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body: bytes, content_type='text/xml; charset=UTF-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(self.endpoint, status)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if self.endpoint == 'stats':
+            return self._send(200, json.dumps(self.server.snapshot()).encode(), 'application/json')
+        if self.endpoint not in ('esearch.fcgi', 'efetch.fcgi'):
+            return self._send(404, b'unknown endpoint\n', 'text/plain')
+
+        faults = self.server.faults
+        time.sleep(faults.delay())
+        if not faults.take_token():
+            # NCBI answers rate limit violations with a JSON body
+            body = json.dumps({"error": "API rate limit exceeded", "count": str(faults.rate_limit + 1)})
+            return self._send(429, body.encode(), 'application/json', {'Retry-After': '1'})
+        status = faults.failure_status()
+        if status is not None:
+            return self._send(status, f"simulated error {status}\n".encode(), 'text/plain')
+
+        index = self.server.index
+        if self.endpoint == 'esearch.fcgi':
+            pmids = index.search(params.get('term', ''), int(params.get('retmax', 20)))
+            body = ('<?xml version="1.0" ?>\n<eSearchResult>'
+                    f'<Count>{len(pmids)}</Count><RetMax>{len(pmids)}</RetMax><RetStart>0</RetStart>'
+                    '<IdList>' + ''.join(f'<Id>{p}</Id>' for p in pmids) + '</IdList></eSearchResult>\n')
+            return self._send(200, body.encode())
+        pmids = [p.strip() for p in params.get('id', '').split(',') if p.strip()]
+        return self._send(200, index.fetch(pmids))
+
+
+class FakeEUtilsServer(ThreadingHTTPServer):
+    """Threaded HTTP server serving an ArticleIndex through a FaultInjector."""
+
+    daemon_threads = True
+
+    def __init__(self, fixture_paths, host='127.0.0.1', port=0, **fault_options):
+        """
+        Args:
+            fixture_paths: PubmedArticleSet XML files
+            port: TCP port, 0 for any free one (see base_url)
+            fault_options: latency, jitter, rate_limit, error_rate, seed of FaultInjector
+        """
+        self.index = ArticleIndex(fixture_paths)
+        self.faults = FaultInjector(**fault_options)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        super().__init__((host, port), EUtilsHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count(self, endpoint, status):
+        with self._stats_lock:
+            self.stats[f"{endpoint} {status}"] += 1
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            return dict(sorted(self.stats.items()))
+
+    def start_background(self) -> threading.Thread:
+        """Serve on a daemon thread; stop with shutdown()."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv):
+    options = {}
+    fault_flags = {'--latency': 'latency', '--jitter': 'jitter', '--rate-limit': 'rate_limit',
+                   '--error-rate': 'error_rate', '--seed': 'seed'}
+    port = 8765
+    limit = None
+    from_csv = None
+    positional = []
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in fault_flags:
+            value = next(args)
+            options[fault_flags[arg]] = int(value) if arg == '--seed' else float(value)
+        elif arg == '--port':
+            port = int(next(args))
+        elif arg == '--limit':
+            limit = int(next(args))
+        elif arg == '--from-csv':
+            from_csv = next(args)
+        else:
+            positional.append(arg)
+
+    if from_csv is not None:
+        if len(positional) != 1:
+            print("Usage: python benchmarks/fake_eutils_server.py --from-csv node_attributes.csv fixtures.xml")
+            return 1
+        n_articles = fixtures_from_csv(from_csv, positional[0], limit)
+        print(f"Wrote {n_articles} fixture articles to {positional[0]}")
+        return 0
+
+    server = FakeEUtilsServer(positional or [DEFAULT_FIXTURES], port=port, **options)
+    print(f"Serving {len(server.index.articles)} articles at {server.base_url} ({options or 'no faults'})")
+    print(f"Use it with EUTILS_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.snapshot(), indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
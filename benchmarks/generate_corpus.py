@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Synthetic corpora for the benchmarks, shaped like the real project data.
+
+One corpus of N papers is a folder with:
+
+  node_attributes.csv   Label, Doi, Author, Date, Keywords and JSON-array
+                        MESH / MESH_ID columns (add_mesh_node_attributtes.py)
+  graph.gexf            the same papers as nodes with modularity_class,
+                        keywords, doi and legacy comma-joined mesh / mesh_id
+                        attributes, so headings containing commas need the
+                        fix_gexf_mesh_using_mesh_csv.py repair
+  mesh.bin              MeSH ASCII descriptors (MH, ENTRY, MN, UI)
+  keyword_synonyms.json synonym groups in the find_synonyms.py format
+  keywords.npy          the distinct keywords
+  embeddings.npy        unit-norm embeddings of the first keywords, one in
+                        five a near-duplicate of another, for find_synonyms.py
+  corpus.json           sizes, seed and the file names above
+
+Keywords and MeSH descriptors are drawn with Zipf-like frequencies. All
+values come from a seeded generator, so a corpus is the same on every
+machine.
+
+Usage:
+    python benchmarks/generate_corpus.py N out_dir [seed]
+"""
+import sys
+import json
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+import pandas as pd
+
+CORPUS_VERSION = 1
+
+WORDS = (
+    "motor", "learning", "adaptation", "cortex", "cerebellum", "basal", "ganglia", "dopamine", "sleep",
+    "memory", "feedback", "training", "sequence", "attention", "motivation", "reward", "error", "skill",
+    "practice", "consolidation", "plasticity", "neuron", "stroke", "rehabilitation", "movement", "timing",
+    "visuomotor", "force", "field", "reaching", "grasping", "eye", "saccade", "balance", "posture", "gait",
+    "children", "aging", "imaging", "stimulation", "transcranial", "magnetic", "model", "bayesian",
+    "reinforcement", "implicit", "explicit", "transfer", "retention", "variability", "interference",
+)
+MESH_WORDS = (
+    "Brain", "Learning", "Motor", "Cortex", "Humans", "Adult", "Behavior", "Animal", "Psychomotor",
+    "Performance", "Neurons", "Dopamine", "Cerebellum", "Memory", "Sleep", "Stroke", "Rehabilitation",
+    "Movement", "Reaction", "Time", "Feedback", "Sensory", "Magnetic", "Resonance", "Imaging", "Aged",
+    "Child", "Young", "Basal", "Ganglia", "Reward", "Attention", "Motivation", "Practice", "Neuronal",
+    "Plasticity", "Transcranial", "Stimulation", "Eye", "Movements", "Postural", "Balance",
+)
+MODULARITY_CLASSES = (2, 7, 12, 15, 11, 6, 5, 1, 10, 3, 4)
+EMBEDDING_DIM = 768
+# find_synonyms builds a dense N x N similarity matrix, so only this many keywords are embedded
+MAX_EMBEDDED_KEYWORDS = 5000
+
+
+def _zipf_choice(rng, n_values, size):
+    """Indices in [0, n_values) with probability ~ 1 / (rank + 1)."""
+    weights = 1.0 / np.arange(1, n_values + 1)
+    return rng.choice(n_values, size=size, p=weights / weights.sum())
+
+
+def make_keywords(rng, n_keywords):
+    """Distinct lowercase keywords, some with commas inside parentheses."""
+    keywords = []
+    seen = set()
+    while len(keywords) < n_keywords:
+        words = rng.choice(WORDS, size=rng.integers(1, 4))
+        keyword = " ".join(words)
+        if rng.random() < 0.05:
+            keyword += f" ({rng.choice(WORDS)}, {rng.choice(WORDS)})"
+        if keyword in seen:
+            keyword += f" {len(keywords)}"
+        seen.add(keyword)
+        keywords.append(keyword)
+    return keywords
+
+
+def make_descriptors(rng, n_descriptors):
+    """(UI, heading, entry terms, tree numbers) per descriptor; 20% of headings contain a comma."""
+    descriptors = []
+    headings = set()
+    for i in range(n_descriptors):
+        heading = " ".join(rng.choice(MESH_WORDS, size=rng.integers(1, 3)))
+        if rng.random() < 0.2:
+            heading += f", {rng.choice(MESH_WORDS)}"
+        if heading in headings:
+            heading += f" {i}"
+        headings.add(heading)
+        entries = [f"{heading} {rng.choice(MESH_WORDS)}" for _ in range(rng.integers(0, 3))]
+        tree_numbers = [
+            ".".join([f"{chr(65 + rng.integers(0, 14))}{rng.integers(1, 20):02d}"]
+                     + [f"{rng.integers(1, 999):03d}" for _ in range(rng.integers(1, 4))])
+            for _ in range(rng.integers(1, 3))
+        ]
+        descriptors.append((f"D{i + 1:06d}", heading, entries, tree_numbers))
+    return descriptors
+
+
+def write_mesh_ascii(descriptors, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for ui, heading, entries, tree_numbers in descriptors:
+            f.write("*NEWRECORD\nRECTYPE = D\n")
+            f.write(f"MH = {heading}\n")
+            for entry in entries:
+                f.write(f"ENTRY = {entry}|T047|NON|EQV|UNK (19XX)|771118|abbcdef\n")
+            for mn in tree_numbers:
+                f.write(f"MN = {mn}\n")
+            f.write(f"UI = {ui}\n\n")
+
+
+def write_gexf(papers: pd.DataFrame, path):
+    """Write the papers as GEXF nodes with numeric attribute ids, like Gephi exports."""
+    attributes = (("0", "modularity_class", "long"), ("1", "keywords", "string"), ("2", "doi", "string"),
+                  ("3", "mesh", "string"), ("4", "mesh_id", "string"))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n"
+                '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                '  <graph defaultedgetype="undirected" mode="static">\n'
+                '    <attributes mode="static" class="node">\n')
+        for attribute_id, title, kind in attributes:
+            f.write(f'      <attribute id="{attribute_id}" title="{title}" type="{kind}" />\n')
+        f.write('    </attributes>\n    <nodes>\n')
+        rows = zip(papers["Label"], papers["modularity_class"], papers["Keywords"], papers["Doi"],
+                   papers["mesh_legacy"], papers["mesh_id_legacy"])
+        for i, (label, cls, keywords, doi, mesh, mesh_id) in enumerate(rows):
+            f.write(f'      <node id="n{i}" label={quoteattr(label)}>\n        <attvalues>\n'
+                    f'          <attvalue for="0" value="{cls}" />\n'
+                    f'          <attvalue for="1" value={quoteattr(keywords)} />\n'
+                    f'          <attvalue for="2" value={quoteattr(doi)} />\n'
+                    f'          <attvalue for="3" value={quoteattr(mesh)} />\n'
+                    f'          <attvalue for="4" value={quoteattr(mesh_id)} />\n'
+                    '        </attvalues>\n      </node>\n')
+        f.write('    </nodes>\n    <edges>\n')
+        # a sparse chain of citations keeps the graph connected without dominating the file
+        for i in range(1, len(papers)):
+            f.write(f'      <edge source="n{i - 1}" target="n{i}" />\n')
+        f.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+def make_embeddings(rng, n_keywords, noise=0.002):
+    """Unit vectors where keywords 10k+1 and 10k+2 are near-duplicates of keyword 10k."""
+    vectors = rng.standard_normal((n_keywords, EMBEDDING_DIM)).astype(np.float32)
+    near_duplicates = np.flatnonzero(np.isin(np.arange(n_keywords) % 10, (1, 2)))
+    vectors[near_duplicates] = (vectors[near_duplicates - near_duplicates % 10]
+                                + noise * rng.standard_normal((len(near_duplicates), EMBEDDING_DIM)))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate_corpus(n_papers: int, out_dir, seed: int = 0) -> dict:
+    """
+    Write a synthetic corpus of n_papers papers to out_dir.
+
+    Returns:
+        the corpus description also written to corpus.json
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    n_keywords = max(1000, n_papers // 10)
+    n_descriptors = min(30000, max(2000, n_papers // 20))
+    keywords = make_keywords(rng, n_keywords)
+    descriptors = make_descriptors(rng, n_descriptors)
+
+    # per-paper keyword and descriptor draws, flattened with offsets
+    keyword_counts = rng.integers(3, 9, size=n_papers)
+    keyword_draws = _zipf_choice(rng, n_keywords, keyword_counts.sum())
+    mesh_counts = rng.integers(3, 11, size=n_papers)
+    mesh_draws = _zipf_choice(rng, n_descriptors, mesh_counts.sum())
+    keyword_offsets = np.concatenate(([0], np.cumsum(keyword_counts)))
+    mesh_offsets = np.concatenate(([0], np.cumsum(mesh_counts)))
+
+    labels, paper_keywords, mesh_json, mesh_id_json, mesh_legacy, mesh_id_legacy = [], [], [], [], [], []
+    for i in range(n_papers):
+        kws = [keywords[k] for k in keyword_draws[keyword_offsets[i]:keyword_offsets[i + 1]]]
+        # case variants exercise normalize_keyword
+        if rng.random() < 0.3:
+            kws[0] = kws[0].title()
+        ds = dict.fromkeys(mesh_draws[mesh_offsets[i]:mesh_offsets[i + 1]].tolist())
+        uis = [descriptors[d][0] for d in ds]
+        headings = [descriptors[d][1] for d in ds]
+        labels.append(f"Paper {i}: {kws[0]} and {kws[-1]} in {headings[0]}")
+        paper_keywords.append(", ".join(kws))
+        mesh_json.append(json.dumps(headings))
+        mesh_id_json.append(json.dumps(uis))
+        mesh_legacy.append(", ".join(headings))
+        mesh_id_legacy.append(", ".join(uis))
+
+    papers = pd.DataFrame({
+        "Label": labels,
+        "Doi": [f"10.5555/bench.{i}" if rng.random() < 0.9 else "" for i in range(n_papers)],
+        "Author": [f"Author {i % 5000}" for i in range(n_papers)],
+        "Date": rng.integers(1990, 2025, size=n_papers),
+        "Keywords": paper_keywords,
+        "MESH": mesh_json,
+        "MESH_ID": mesh_id_json,
+        "modularity_class": rng.choice(MODULARITY_CLASSES, size=n_papers),
+        "mesh_legacy": mesh_legacy,
+        "mesh_id_legacy": mesh_id_legacy,
+    })
+    papers[["Label", "Doi", "Author", "Date", "Keywords", "MESH", "MESH_ID"]].to_csv(
+        out_dir / "node_attributes.csv", index=False)
+    write_gexf(papers, out_dir / "graph.gexf")
+    write_mesh_ascii(descriptors, out_dir / "mesh.bin")
+
+    # synonym groups: every 10th keyword is the key of the next one or two
+    synonyms = {keywords[k]: keywords[k + 1:k + 1 + int(rng.integers(1, 3))] for k in range(0, n_keywords - 3, 10)}
+    with open(out_dir / "keyword_synonyms.json", 'w', encoding='utf-8') as f:
+        json.dump(synonyms, f, indent=1)
+    np.save(out_dir / "keywords.npy", np.asarray(keywords, dtype=str))
+    np.save(out_dir / "embeddings.npy", make_embeddings(rng, min(n_keywords, MAX_EMBEDDED_KEYWORDS)))
+
+    corpus = {
+        "version": CORPUS_VERSION,
+        "papers": n_papers,
+        "keywords": n_keywords,
+        "descriptors": n_descriptors,
+        "seed": seed,
+        "files": {
+            "csv": "node_attributes.csv",
+            "gexf": "graph.gexf",
+            "mesh_ascii": "mesh.bin",
+            "synonyms": "keyword_synonyms.json",
+            "keywords": "keywords.npy",
+            "embeddings": "embeddings.npy",
+        },
+    }
+    with open(out_dir / "corpus.json", 'w') as f:
+        json.dump(corpus, f, indent=1)
+    return corpus
+
+
+def load_or_generate(n_papers: int, out_dir, seed: int = 0) -> dict:
+    """The corpus in out_dir, generated first if missing or made with other parameters."""
+    manifest = Path(out_dir) / "corpus.json"
+    if manifest.exists():
+        with open(manifest) as f:
+            corpus = json.load(f)
+        if (corpus.get("version"), corpus.get("papers"), corpus.get("seed")) == (CORPUS_VERSION, n_papers, seed):
+            return corpus
+    print(f"Generating synthetic corpus of {n_papers} papers in {out_dir}")
+    return generate_corpus(n_papers, out_dir, seed)
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python benchmarks/generate_corpus.py N out_dir [seed]")
+        return 1
+    corpus = generate_corpus(int(argv[1]), Path(argv[2]), int(argv[3]) if len(argv) > 3 else 0)
+    print(json.dumps(corpus, indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
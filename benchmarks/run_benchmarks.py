@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""Time the hot paths of the pipeline on synthetic corpora and store the results as JSON.
+
+Corpora of 10k, 100k and 1M papers are generated once by generate_corpus.py
+into benchmarks/data/ (reused while their size and seed match). Every
+benchmark prepares its inputs outside the timed region and then times one
+call of the function as the pipeline uses it:
+
+  find_matching_row             a few CSV rows looked up in the full CSV;
+                                half have no DOI and a re-cased title, so the
+                                normalized-title scan is hit
+  find_mesh_for_node_optimized  node lookups with the normalized-label cache
+  parse_mesh_ascii              the whole MeSH ASCII file
+  process_gexf                  the comma repair over the whole GEXF
+  split_keywords                the keywords attribute of every node
+  find_synonyms                 the embedded keywords (at most 5000)
+  classify_keyword_multi_label  every distinct keyword
+  calculate_canonical_tfidf     the whole GEXF and synonym file
+  embed_texts                   256 titles with SPECTER2 (only with --embed;
+                                downloads the model, needs torch/transformers)
+
+Each result has the number of items processed, the best time of --repeat runs
+and items per second. Benchmarks whose first run takes less than 100 ms are
+repeated until they have run for at least a second (and at least --repeat
+times), so their best time is not just timer and scheduler noise. A results
+file from an earlier commit can be given with --compare; a benchmark is a
+regression when it is more than 10% and more than 20 ms slower.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 10k,100k,1m] [--only name,...] [--repeat N]
+                                        [--out results.json] [--compare old.json] [--embed]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+for path in (BENCH_DIR, REPO_ROOT):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import numpy as np
+import pandas as pd
+
+from generate_corpus import load_or_generate
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+REGRESSION_THRESHOLD = 1.10
+# slowdowns below this many seconds are treated as noise
+REGRESSION_MIN_SECONDS = 0.02
+# benchmarks faster than SHORT_RUN_SECONDS are repeated for at least SHORT_TOTAL_SECONDS
+SHORT_RUN_SECONDS = 0.1
+SHORT_TOTAL_SECONDS = 1.0
+MATCHING_ROW_QUERIES = 10
+MESH_NODE_QUERIES = 200
+EMBED_TEXTS = 256
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark setup whose dependencies are not available."""
+
+
+def _corpus_file(corpus_dir, corpus, kind):
+    return Path(corpus_dir) / corpus["files"][kind]
+
+
+def _query_rows(csv_df, n_queries, seed=0):
+    """Rows of csv_df as lookup targets; every second one loses its DOI and has its title re-cased."""
+    rng = random.Random(seed)
+    rows = []
+    for i, idx in enumerate(rng.sample(range(len(csv_df)), n_queries)):
+        row = csv_df.iloc[idx].copy()
+        if i % 2:
+            row["Doi"] = ""
+            row["Label"] = row["Label"].upper()
+        rows.append(row)
+    return rows
+
+
+def bench_find_matching_row(corpus_dir, corpus, work_dir):
+    from transfer_mesh_column_to_csv import find_matching_row
+
+    csv_df = pd.read_csv(_corpus_file(corpus_dir, corpus, "csv"), keep_default_na=False)
+    targets = _query_rows(csv_df, MATCHING_ROW_QUERIES)
+    columns = ["Doi", "Label", "Author", "Date"]
+
+    def run():
+        for target in targets:
+            find_matching_row(target, csv_df, columns)
+    return len(targets), run
+
+
+def bench_find_mesh_for_node(corpus_dir, corpus, work_dir):
+    from transfer_mesh_column_to_gexf import find_mesh_for_node_optimized, normalize_string
+
+    csv_df = pd.read_csv(_corpus_file(corpus_dir, corpus, "csv"), keep_default_na=False)
+    # the cache add_mesh_to_gexf builds before its node loop
+    normalized_labels_cache = {}
+    for idx, label in enumerate(csv_df["Label"]):
+        normalized = normalize_string(label)
+        if normalized:
+            normalized_labels_cache[normalized] = idx
+    targets = _query_rows(csv_df, MESH_NODE_QUERIES)
+
+    def run():
+        for target in targets:
+            find_mesh_for_node_optimized(target["Label"], target["Doi"], csv_df, normalized_labels_cache)
+    return len(targets), run
+
+
+def bench_parse_mesh_ascii(corpus_dir, corpus, work_dir):
+    from scripts.parse_mesh_ascii_to_csv import parse_mesh_ascii
+
+    path = _corpus_file(corpus_dir, corpus, "mesh_ascii")
+    return corpus["descriptors"], lambda: parse_mesh_ascii(path)
+
+
+def bench_process_gexf(corpus_dir, corpus, work_dir):
+    from scripts.parse_mesh_ascii_to_csv import iter_mesh_records
+    from scripts.fix_gexf_mesh_using_mesh_csv import process_gexf
+
+    mesh_map = {record["UI"][0]: record["MH"][0]
+                for record in iter_mesh_records(_corpus_file(corpus_dir, corpus, "mesh_ascii"))}
+    in_path = _corpus_file(corpus_dir, corpus, "gexf")
+    out_dir = Path(work_dir)
+
+    def run():
+        process_gexf(in_path, out_dir / "fixed.gexf", mesh_map, out_dir / "logs.csv", out_dir / "errors.txt")
+    return corpus["papers"], run
+
+
+def bench_split_keywords(corpus_dir, corpus, work_dir):
+    from scripts.keywords_histograms_by_modularity import split_keywords
+
+    values = pd.read_csv(_corpus_file(corpus_dir, corpus, "csv"), usecols=["Keywords"],
+                         keep_default_na=False)["Keywords"].tolist()
+
+    def run():
+        for value in values:
+            split_keywords(value)
+    return len(values), run
+
+
+def bench_find_synonyms(corpus_dir, corpus, work_dir):
+    from embedding_keywords.find_synonyms import find_synonyms
+
+    embeddings = np.load(_corpus_file(corpus_dir, corpus, "embeddings"))
+    keywords = pd.Series(np.load(_corpus_file(corpus_dir, corpus, "keywords"))[:len(embeddings)])
+    embeddings = pd.Series(list(embeddings))
+    return len(keywords), lambda: find_synonyms(keywords, embeddings)
+
+
+def bench_classify_keyword(corpus_dir, corpus, work_dir):
+    import classify_keywords
+
+    keywords = np.load(_corpus_file(corpus_dir, corpus, "keywords")).tolist()
+
+    def run():
+        for keyword in keywords:
+            classify_keywords.classify_keyword_multi_label(keyword)
+        # unknown keywords are buffered for flush_unknown_words, which is not part of the benchmark
+        classify_keywords._unknown_words.clear()
+    return len(keywords), run
+
+
+def bench_calculate_canonical_tfidf(corpus_dir, corpus, work_dir):
+    from embedding_keywords.td_idf_to_keywords_per_cluster import calculate_canonical_tfidf
+
+    gexf_path = _corpus_file(corpus_dir, corpus, "gexf")
+    synonyms_path = _corpus_file(corpus_dir, corpus, "synonyms")
+
+    def run():
+        cwd = os.getcwd()
+        # it writes its QA files and vocabulary below the working directory
+        os.chdir(work_dir)
+        try:
+            calculate_canonical_tfidf(gexf_path, synonyms_path)
+        finally:
+            os.chdir(cwd)
+    return corpus["papers"], run
+
+
+def bench_embed_texts(corpus_dir, corpus, work_dir):
+    try:
+        import torch
+        from embedding_keywords.SPECTER2Embedder import SPECTER2Embedder
+    except ImportError as e:
+        raise SkipBenchmark(f"embedding dependencies missing: {e}")
+
+    texts = pd.read_csv(_corpus_file(corpus_dir, corpus, "csv"), usecols=["Label"],
+                        nrows=EMBED_TEXTS)["Label"].tolist()
+    embedder = SPECTER2Embedder("cuda" if torch.cuda.is_available() else "cpu")
+    return len(texts), lambda: embedder.embed_texts(texts, max_length=512)
+
+
+BENCHMARKS = {
+    "find_matching_row": bench_find_matching_row,
+    "find_mesh_for_node_optimized": bench_find_mesh_for_node,
+    "parse_mesh_ascii": bench_parse_mesh_ascii,
+    "process_gexf": bench_process_gexf,
+    "split_keywords": bench_split_keywords,
+    "find_synonyms": bench_find_synonyms,
+    "classify_keyword_multi_label": bench_classify_keyword,
+    "calculate_canonical_tfidf": bench_calculate_canonical_tfidf,
+    "embed_texts": bench_embed_texts,
+}
+# opt-in only: downloads the model and dominates the run time
+OPTIONAL_BENCHMARKS = {"embed_texts"}
+
+
+def time_benchmark(name, setup, corpus_dir, corpus, repeat):
+    """Set up and time one benchmark; its printed output and files are discarded."""
+    result = {"benchmark": name, "size": corpus["papers"]}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()), \
+                tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as work_dir:
+            items, run = setup(corpus_dir, corpus, work_dir)
+            timings = []
+            while len(timings) < repeat or (min(timings) < SHORT_RUN_SECONDS
+                                            and sum(timings) < SHORT_TOTAL_SECONDS):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+    except SkipBenchmark as e:
+        result["skipped"] = str(e)
+        return result
+    best = min(timings)
+    result.update({
+        "items": items,
+        "seconds": best,
+        "items_per_second": items / best if best > 0 else None,
+        "timings": timings,
+    })
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, old_path):
+    """Print the speed ratio against an earlier results file; returns the regressed benchmarks."""
+    with open(old_path) as f:
+        old = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"] if "seconds" in r}
+    print(f"\nCompared with {old_path}:")
+    regressions = []
+    for r in results:
+        before = old.get((r["benchmark"], r["size"]))
+        if before is None or "seconds" not in r:
+            continue
+        ratio = r["seconds"] / before["seconds"]
+        slower = ratio > REGRESSION_THRESHOLD and r["seconds"] - before["seconds"] > REGRESSION_MIN_SECONDS
+        mark = "  REGRESSION" if slower else ""
+        print(f"  {r['benchmark']:<30} {r['size']:>9}  {before['seconds']:9.3f}s -> {r['seconds']:9.3f}s"
+              f"  x{ratio:.2f}{mark}")
+        if mark:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv):
+    sizes = list(SIZES)
+    only = None
+    repeat = 3
+    out_path = None
+    compare_path = None
+    embed = False
+    args = iter(argv[1:])
+    for arg in args:
+        if arg == "--sizes":
+            sizes = next(args).lower().split(",")
+        elif arg == "--only":
+            only = next(args).split(",")
+        elif arg == "--repeat":
+            repeat = int(next(args))
+        elif arg == "--out":
+            out_path = Path(next(args))
+        elif arg == "--compare":
+            compare_path = Path(next(args))
+        elif arg == "--embed":
+            embed = True
+        else:
+            print(f"Unknown argument: {arg}")
+            print(__doc__)
+            return 1
+    unknown = [s for s in sizes if s not in SIZES] + [b for b in only or [] if b not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown size or benchmark: {', '.join(unknown)}")
+        print(f"Sizes: {', '.join(SIZES)}; benchmarks: {', '.join(BENCHMARKS)}")
+        return 1
+
+    names = only or [b for b in BENCHMARKS if embed or b not in OPTIONAL_BENCHMARKS]
+    results = []
+    for size in sizes:
+        corpus_dir = DATA_DIR / size
+        corpus = load_or_generate(SIZES[size], corpus_dir)
+        for name in names:
+            print(f"[{size}] {name} ...", end=" ", flush=True)
+            result = time_benchmark(name, BENCHMARKS[name], corpus_dir, corpus, repeat)
+            results.append(result)
+            if "skipped" in result:
+                print(f"skipped ({result['skipped']})")
+            else:
+                print(f"{result['seconds']:.3f}s, {result['items']} items, "
+                      f"{result['items_per_second']:.1f} items/s")
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if out_path is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out_path = RESULTS_DIR / f"{stamp}-{commit or 'nogit'}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nSaved results to {out_path}")
+
+    if compare_path is not None and compare_results(results, compare_path):
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -1,5 +1,8 @@
 import csv
 import re
+import sys
+from collections import deque
+from multiprocessing import Pool
 
 # The 25 broad classification terms
 # A keyword is classified into ALL categories for which it contains a matching term.
@@ -769,138 +772,266 @@ CATEGORIES = {
 #     for category, terms in CATEGORIES.items():
 #         if keyword in category:
 
-# Function for multi-label classification
-def classify_keyword_multi_label(keyword):
-    unknown_words = set([])
-    kw_lower = keyword.lower()
-    matched_categories = []
+class AhoCorasickMatcher:
+    """Aho–Corasick automaton over (pattern, label) pairs.
+
+    `find_labels(text)` returns the labels of every pattern that occurs as a
+    substring of `text`, in a single pass over its characters.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+
+        # 1. trie of all patterns
+        for pattern, label in patterns:
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                state = nxt
+            self._out[state].add(label)
+
+        # 2. failure links (BFS), merging outputs of the suffix states
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+        self._out = [frozenset(labels) for labels in self._out]
 
+    def find_labels(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        labels = set()
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                labels |= out[state]
+        return labels
+
+
+# Built once from CATEGORIES: exact-match set for 'Z. Unclassified' and one
+# automaton with the (lowercased) terms of every other category.
+UNCLASSIFIED_TERMS = frozenset(term.lower() for term in CATEGORIES['Z. Unclassified'])
+CATEGORY_MATCHER = AhoCorasickMatcher(
+    (term.lower(), category)
+    for category, terms in CATEGORIES.items()
+    if category != 'Z. Unclassified'
+    for term in terms
+)
+
+# Keywords without any category match, written out by flush_unknown_words()
+_unknown_words = []
+
+def _match_categories(kw_lower):
+    """Return (categories, is_unknown) for a lowercased keyword."""
     # Check for unclassified first (exact match only for highly specific, fragmented terms)
     # The 'Z. Unclassified' list contains items the user explicitly mentioned or are fragments.
-    if kw_lower in [unclassified_term.lower() for unclassified_term in CATEGORIES['Z. Unclassified']]:
-        return ['Z. Unclassified']
-
-    # Iterate through all categories and assign ALL matches (multi-label)
-    for category, terms in CATEGORIES.items():
-        if category == 'Z. Unclassified':
-            continue  # Skip checking general keywords against the unclassified list
-        # if kw_lower in [term.lower() for term in terms]:
-        #     matched_categories.append(category)
-        if any(term.lower() in kw_lower for term in terms):
-            matched_categories.append(category)
-    
+    if kw_lower in UNCLASSIFIED_TERMS:
+        return ['Z. Unclassified'], False
+
+    # Find ALL categories with a term contained in the keyword (multi-label)
+    matched_categories = CATEGORY_MATCHER.find_labels(kw_lower)
+
     # If no matches found in any category, assign to unclassified (catch-all for new ambiguous terms)
     if not matched_categories:
-        # print(f"couldn't find match for {kw_lower}")
-        with open("unknown_words.txt", 'a') as f:
-            f.write(keyword)
-            f.write('\n')
-        return ['Z. Unclassified']
-    
-    # Remove duplicates and sort for consistency
-    return sorted(list(set(matched_categories)))
-
-# Read keywords from the document and classify
-input_file = 'keywords_histograms/all_keywords_processed.txt'
-output_file = 'keyword_classification_25_categories.csv'
-
-try:
-    with open(input_file, 'r', encoding='utf-8') as f:
-        keywords = [line.strip() for line in f if line.strip()]
-except FileNotFoundError:
-    print(f"Error: Input file {input_file} not found.")
-    keywords = []
-
-# delete the first two since they are the title of the file
-
-keywords.pop(0)
-keywords.pop(0)
-
-# Create CSV output
-output_data = []
-for keyword in keywords:
-    categories = classify_keyword_multi_label(keyword)
-    # Join multiple categories into a single string for the CSV cell, separated by a semicolon
-    output_data.append([keyword, '; '.join(categories)])
-
-# Write to CSV
-if output_data:
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['keyword', 'categories'])
-        writer.writerows(output_data)
-
-# Prepare data for histogram (frequency count)
-category_counts = {}
-for _, categories_str in output_data:
-    # Split the string of categories to count each one
-    categories_list = categories_str.split('; ')
-    for category in categories_list:
-        category_counts[category] = category_counts.get(category, 0) + 1
-
-# Sort categories for presentation
-sorted_counts = sorted(category_counts.items(), key=lambda item: item[1], reverse=True)
-
-# Print the final summary
-print(f"Total classified keywords: {len(output_data)}")
-print(f"Classification saved to {output_file} (FileTag: keyword_classification_25_categories.csv)")
-print("\nTop 10 Category Frequencies (from total keyword classifications):")
-for category, count in sorted_counts[:10]:
-    print(f"- {category}: {count}")
-
-unclassified_count = category_counts.get('Z. Unclassified', 0)
-print(f"\nTotal Z. Unclassified count: {unclassified_count}")
-
-# Print the complete list of 25 categories and their counts
-print("\nAll 25 Category Frequencies:")
-all_category_counts = {cat: 0 for cat in CATEGORIES.keys()}
-all_category_counts.update(category_counts)
-sorted_all_counts = sorted(all_category_counts.items(), key=lambda item: item[0]) # Sort alphabetically by category code
-
-for category, count in sorted_all_counts:
-    print(f"{category}: {count}")
-
-import matplotlib.pyplot as plt
-import pandas as pd
-from collections import Counter
-
-# Parameters matching the attached image and your code
-title = 'All counts of keyword\'s broad categories'
-meta = {'displaylabel': f"Basic: {title}", 'color': 'green'}
-top_n = 25 # Plotting all mock data points
-out_dir = './' # Use current directory for saving files
-
-# --- Core Plotting Logic (adapted from your snippet) ---
-# Create a DataFrame from the mock data, simulating the output of counts.most_common()
-counts = Counter(all_category_counts)
-df = pd.DataFrame(counts.most_common(), columns=["broad_term", "count"])
-# df = df.sort_values("broad_term")
-
-# The actual file saving logic from your code:
-df.to_csv(f"all_keywords_count.csv", index=False)
-
-# Plot top N
-top = df.head(top_n)
-# Reverse the lists to ensure the highest frequency is at the top of the bar chart (plt.barh default)
-# and the labels are in ascending frequency order on the Y-axis (as in your image)
-labels = top['broad_term'].tolist()[::-1]
-values = top['count'].tolist()[::-1]
-
-# Plotting setup
-plt.figure(figsize=(10, max(4, len(labels) * 0.25))) # Dynamic figure size
-color = meta.get('color', '#333333')
-plt.barh(labels, values, color=color)
-
-# Labels and Title configuration
-plt.xlabel('Frequency')
-plt.title(meta.get('displaylabel'))
-plt.tight_layout()
-
-# The actual file saving logic from your code:
-plt.savefig(f"all_keywords_count.png", dpi=150)
-# plt.close()
-
-# Display the plot
-# plt.show()
-
-print(f"Generated plot data for class: {meta['displaylabel']}")
\ No newline at end of file
+        return ['Z. Unclassified'], True
+
+    # Sort for consistency
+    return sorted(matched_categories), False
+
+
+# Function for multi-label classification
+def classify_keyword_multi_label(keyword):
+    categories, is_unknown = _match_categories(keyword.lower())
+    if is_unknown:
+        _unknown_words.append(keyword)
+    return categories
+
+
+def flush_unknown_words(path="unknown_words.txt"):
+    """Append the buffered unknown keywords to `path` in one write."""
+    if not _unknown_words:
+        return
+    with open(path, 'a') as f:
+        f.write(''.join(f"{keyword}\n" for keyword in _unknown_words))
+    _unknown_words.clear()
+
+
+def _classify_chunk(keywords):
+    return [_match_categories(keyword.lower()) for keyword in keywords]
+
+
+def classify_keywords(keywords, processes=None, chunksize=5000, unknown_words_path="unknown_words.txt"):
+    """Classify many keywords at once.
+
+    Args:
+        keywords: iterable of keywords (duplicates are classified once)
+        processes: number of worker processes; None or 1 classifies in this process
+        chunksize: keywords sent to a worker per task
+        unknown_words_path: where keywords without any match are appended;
+            None to skip writing them
+
+    Returns:
+        dict mapping each keyword to its sorted list of categories
+    """
+    unique_keywords = list(dict.fromkeys(keywords))
+    if processes is not None and processes > 1 and len(unique_keywords) > chunksize:
+        chunks = [unique_keywords[i:i + chunksize] for i in range(0, len(unique_keywords), chunksize)]
+        with Pool(processes) as pool:
+            results = [r for chunk_result in pool.map(_classify_chunk, chunks) for r in chunk_result]
+    else:
+        results = _classify_chunk(unique_keywords)
+
+    mapping = {}
+    for keyword, (categories, is_unknown) in zip(unique_keywords, results):
+        mapping[keyword] = categories
+        if is_unknown:
+            _unknown_words.append(keyword)
+    if unknown_words_path is not None:
+        flush_unknown_words(unknown_words_path)
+    else:
+        _unknown_words.clear()
+    return mapping
+
+
+def classify_file(input_file='keywords_histograms/all_keywords_processed.txt',
+                  output_file='keyword_classification_25_categories.csv',
+                  processes=None):
+    # plotting dependencies are only needed when run as a script
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    from collections import Counter
+
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            keywords = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: Input file {input_file} not found.")
+        return 1
+
+    # delete the first two since they are the title of the file
+    keywords = keywords[2:]
+
+    # Create CSV output
+    classification = classify_keywords(keywords, processes=processes)
+    output_data = []
+    for keyword in keywords:
+        # Join multiple categories into a single string for the CSV cell, separated by a semicolon
+        output_data.append([keyword, '; '.join(classification[keyword])])
+
+    # Write to CSV
+    if output_data:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['keyword', 'categories'])
+            writer.writerows(output_data)
+
+    # Prepare data for histogram (frequency count)
+    category_counts = {}
+    for _, categories_str in output_data:
+        # Split the string of categories to count each one
+        categories_list = categories_str.split('; ')
+        for category in categories_list:
+            category_counts[category] = category_counts.get(category, 0) + 1
+
+    # Sort categories for presentation
+    sorted_counts = sorted(category_counts.items(), key=lambda item: item[1], reverse=True)
+
+    # Print the final summary
+    print(f"Total classified keywords: {len(output_data)}")
+    print(f"Classification saved to {output_file} (FileTag: keyword_classification_25_categories.csv)")
+    print("\nTop 10 Category Frequencies (from total keyword classifications):")
+    for category, count in sorted_counts[:10]:
+        print(f"- {category}: {count}")
+
+    unclassified_count = category_counts.get('Z. Unclassified', 0)
+    print(f"\nTotal Z. Unclassified count: {unclassified_count}")
+
+    # Print the complete list of 25 categories and their counts
+    print("\nAll 25 Category Frequencies:")
+    all_category_counts = {cat: 0 for cat in CATEGORIES.keys()}
+    all_category_counts.update(category_counts)
+    sorted_all_counts = sorted(all_category_counts.items(), key=lambda item: item[0]) # Sort alphabetically by category code
+
+    for category, count in sorted_all_counts:
+        print(f"{category}: {count}")
+
+    # Parameters matching the attached image and your code
+    title = 'All counts of keyword\'s broad categories'
+    meta = {'displaylabel': f"Basic: {title}", 'color': 'green'}
+    top_n = 25 # Plotting all mock data points
+
+    # --- Core Plotting Logic (adapted from your snippet) ---
+    # Create a DataFrame from the mock data, simulating the output of counts.most_common()
+    counts = Counter(all_category_counts)
+    df = pd.DataFrame(counts.most_common(), columns=["broad_term", "count"])
+    # df = df.sort_values("broad_term")
+
+    # The actual file saving logic from your code:
+    df.to_csv(f"all_keywords_count.csv", index=False)
+
+    # Plot top N
+    top = df.head(top_n)
+    # Reverse the lists to ensure the highest frequency is at the top of the bar chart (plt.barh default)
+    # and the labels are in ascending frequency order on the Y-axis (as in your image)
+    labels = top['broad_term'].tolist()[::-1]
+    values = top['count'].tolist()[::-1]
+
+    # Plotting setup
+    plt.figure(figsize=(10, max(4, len(labels) * 0.25))) # Dynamic figure size
+    color = meta.get('color', '#333333')
+    plt.barh(labels, values, color=color)
+
+    # Labels and Title configuration
+    plt.xlabel('Frequency')
+    plt.title(meta.get('displaylabel'))
+    plt.tight_layout()
+
+    # The actual file saving logic from your code:
+    plt.savefig(f"all_keywords_count.png", dpi=150)
+    # plt.close()
+
+    # Display the plot
+    # plt.show()
+
+    print(f"Generated plot data for class: {meta['displaylabel']}")
+    return 0
+
+
+def main(argv):
+    paths = []
+    processes = None
+    i = 1
+    while i < len(argv):
+        if argv[i] == '--processes' and i + 1 < len(argv):
+            processes = int(argv[i + 1])
+            i += 2
+        elif argv[i].startswith('--'):
+            # an unknown option, or --processes without its value
+            print(f"Invalid option: {argv[i]}")
+            print("Usage: classify_keywords.py [all_keywords_processed.txt] [output.csv] [--processes N]")
+            return 1
+        else:
+            paths.append(argv[i])
+            i += 1
+    return classify_file(*paths[:2], processes=processes)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -3,6 +3,8 @@ import numpy as np
 from transformers import AutoTokenizer, AutoModel
 import torch
 from typing import List, Optional
+import logging
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -58,27 +60,35 @@ class SPECTER2Embedder:
         input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
         return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
     
-    def embed_texts(self, texts: List[str], max_length: int, batch_size: int = 32) -> np.ndarray:
+    def embed_texts(self, texts: List[str], max_length: int, batch_size: int = 32,
+                    metrics_hook: Optional["EmbeddingMetricsHook"] = None) -> np.ndarray:
         """
         Embed a list of texts using SPECTER2
         
         Args:
             texts: List of text strings to embed
             batch_size: Batch size for processing
+            metrics_hook: Optional EmbeddingMetricsHook that receives per-batch
+                latency, tokens/s, padding ratio and memory high-water mark.
+                When None (default) no diagnostics are collected at all.
             
         Returns:
             numpy array of embeddings
         """
         all_embeddings = []
+        num_batches = (len(texts) - 1) // batch_size + 1 if texts else 0
+        track_memory = metrics_hook is not None and self.device.type == 'cuda'
+        total_tokens = 0
+        total_time = 0.0
+        peak_memory_mb = None
         
         # Process in batches
         for i in range(0, len(texts), batch_size):
             batch_texts = texts[i:i + batch_size]
-            print(f"Processing batch {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}")
-            
-            # Monitor GPU usage
-            if torch.cuda.is_available():
-                print(f"  GPU memory before batch: {torch.cuda.memory_allocated() / 1024**2:.2f} MB")
+            if metrics_hook is not None:
+                if track_memory:
+                    torch.cuda.reset_peak_memory_stats(self.device)
+                start = time.perf_counter()
             
             # Tokenize
             encoded_input = self.tokenizer(
@@ -89,25 +99,149 @@ class SPECTER2Embedder:
                 return_tensors='pt' #it means pytorch tensor
             ).to(self.device)
             
-            # Verify tensors are on GPU
-            if torch.cuda.is_available():
-                print(f"  Input tensors device: {encoded_input['input_ids'].device}")
-            
             # Generate embeddings
             with torch.no_grad():
                 model_output = self.model(**encoded_input)
                 embeddings = self.mean_pooling(model_output, encoded_input['attention_mask'])
                 embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+                # .cpu() synchronizes with the device, so the timing below is accurate
                 all_embeddings.append(embeddings.cpu().numpy())
             
-            # Monitor GPU usage after processing
-            if torch.cuda.is_available():
-                print(f"  GPU memory after batch: {torch.cuda.memory_allocated() / 1024**2:.2f} MB")
-                # Clear cache to prevent memory buildup
-                torch.cuda.empty_cache()
+            if metrics_hook is not None:
+                latency = time.perf_counter() - start
+                attention_mask = encoded_input['attention_mask']
+                tokens = int(attention_mask.sum().item())
+                padded_tokens = attention_mask.numel()
+                memory_mb = None
+                if track_memory:
+                    memory_mb = torch.cuda.max_memory_allocated(self.device) / 1024**2
+                    peak_memory_mb = max(peak_memory_mb or 0.0, memory_mb)
+                total_tokens += tokens
+                total_time += latency
+                metrics_hook.on_batch({
+                    'batch': i // batch_size + 1,
+                    'num_batches': num_batches,
+                    'batch_size': len(batch_texts),
+                    'latency_s': latency,
+                    'tokens': tokens,
+                    'tokens_per_s': tokens / latency if latency > 0 else 0.0,
+                    'padding_ratio': 1.0 - tokens / padded_tokens if padded_tokens else 0.0,
+                    'memory_high_water_mb': memory_mb,
+                })
+        
+        if metrics_hook is not None:
+            metrics_hook.on_end({
+                'num_batches': num_batches,
+                'num_texts': len(texts),
+                'total_time_s': total_time,
+                'tokens': total_tokens,
+                'tokens_per_s': total_tokens / total_time if total_time > 0 else 0.0,
+                'memory_high_water_mb': peak_memory_mb,
+            })
         
         return np.vstack(all_embeddings)
 
+
+class EmbeddingMetricsHook:
+    """
+    Receives per-batch diagnostics from SPECTER2Embedder.embed_texts.
+    
+    Subclass and override on_batch/on_end. Each batch dict contains: batch,
+    num_batches, batch_size, latency_s, tokens, tokens_per_s, padding_ratio and
+    memory_high_water_mb (None when running on CPU).
+    """
+    
+    def on_batch(self, metrics: dict):
+        pass
+    
+    def on_end(self, summary: dict):
+        pass
+
+
+class TqdmMetricsHook(EmbeddingMetricsHook):
+    """
+    Show embedding progress as a tqdm bar with throughput in the postfix
+    """
+    
+    def __init__(self, desc: str = "Embedding"):
+        self.desc = desc
+        self.bar = None
+    
+    def on_batch(self, metrics: dict):
+        from tqdm import tqdm
+        if self.bar is None:
+            self.bar = tqdm(total=metrics['num_batches'], desc=self.desc)
+        postfix = {
+            'tok/s': f"{metrics['tokens_per_s']:.0f}",
+            'pad': f"{metrics['padding_ratio']:.2f}",
+        }
+        if metrics['memory_high_water_mb'] is not None:
+            postfix['mem_mb'] = f"{metrics['memory_high_water_mb']:.0f}"
+        self.bar.set_postfix(postfix, refresh=False)
+        self.bar.update(1)
+    
+    def on_end(self, summary: dict):
+        if self.bar is not None:
+            self.bar.close()
+            self.bar = None
+
+
+class LoggingMetricsHook(EmbeddingMetricsHook):
+    """
+    Log batch metrics through the logging module, every `every` batches
+    """
+    
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO, every: int = 1):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+        self.every = every
+    
+    def on_batch(self, metrics: dict):
+        if metrics['batch'] % self.every and metrics['batch'] != metrics['num_batches']:
+            return
+        memory = metrics['memory_high_water_mb']
+        self.logger.log(
+            self.level,
+            "batch %d/%d: %.3fs, %.0f tokens/s, padding %.2f, peak memory %s",
+            metrics['batch'], metrics['num_batches'], metrics['latency_s'],
+            metrics['tokens_per_s'], metrics['padding_ratio'],
+            f"{memory:.2f} MB" if memory is not None else "n/a",
+        )
+    
+    def on_end(self, summary: dict):
+        self.logger.log(
+            self.level,
+            "embedded %d texts in %.2fs (%.0f tokens/s)",
+            summary['num_texts'], summary['total_time_s'], summary['tokens_per_s'],
+        )
+
+
+class MLflowMetricsHook(EmbeddingMetricsHook):
+    """
+    Log batch metrics to the active MLflow run (one step per batch)
+    """
+    
+    def __init__(self, prefix: str = "embed", every: int = 1):
+        self.prefix = prefix
+        self.every = every
+    
+    def _log(self, metrics: dict, step: Optional[int] = None):
+        import mlflow
+        values = {
+            f"{self.prefix}_{key}": value
+            for key, value in metrics.items()
+            if value is not None and key not in ('batch', 'num_batches')
+        }
+        mlflow.log_metrics(values, step=step)
+    
+    def on_batch(self, metrics: dict):
+        if metrics['batch'] % self.every == 0:
+            self._log(metrics, step=metrics['batch'])
+    
+    def on_end(self, summary: dict):
+        self._log({f"total_{key}": value for key, value in summary.items()})
+
+
 def embed_papers_dataframe(
     df: pd.DataFrame,
     device,
@@ -176,7 +310,8 @@ def embed_column(
     device: str,
     column: str = 'keywords',
     model_name: str = "allenai/specter2_base",
-    batch_size: int = 8
+    batch_size: int = 8,
+    metrics_hook: Optional[EmbeddingMetricsHook] = None
 ) -> pd.DataFrame:
     """
     Embed papers in a pandas DataFrame using SPECTER2
@@ -187,6 +322,7 @@ def embed_column(
         model_name: SPECTER2 model to use
         max_length: max stoken size for each text
         batch_size: Batch size for processing
+        metrics_hook: Optional per-batch instrumentation (see EmbeddingMetricsHook)
         
     Returns:
         DataFrame with added embedding column
@@ -201,7 +337,7 @@ def embed_column(
 
     # Embed titles and abstracts separately
     print(f"Embedding {len(df)} entrise for {column}...")
-    column_embeddings = embedder.embed_texts(df[column].to_list(), max_length, batch_size)
+    column_embeddings = embedder.embed_texts(df[column].to_list(), max_length, batch_size, metrics_hook=metrics_hook)
     
     # Add only the embedding vector columns (not individual dimensions)
     result_df[f'{column}_embedding_Vector'] = [emb for emb in column_embeddings]
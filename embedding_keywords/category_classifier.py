@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+
+def vectors_from_strings(values: Iterable[str], dim: Optional[int] = None, chunk_size: int = 20000) -> np.ndarray:
+    """
+    Parse "[0.1 0.2 ...]" strings (as written by to_csv) into a float32 matrix.
+
+    Rows are parsed chunk by chunk with a single np.fromstring call each,
+    instead of one Python float() per component.
+
+    Args:
+        values: Sequence of vector strings
+        dim: Vector dimension (inferred from the first row when None)
+        chunk_size: Number of rows parsed per call
+
+    Returns:
+        (N x dim) float32 matrix
+    """
+    values = list(values)
+    if not values:
+        return np.empty((0, dim or 0), dtype=np.float32)
+    if dim is None:
+        dim = len(values[0].strip("[]").split())
+    matrix = np.empty((len(values), dim), dtype=np.float32)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        text = " ".join(s.strip().strip("[]") for s in chunk)
+        flat = np.fromstring(text, dtype=np.float32, sep=" ")
+        matrix[start:start + len(chunk)] = flat.reshape(len(chunk), dim)
+    return matrix
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of matrix with L2-normalized rows."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def load_normalized_matrix(csv_path: Path, column: str, cache_path: Path, sep: str = "\t") -> np.ndarray:
+    """
+    Load a column of embedding strings as a normalized float32 matrix.
+
+    The parsed matrix is cached as .npy next to the CSV and memory-mapped on
+    later runs, so millions of keywords never need to be parsed again.
+    """
+    if cache_path.exists() and cache_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        return np.load(cache_path, mmap_mode="r")
+    values = pd.read_csv(csv_path, sep=sep, usecols=[column])[column]
+    matrix = normalize_rows(vectors_from_strings(values))
+    np.save(cache_path, matrix)
+    return np.load(cache_path, mmap_mode="r")
+
+
+class CategoryClassifier:
+    """
+    Assign keywords to categories by cosine similarity of their embeddings.
+
+    Category embeddings are normalized once; keywords are expected to be
+    normalized already (SPECTER2Embedder output is), so every chunk costs one
+    float32 GEMM plus an argpartition for the top-k.
+    """
+
+    def __init__(self, category_embeddings: np.ndarray, category_labels: List[str]):
+        """
+        Args:
+            category_embeddings: (C x D) category embedding matrix
+            category_labels: Name of each category row
+        """
+        if len(category_labels) != len(category_embeddings):
+            raise ValueError("category_labels must have one entry per category embedding")
+        self.categories = normalize_rows(category_embeddings)
+        self.labels = np.asarray(category_labels, dtype=object)
+
+    def classify(
+        self,
+        keyword_embeddings: np.ndarray,
+        top_k: int = 3,
+        chunk_size: int = 65536,
+        normalized: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rank categories for every keyword.
+
+        Args:
+            keyword_embeddings: (N x D) matrix, may be a np.memmap
+            top_k: Number of categories kept per keyword
+            chunk_size: Keywords per GEMM; bounds memory to chunk_size x C
+            normalized: Whether keyword rows are already L2-normalized
+
+        Returns:
+            top_idx (N x k) category indices sorted by decreasing score,
+            top_scores (N x k) cosine similarities and
+            margin (N,) difference between the first and second score
+        """
+        n = len(keyword_embeddings)
+        n_categories = len(self.categories)
+        k = min(top_k, n_categories)
+        # we need at least two scores to compute the margin
+        kk = min(max(k, 2), n_categories)
+
+        top_idx = np.empty((n, k), dtype=np.int32)
+        top_scores = np.empty((n, k), dtype=np.float32)
+        margin = np.zeros(n, dtype=np.float32)
+
+        for start in range(0, n, chunk_size):
+            chunk = np.asarray(keyword_embeddings[start:start + chunk_size], dtype=np.float32)
+            if not normalized:
+                chunk = normalize_rows(chunk)
+            scores = chunk @ self.categories.T
+
+            if kk < n_categories:
+                candidates = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            else:
+                candidates = np.broadcast_to(np.arange(n_categories), scores.shape)
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1)
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+            end = start + len(chunk)
+            top_idx[start:end] = candidates[:, :k]
+            top_scores[start:end] = candidate_scores[:, :k]
+            if kk > 1:
+                margin[start:end] = candidate_scores[:, 0] - candidate_scores[:, 1]
+
+        return top_idx, top_scores, margin
+
+    def multi_label(self, top_idx: np.ndarray, top_scores: np.ndarray, max_gap: float) -> List[List[str]]:
+        """
+        Keep, for each keyword, every top-k category whose score is within
+        max_gap of the best one (the best category is always kept).
+        """
+        keep = top_scores >= (top_scores[:, :1] - max_gap)
+        return [list(self.labels[idx[mask]]) for idx, mask in zip(top_idx, keep)]
@@ -1,41 +1,46 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from pathlib import Path
-def str_to_vector(s):
-    # remove brackets and split by whitespace
-    s = s.strip("[]")
-    return np.array([float(x) for x in s.split()])
+from embedding_keywords.category_classifier import CategoryClassifier, load_normalized_matrix, vectors_from_strings
+
+TOP_K = 3
+# categories scoring within this gap of the best one are also assigned (multi-label)
+MULTI_LABEL_GAP = 0.02
+
 if __name__ == "__main__":
     root_folder = Path('embedding_keywords')
 
     embedded_categories_df = pd.read_csv(root_folder/"embedded_categories.csv", sep="\t")
     embedded_keywords_df = pd.read_csv(root_folder/"embedded_keywords.csv", sep="\t")
-    
-    
-    embedded_categories_df['text_for_embedding_embedding_Vector'] = embedded_categories_df['text_for_embedding_embedding_Vector'].apply(str_to_vector)
-    embedded_keywords_df['Keywords_embedding_Vector'] = embedded_keywords_df['Keywords_embedding_Vector'].apply(str_to_vector)
 
     # drop unclassified
     embedded_categories_df = embedded_categories_df.drop(embedded_categories_df.index[-1])
 
-    category_embeddings = np.stack(embedded_categories_df['text_for_embedding_embedding_Vector'].values)
-    keyword_embeddings = np.stack(embedded_keywords_df['Keywords_embedding_Vector'].values)
-
-    similarities = cosine_similarity(keyword_embeddings, category_embeddings)
+    category_embeddings = vectors_from_strings(embedded_categories_df['text_for_embedding_embedding_Vector'])
+    keyword_embeddings = load_normalized_matrix(
+        root_folder/"embedded_keywords.csv",
+        'Keywords_embedding_Vector',
+        cache_path=root_folder/"embedded_keywords_normalized.npy",
+    )
 
-    # Get the index of the max similarity for each keyword
-    best_category_idx = similarities.argmax(axis=1)
+    classifier = CategoryClassifier(category_embeddings, embedded_categories_df['category_key'].tolist())
+    top_idx, top_scores, margin = classifier.classify(keyword_embeddings, top_k=TOP_K)
 
     # Assign category labels
-    embedded_keywords_df['predicted_category'] = embedded_categories_df.iloc[best_category_idx]['category_key'].values
+    embedded_keywords_df['predicted_category'] = classifier.labels[top_idx[:, 0]]
 
     # Optional: store the similarity score
-    embedded_keywords_df['similarity_score'] = similarities.max(axis=1)
+    embedded_keywords_df['similarity_score'] = top_scores[:, 0]
+    embedded_keywords_df['margin'] = margin
+    embedded_keywords_df['top_categories'] = ['; '.join(classifier.labels[row]) for row in top_idx]
+    embedded_keywords_df['top_scores'] = ['; '.join(f"{s:.4f}" for s in row) for row in top_scores]
+    embedded_keywords_df['multi_label_categories'] = [
+        '; '.join(cats) for cats in classifier.multi_label(top_idx, top_scores, MULTI_LABEL_GAP)
+    ]
 
     # -----------------------------
     # Save or inspect
     # -----------------------------
     print(np.sum(embedded_keywords_df['similarity_score'] <= 0.25))
     embedded_keywords_df.to_csv(root_folder/"classified_embedded_keywords.csv", index=False, sep='\t')
-    print(embedded_keywords_df.head())
\ No newline at end of file
+    print(embedded_keywords_df.head())
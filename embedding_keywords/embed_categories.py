@@ -1,7 +1,7 @@
 import pandas as pd
 import json
 from pathlib import Path
-from SPECTER2Embedder import embed_column
+from embedding_keywords.SPECTER2Embedder import embed_column
 
 if __name__ == "__main__":
     root_folder = Path('embedding_keywords')
@@ -27,7 +27,7 @@ def str_to_vector(s):
 def find_synonyms(keywords: pd.Series, embeddings: pd.Series):
     synonyms = {}
     # synonyms_with_transitivity = {}
-    embeddings_matrix = np.vstack(df['Keywords_embedding_Vector'].values)
+    embeddings_matrix = np.vstack(embeddings.values)
     print("Calculating N x N similarity matrix...")
     similarity_matrix = cosine_similarity(embeddings_matrix, embeddings_matrix)
     print("Calculation complete. Extracting synonyms...")
@@ -42,7 +42,7 @@ def find_synonyms(keywords: pd.Series, embeddings: pd.Series):
 def find_synonyms_with_transitivity(keywords: pd.Series, embeddings: pd.Series):
     synonyms = {}
     synonyms_with_transitivity = {}
-    embeddings_matrix = np.vstack(df['Keywords_embedding_Vector'].values)
+    embeddings_matrix = np.vstack(embeddings.values)
     print("Calculating N x N similarity matrix...")
     similarity_matrix = cosine_similarity(embeddings_matrix, embeddings_matrix)
     print("Calculation complete. Extracting synonyms...")
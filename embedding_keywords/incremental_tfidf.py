@@ -0,0 +1,252 @@
+"""Incremental per-cluster TF-IDF for td_idf_to_keywords_per_cluster.py.
+
+Keeps a persisted state (vocabulary, per-term document frequency, document
+count, per-paper keyword counts and cluster assignment) so that when a few
+nodes of the GEXF are added, removed, edited or moved to another cluster only
+those papers are re-tokenized. The state records a hash of the synonym map
+it was built with; when the synonym groups change, every paper's canonical
+terms may change, so the state is rebuilt from scratch. Per-cluster scores are then recomputed from the
+stored counts with sparse matrix products, with the columns reordered to the
+refit's alphabetical vocabulary; features and clusters match a full refit
+with calculate_canonical_tfidf and the scores agree up to floating-point
+rounding.
+
+Usage:
+    python -m embedding_keywords.incremental_tfidf path/to/graph.gexf [state.npz]
+"""
+import sys
+import json
+import hashlib
+import numpy as np
+import networkx as nx
+import pandas as pd
+import scipy.sparse as sp
+from pathlib import Path
+from embedding_keywords.td_idf_to_keywords_per_cluster import (
+    MODULARITY_META,
+    OUT_DIR,
+    SYNONYMS_THRESHOLD,
+    load_synonym_data,
+    load_synonym_map,
+    normalize_keyword,
+    plot_top_three_scores_combined,
+    save_results,
+    split_keywords,
+)
+
+
+def synonym_map_digest(synonym_map: dict) -> str:
+    """SHA-256 of a synonym map's contents, independent of its key order."""
+    payload = json.dumps(synonym_map, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IncrementalTfidf:
+    """
+    Document-frequency state for paper-level TF-IDF aggregated by cluster.
+
+    Weights follow TfidfTransformer defaults (smooth idf, l2-normalized
+    papers), and cluster scores are the mean paper vector of each cluster.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop every paper, the vocabulary and the recorded synonym digest."""
+        self.vocabulary = {}                      # term -> column
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.papers = {}                          # paper id -> (cluster, raw keywords, columns, counts)
+        self.synonym_digest = None                # synonym_map_digest of the map the terms came from
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.papers)
+
+    def _columns(self, terms):
+        for term in terms:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+        if len(self.vocabulary) > len(self.doc_freq):
+            grown = np.zeros(len(self.vocabulary), dtype=np.int64)
+            grown[:len(self.doc_freq)] = self.doc_freq
+            self.doc_freq = grown
+        ids = np.fromiter((self.vocabulary[t] for t in terms), dtype=np.int64, count=len(terms))
+        return np.unique(ids, return_counts=True)
+
+    def add_paper(self, paper_id, cluster, raw_keywords: str, terms):
+        """Add a paper given its raw keyword string and canonical terms."""
+        if paper_id in self.papers:
+            self.remove_paper(paper_id)
+        columns, counts = self._columns(terms)
+        self.doc_freq[columns] += 1
+        self.papers[paper_id] = (cluster, raw_keywords, columns, counts)
+
+    def remove_paper(self, paper_id):
+        _, _, columns, _ = self.papers.pop(paper_id)
+        self.doc_freq[columns] -= 1
+
+    def reassign_paper(self, paper_id, cluster):
+        """Move a paper to another cluster; document frequencies are unchanged."""
+        _, raw_keywords, columns, counts = self.papers[paper_id]
+        self.papers[paper_id] = (cluster, raw_keywords, columns, counts)
+
+    def apply_delta(self, papers: dict, synonym_map: dict) -> dict:
+        """
+        Bring the state in line with `papers` (paper id -> (cluster, raw keywords)).
+
+        Only papers that are new or whose keyword string changed are split and
+        canonicalized again. If synonym_map differs from the one the state was
+        built with, the state is cleared first and every paper is added again.
+        Returns how many papers were added, removed, updated and reassigned,
+        and whether the state was rebuilt.
+        """
+        summary = {'added': 0, 'removed': 0, 'updated': 0, 'reassigned': 0, 'rebuilt': False}
+        digest = synonym_map_digest(synonym_map)
+        if digest != self.synonym_digest:
+            summary['rebuilt'] = bool(self.papers)
+            self.reset()
+            self.synonym_digest = digest
+        for paper_id in [p for p in self.papers if p not in papers]:
+            self.remove_paper(paper_id)
+            summary['removed'] += 1
+
+        for paper_id, (cluster, raw_keywords) in papers.items():
+            current = self.papers.get(paper_id)
+            if current is not None and current[1] == raw_keywords:
+                if current[0] != cluster:
+                    self.reassign_paper(paper_id, cluster)
+                    summary['reassigned'] += 1
+                continue
+            terms = [synonym_map.get(normalize_keyword(t), normalize_keyword(t))
+                     for t in split_keywords(raw_keywords)]
+            summary['updated' if current is not None else 'added'] += 1
+            self.add_paper(paper_id, cluster, raw_keywords, terms)
+        return summary
+
+    def idf(self) -> np.ndarray:
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1.0
+
+    def cluster_scores(self):
+        """
+        Mean TF-IDF vector per cluster.
+
+        Returns the sparse (clusters x keywords) matrix, the feature names and
+        the sorted cluster ids, like calculate_canonical_tfidf. Columns follow
+        the refit's alphabetical vocabulary rather than insertion order, and
+        terms no remaining paper uses are dropped.
+        """
+        records = list(self.papers.values())
+        clusters = [r[0] for r in records]
+        lengths = np.array([len(r[2]) for r in records], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.concatenate([r[2] for r in records]) if records else np.zeros(0, dtype=np.int64)
+        counts = np.concatenate([r[3] for r in records]) if records else np.zeros(0)
+
+        weights = counts * self.idf()[indices]
+        row_of_entry = np.repeat(np.arange(len(records)), lengths)
+        norms = np.sqrt(np.bincount(row_of_entry, weights=weights ** 2, minlength=len(records)))
+        norms[norms == 0] = 1.0
+        X = sp.csr_matrix((weights / norms[row_of_entry], indices, indptr),
+                          shape=(len(records), len(self.vocabulary)))
+
+        cluster_ids, cluster_index = np.unique(np.asarray(clusters), return_inverse=True)
+        sizes = np.bincount(cluster_index)
+        indicator = sp.csr_matrix(
+            (1.0 / sizes[cluster_index], (cluster_index, np.arange(len(records)))),
+            shape=(len(cluster_ids), len(records)),
+        )
+        feature_names = np.array(sorted(t for t, i in self.vocabulary.items() if self.doc_freq[i] > 0),
+                                 dtype=object)
+        order = np.fromiter((self.vocabulary[t] for t in feature_names), dtype=np.int64,
+                            count=len(feature_names))
+        return (indicator @ X[:, order]).tocsr(), feature_names, cluster_ids.tolist()
+
+    def save(self, path: Path):
+        ids = list(self.papers)
+        records = [self.papers[p] for p in ids]
+        meta = {
+            'vocabulary': sorted(self.vocabulary, key=self.vocabulary.get),
+            'paper_ids': ids,
+            'clusters': [r[0] for r in records],
+            'raw_keywords': [r[1] for r in records],
+            'synonym_digest': self.synonym_digest,
+        }
+        lengths = np.array([len(r[2]) for r in records], dtype=np.int64)
+        np.savez_compressed(
+            path,
+            meta=np.array(json.dumps(meta, ensure_ascii=False)),
+            doc_freq=self.doc_freq,
+            lengths=lengths,
+            columns=np.concatenate([r[2] for r in records]) if records else np.zeros(0, dtype=np.int64),
+            counts=np.concatenate([r[3] for r in records]) if records else np.zeros(0, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "IncrementalTfidf":
+        state = cls()
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            state.doc_freq = data['doc_freq']
+            offsets = np.concatenate([[0], np.cumsum(data['lengths'])])
+            columns, counts = data['columns'], data['counts']
+        state.vocabulary = {term: i for i, term in enumerate(meta['vocabulary'])}
+        # states saved before the digest was recorded are rebuilt by apply_delta
+        state.synonym_digest = meta.get('synonym_digest')
+        for i, paper_id in enumerate(meta['paper_ids']):
+            start, end = offsets[i], offsets[i + 1]
+            state.papers[paper_id] = (meta['clusters'][i], meta['raw_keywords'][i],
+                                      columns[start:end], counts[start:end])
+        return state
+
+
+def papers_from_gexf(gexf_file) -> dict:
+    """Paper id -> (cluster, raw keywords), filtered like calculate_canonical_tfidf."""
+    G = nx.read_gexf(gexf_file)
+    papers = {}
+    for node_id, data in G.nodes(data=True):
+        keywords = data.get("keywords")
+        cluster = data.get("modularity_class")
+        if keywords is None or cluster is None or pd.isna(keywords) or keywords == "Unknown keywords":
+            continue
+        if cluster not in MODULARITY_META:
+            continue
+        papers[node_id] = (cluster, keywords)
+    return papers
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python -m embedding_keywords.incremental_tfidf path/to/graph.gexf [state.npz]")
+        return 1
+    gexf_file = Path(argv[1])
+    if not gexf_file.exists():
+        print(f"GEXF file not found: {gexf_file}")
+        return 1
+    state_path = Path(argv[2]) if len(argv) > 2 else OUT_DIR / "tfidf_state.npz"
+
+    synonym_dict_path = Path('embedding_keywords') / f"keyword_synonyms_{SYNONYMS_THRESHOLD}_with_transitivity.json"
+    synonym_map = load_synonym_map(load_synonym_data(synonym_dict_path))
+
+    if state_path.exists():
+        state = IncrementalTfidf.load(state_path)
+        print(f"Loaded TF-IDF state with {state.n_docs} papers from {state_path}")
+    else:
+        state = IncrementalTfidf()
+        print("No saved TF-IDF state, starting from an empty corpus")
+
+    summary = state.apply_delta(papers_from_gexf(gexf_file), synonym_map)
+    print(f"Applied graph changes: {summary}")
+
+    OUT_DIR.mkdir(exist_ok=True)
+    state.save(state_path)
+    print(f"Saved TF-IDF state to {state_path}")
+
+    X_clustered, feature_names, cluster_ids = state.cluster_scores()
+    top_three_scores = save_results(X_clustered, feature_names, cluster_ids, MODULARITY_META)
+    plot_top_three_scores_combined(top_three_scores, MODULARITY_META)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
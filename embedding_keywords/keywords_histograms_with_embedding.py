@@ -165,19 +165,28 @@ def normalize_plural(keyword: str) -> str:
 
 def load_embedding_category_mapping(csv_path: Path, sep: str) -> dict:
     """
-    Load mapping from keyword → predicted broad category
+    Load mapping from keyword → list of predicted broad categories
     from the embeddings classification CSV.
+
+    Uses the multi-label column written by classify_embedded_keywords.py when
+    present, otherwise the single predicted category.
     """
     if not csv_path.exists():
         print(f"Error: {csv_path} not found.")
         return {}
 
-    df = pd.read_csv(csv_path, usecols=["Keywords", "predicted_category"], sep=sep)
+    columns = pd.read_csv(csv_path, sep=sep, nrows=0).columns
+    category_col = "multi_label_categories" if "multi_label_categories" in columns else "predicted_category"
+    df = pd.read_csv(csv_path, usecols=["Keywords", category_col], sep=sep)
 
     mapping = {}
-    for _, row in df.iterrows():
-        kw = normalize_keyword(row["Keywords"])
-        mapping[kw] = row["predicted_category"]
+    for kw, categories in zip(df["Keywords"], df[category_col]):
+        # a missing cell would otherwise become a category named "nan"
+        if pd.isna(categories):
+            continue
+        labels = [c.strip() for c in str(categories).split(';') if c.strip()]
+        if labels:
+            mapping[normalize_keyword(kw)] = labels
 
     print(f"Loaded {len(mapping)} embedding-based keyword classifications.")
     return mapping
@@ -223,9 +232,9 @@ def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30):
         class_keyword_counts[cls_int].update(normalized_terms)
         # --- NEW BROAD CATEGORY COUNTING USING EMBEDDING CLASSIFICATION ---
         for term in normalized_terms:
-            broad_category = category_mapping.get(term)
-            if broad_category:
-                class_category_counts[cls_int][broad_category] += 1
+            broad_categories = category_mapping.get(term)
+            if broad_categories:
+                class_category_counts[cls_int].update(broad_categories)
             else:
                 terms_not_found_in_categories.add(term)
 
@@ -0,0 +1,168 @@
+"""2D projection of keyword embeddings for plotting.
+
+PCA pre-reduction (cached on disk by content hash) followed by one of:
+  - "tsne-bh":  scikit-learn Barnes-Hut t-SNE
+  - "tsne-fft": FFT-accelerated t-SNE from openTSNE (optional dependency)
+  - "umap":     UMAP from umap-learn (optional dependency)
+
+Every method accepts a previous layout as `init` to warm-start from it.
+
+Usage (timing benchmark over subsets of the keyword corpus):
+    python -m embedding_keywords.projection [sizes,comma,separated] [methods,comma,separated]
+"""
+import sys
+import json
+import time
+import hashlib
+import numpy as np
+from pathlib import Path
+from typing import Optional
+from sklearn.decomposition import PCA
+
+RANDOM_SEED = 42
+PCA_COMPONENTS = 50
+METHODS = ("tsne-bh", "tsne-fft", "umap")
+
+
+def content_hash(matrix: np.ndarray) -> str:
+    """SHA-1 of a matrix' shape, dtype and data."""
+    matrix = np.ascontiguousarray(matrix)
+    digest = hashlib.sha1(f"{matrix.shape}{matrix.dtype}".encode())
+    digest.update(memoryview(matrix).cast("B"))
+    return digest.hexdigest()
+
+
+def pca_reduce(X: np.ndarray, n_components: int = PCA_COMPONENTS, cache_dir: Optional[Path] = None) -> np.ndarray:
+    """
+    Reduce X to n_components with PCA, as float32.
+
+    With cache_dir the result is stored as pca<n>_<hash of X>.npy and loaded
+    from there whenever the same matrix is reduced again.
+    """
+    n_components = min(n_components, *X.shape)
+    cache_path = None
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_path = cache_dir / f"pca{n_components}_{content_hash(X)}.npy"
+        if cache_path.exists():
+            return np.load(cache_path)
+
+    reduced = PCA(n_components=n_components, random_state=RANDOM_SEED).fit_transform(X)
+    reduced = np.ascontiguousarray(reduced, dtype=np.float32)
+    if cache_path is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        np.save(cache_path, reduced)
+    return reduced
+
+
+def rescale_layout(layout: np.ndarray, target_std: float = 1e-4) -> np.ndarray:
+    """Scale a previous layout so t-SNE can use it as a warm start (first axis std = target_std)."""
+    layout = np.asarray(layout, dtype=np.float32)
+    return layout / np.std(layout[:, 0]) * target_std
+
+
+def project_2d(
+    X: np.ndarray,
+    method: str = "tsne-bh",
+    perplexity: float = 30.0,
+    learning_rate="auto",
+    init: Optional[np.ndarray] = None,
+    n_jobs: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Project (already reduced) vectors to 2D.
+
+    Args:
+        X: (N x d) matrix, usually the output of pca_reduce
+        method: one of METHODS
+        perplexity: t-SNE perplexity (used as n_neighbors for UMAP)
+        learning_rate: t-SNE learning rate
+        init: (N x 2) previous layout to warm-start from; defaults to PCA
+            (t-SNE) or spectral (UMAP) initialization
+        n_jobs: threads for the neighbor search / gradient
+
+    Returns:
+        (N x 2) float32 layout
+    """
+    if init is not None and method.startswith("tsne"):
+        init = rescale_layout(init)
+
+    if method == "tsne-bh":
+        from sklearn.manifold import TSNE
+        tsne = TSNE(n_components=2, method="barnes_hut", perplexity=perplexity, learning_rate=learning_rate,
+                    init="pca" if init is None else init, random_state=RANDOM_SEED, n_jobs=n_jobs)
+        layout = tsne.fit_transform(X)
+    elif method == "tsne-fft":
+        try:
+            from openTSNE import TSNE as OpenTSNE
+        except ImportError as e:
+            raise ImportError("method='tsne-fft' needs openTSNE (pip install openTSNE)") from e
+        tsne = OpenTSNE(n_components=2, negative_gradient_method="fft", perplexity=perplexity,
+                        learning_rate=learning_rate, initialization="pca" if init is None else init,
+                        random_state=RANDOM_SEED, n_jobs=n_jobs or 1)
+        layout = np.asarray(tsne.fit(X))
+    elif method == "umap":
+        try:
+            import umap
+        except ImportError as e:
+            raise ImportError("method='umap' needs umap-learn (pip install umap-learn)") from e
+        reducer = umap.UMAP(n_components=2, n_neighbors=max(2, int(perplexity)),
+                            init="spectral" if init is None else init, random_state=RANDOM_SEED,
+                            n_jobs=n_jobs or 1)
+        layout = reducer.fit_transform(X)
+    else:
+        raise ValueError(f"Unknown projection method {method!r}, expected one of {METHODS}")
+    return np.asarray(layout, dtype=np.float32)
+
+
+def benchmark(X: np.ndarray, sizes, methods=METHODS, perplexity: float = 30.0) -> list:
+    """
+    Time PCA pre-reduction and each projection method on the first `size` rows.
+
+    Methods whose optional dependency is missing are reported as skipped.
+    """
+    results = []
+    for size in sizes:
+        subset = X[:size]
+        start = time.perf_counter()
+        reduced = pca_reduce(subset)
+        pca_seconds = time.perf_counter() - start
+        for method in methods:
+            start = time.perf_counter()
+            try:
+                project_2d(reduced, method=method, perplexity=perplexity)
+                seconds = time.perf_counter() - start
+                status = "ok"
+            except ImportError as e:
+                seconds = None
+                status = f"skipped: {e}"
+            results.append({"n": len(subset), "method": method, "pca_s": pca_seconds,
+                            "projection_s": seconds, "status": status})
+            print(f"n={len(subset):>8}  {method:<8}  pca {pca_seconds:7.2f}s  "
+                  f"projection {'-' if seconds is None else f'{seconds:7.2f}s'}  {status}")
+    return results
+
+
+def main(argv):
+    root_folder = Path('embedding_keywords')
+    sizes = [int(s) for s in argv[1].split(',')] if len(argv) > 1 else [1000, 5000, 20000]
+    methods = argv[2].split(',') if len(argv) > 2 else list(METHODS)
+
+    # normalized keyword matrix cached by classify_embedded_keywords.py
+    matrix_path = root_folder / "embedded_keywords_normalized.npy"
+    if not matrix_path.exists():
+        print(f"{matrix_path} not found, run classify_embedded_keywords.py first")
+        return 1
+    X = np.load(matrix_path, mmap_mode="r")
+    sizes = [min(size, len(X)) for size in sizes]
+
+    results = benchmark(np.asarray(X[:max(sizes)]), sizes, methods)
+    out_path = root_folder / "projection_benchmark.json"
+    with open(out_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved benchmark results to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
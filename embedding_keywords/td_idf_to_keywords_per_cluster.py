@@ -3,15 +3,15 @@ import re
 import pandas as pd
 import numpy as np
 import networkx as nx
+import scipy.sparse as sp
 from pathlib import Path
 import json 
 from collections import defaultdict, Counter
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfTransformer
 import matplotlib.pyplot as plt
 
 SYNONYMS_THRESHOLD = 0.99
 OUT_DIR = Path(f"td-idf_results-per-cluster-{SYNONYMS_THRESHOLD}-claude-only-cluster-mean-top-3")
-OUT_DIR.mkdir(exist_ok=True)
 
 MODULARITY_META = {
     2: {"displaylabel": "Basic: Adaptation", "label": "Basic: Adaptation", "color": "#9A9CFF"},
@@ -115,9 +115,49 @@ def load_synonym_map(synonym_dict: dict) -> dict:
     
     return canonical_map
 
-def calculate_canonical_tfidf(gexf_file: str, synonym_dict_path: Path):
+def build_count_matrix(documents, vocabulary=None):
+    """
+    Build a CSR (papers x keywords) count matrix straight from term lists.
+
+    With vocabulary=None the vocabulary is every term, sorted alphabetically
+    (the same column order TfidfVectorizer uses); with a fixed vocabulary
+    (term -> column) unknown terms are dropped.
+    Returns the matrix and the vocabulary.
+    """
+    if vocabulary is None:
+        all_terms = sorted({term for doc in documents for term in doc})
+        vocabulary = {term: i for i, term in enumerate(all_terms)}
+    
+    indices = []
+    indptr = [0]
+    for doc in documents:
+        indices.extend(vocabulary[term] for term in doc if term in vocabulary)
+        indptr.append(len(indices))
+    
+    counts = sp.csr_matrix(
+        (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(documents), len(vocabulary)),
+    )
+    counts.sum_duplicates()
+    return counts, vocabulary
+
+def save_vocabulary(vocabulary: dict, path: Path):
+    """Save the vocabulary as a JSON list of terms in column order."""
+    terms = sorted(vocabulary, key=vocabulary.get)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(terms, f, ensure_ascii=False)
+
+def load_vocabulary(path: Path) -> dict:
+    """Load a vocabulary saved by save_vocabulary (term -> column)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {term: i for i, term in enumerate(json.load(f))}
+
+def calculate_canonical_tfidf(gexf_file: str, synonym_dict_path: Path, vocabulary_path: Path = None):
     """
     Calculate TF-IDF scores at the paper level, then aggregate by cluster.
+
+    If vocabulary_path points to a saved vocabulary it is reused as a fixed
+    vocabulary; the vocabulary used is always saved to OUT_DIR.
     """
     # 1. Load Data
     print(f"Reading GEXF file: {gexf_file}")
@@ -172,14 +212,14 @@ def calculate_canonical_tfidf(gexf_file: str, synonym_dict_path: Path):
                 print(f"Warning: Inconsistent mapping for '{raw_term}': "
                       f"'{qa_log[raw_term]}' vs '{canonical_term}'")
         
-        # Each paper becomes ONE document (tab-separated canonical keywords)
-        paper_doc = "\t".join(canonical_terms)
-        paper_corpus.append(paper_doc)
+        # Each paper becomes ONE document (its list of canonical keywords)
+        paper_corpus.append(canonical_terms)
         paper_clusters.append(modularity_class)
     
     print(f"Created corpus of {len(paper_corpus)} paper documents")
     
     # 4. Save QA Logs
+    OUT_DIR.mkdir(exist_ok=True)
     qa_log_path = OUT_DIR / "qa_canonical_keyword_mapping.json"
     with open(qa_log_path, 'w', encoding='utf-8') as f:
         json.dump(dict(sorted(qa_log.items())), f, indent=4, ensure_ascii=False)
@@ -195,38 +235,60 @@ def calculate_canonical_tfidf(gexf_file: str, synonym_dict_path: Path):
     
     # 5. Calculate TF-IDF at Paper Level
     print("\nCalculating TF-IDF at paper level...")
-    vectorizer = TfidfVectorizer(
-        tokenizer=lambda x: x.split('\t'),
-        token_pattern=None,
-        lowercase=False
-    )
-    
-    X = vectorizer.fit_transform(paper_corpus)
-    feature_names = vectorizer.get_feature_names_out()
+    vocabulary = None
+    if vocabulary_path is not None and Path(vocabulary_path).exists():
+        vocabulary = load_vocabulary(vocabulary_path)
+        print(f"Using fixed vocabulary of {len(vocabulary)} keywords from {vocabulary_path}")
+    counts, vocabulary = build_count_matrix(paper_corpus, vocabulary)
+    save_vocabulary(vocabulary, OUT_DIR / "tfidf_vocabulary.json")
+    
+    X = TfidfTransformer().fit_transform(counts)
+    feature_names = np.array(sorted(vocabulary, key=vocabulary.get), dtype=object)
     print(f"TF-IDF matrix shape: {X.shape} (papers x keywords)")
     print(f"Total unique canonical keywords in corpus: {len(feature_names)}")
     
     # 6. Aggregate TF-IDF Scores by Cluster
     print("\nAggregating TF-IDF scores by cluster...")
-    df['cluster'] = paper_clusters
-    
-    cluster_tfidf = {}
-    for cluster_id in df['cluster'].unique():
-        # Get indices of papers in this cluster
-        cluster_mask = df['cluster'] == cluster_id
-        cluster_indices = df[cluster_mask].index.tolist()
-        
-        # mean TF-IDF scores across all papers in cluster
-        cluster_vector = X[cluster_indices].mean(axis=0).A1
-        cluster_tfidf[cluster_id] = cluster_vector
-    
-    # Convert to matrix format (clusters x keywords)
-    cluster_ids = sorted(cluster_tfidf.keys())
-    X_clustered = np.vstack([cluster_tfidf[cid] for cid in cluster_ids])
+    X_clustered, cluster_ids = aggregate_by_cluster(X, paper_clusters)
     
     print(f"Aggregated to {len(cluster_ids)} clusters")
     
-    return X_clustered, vectorizer, cluster_ids
+    return X_clustered, feature_names, cluster_ids
+
+def aggregate_by_cluster(X, paper_clusters):
+    """
+    Mean TF-IDF vector of every cluster with one sparse matmul.
+
+    Builds a (clusters x papers) indicator matrix whose entries are
+    1 / cluster size, so indicator @ X gives all cluster means at once.
+    Returns the sparse (clusters x keywords) matrix and the sorted cluster ids.
+    """
+    cluster_ids, cluster_index = np.unique(np.asarray(paper_clusters), return_inverse=True)
+    cluster_sizes = np.bincount(cluster_index)
+    n_papers = len(cluster_index)
+    indicator = sp.csr_matrix(
+        (1.0 / cluster_sizes[cluster_index], (cluster_index, np.arange(n_papers))),
+        shape=(len(cluster_ids), n_papers),
+    )
+    return (indicator @ X).tocsr(), cluster_ids.tolist()
+
+def top_scores(X, row, top_n=None):
+    """
+    Positive scores of one row of a sparse matrix, sorted in decreasing order.
+
+    Only the stored entries are touched; with top_n the candidates are first
+    narrowed down with argpartition. Returns (feature indices, scores).
+    """
+    start, end = X.indptr[row], X.indptr[row + 1]
+    indices = X.indices[start:end]
+    data = X.data[start:end]
+    positive = data > 0
+    indices, data = indices[positive], data[positive]
+    if top_n is not None and top_n < len(data):
+        best = np.argpartition(-data, top_n - 1)[:top_n]
+        indices, data = indices[best], data[best]
+    order = np.argsort(-data, kind='stable')
+    return indices[order], data[order]
 
 def sanitize_filename(name):
     """Sanitizes a string for use as a filename."""
@@ -234,13 +296,12 @@ def sanitize_filename(name):
     name = re.sub(r'[\\/*?:"<>|]', "", name)
     return re.sub(r'\s+', '_', name).strip()
 
-def save_results(X, vectorizer, cluster_ids, MODULARITY_META, top_n=20):
+def save_results(X, feature_names, cluster_ids, MODULARITY_META, top_n=20):
     """
     Save TF-IDF results per cluster with histograms.
     """
     print("\n--- Generating TF-IDF Histograms and CSVs ---")
-    
-    feature_names = vectorizer.get_feature_names_out()
+    OUT_DIR.mkdir(exist_ok=True)
     
     for i, cluster_id in enumerate(cluster_ids):
         meta = MODULARITY_META.get(cluster_id, {})
@@ -248,17 +309,15 @@ def save_results(X, vectorizer, cluster_ids, MODULARITY_META, top_n=20):
         plot_color = meta.get('color', '#1f77b4')
         
         # Get scores for this cluster
-        cluster_vector = X[i]
-        scores = pd.Series(cluster_vector, index=feature_names)
-        scores = scores[scores > 0].sort_values(ascending=False)
+        keyword_idx, scores = top_scores(X, i)
         
         # Save CSV
         file_label = sanitize_filename(meta.get('label', f'{cluster_id}'))
         csv_path = OUT_DIR / f"cluster_{cluster_id}_{file_label}_tfidf_scores.csv"
         
         df_output = pd.DataFrame({
-            "canonical_keyword": scores.index,
-            "tfidf_score": scores.values
+            "canonical_keyword": feature_names[keyword_idx],
+            "tfidf_score": scores
         })
         df_output["canonical_keyword"] = df_output["canonical_keyword"].str.title()
         df_output.to_csv(csv_path, index=False)
@@ -285,14 +344,13 @@ def save_results(X, vectorizer, cluster_ids, MODULARITY_META, top_n=20):
         print(f"Saved histogram: {png_path.name}")
     
     # Return the aggregated top scores for the combined plot
-    return _aggregate_top_scores(X, vectorizer, cluster_ids, MODULARITY_META, top_n=3)
+    return _aggregate_top_scores(X, feature_names, cluster_ids, MODULARITY_META, top_n=3)
 
 
-def _aggregate_top_scores(X, vectorizer, cluster_ids, MODULARITY_META, top_n=3):
+def _aggregate_top_scores(X, feature_names, cluster_ids, MODULARITY_META, top_n=3):
     """
     Helper function to aggregate the top N scores and their metadata for all clusters.
     """
-    feature_names = vectorizer.get_feature_names_out()
     combined_scores = []
 
     for i, cluster_id in enumerate(cluster_ids):
@@ -300,15 +358,10 @@ def _aggregate_top_scores(X, vectorizer, cluster_ids, MODULARITY_META, top_n=3):
         display_label = meta.get('displaylabel', f"Cluster {cluster_id}")
         plot_color = meta.get('color', '#1f77b4')
 
-        # Get scores for this cluster
-        cluster_vector = X[i]
-        scores = pd.Series(cluster_vector, index=feature_names)
-        scores = scores[scores > 0].sort_values(ascending=False)
-        
-        # Get top N scores
-        top_n_scores = scores.head(top_n)
+        # Get top N scores for this cluster
+        keyword_idx, scores = top_scores(X, i, top_n)
 
-        for rank, (keyword, score) in enumerate(top_n_scores.items()):
+        for rank, (keyword, score) in enumerate(zip(feature_names[keyword_idx], scores)):
             combined_scores.append({
                 'cluster_id': cluster_id,
                 'cluster_label': display_label.replace('\n', ' '),
@@ -377,16 +430,17 @@ def plot_top_three_scores_combined(combined_scores_data, MODULARITY_META):
 
 
 # Main execution
-gexf_file = "filtered_with_transferred_mesh_fixed_fix_commas.gexf"
-synonym_dict_path = Path('embedding_keywords') / f"keyword_synonyms_{SYNONYMS_THRESHOLD}_with_transitivity.json"
+if __name__ == "__main__":
+    gexf_file = "filtered_with_transferred_mesh_fixed_fix_commas.gexf"
+    synonym_dict_path = Path('embedding_keywords') / f"keyword_synonyms_{SYNONYMS_THRESHOLD}_with_transitivity.json"
 
-# Calculate TF-IDF scores
-X_matrix, vectorizer_model, cluster_list = calculate_canonical_tfidf(gexf_file, synonym_dict_path)
+    # Calculate TF-IDF scores
+    X_matrix, feature_names, cluster_list = calculate_canonical_tfidf(gexf_file, synonym_dict_path)
 
-# Save individual cluster results and get aggregated top 3 scores
-top_three_scores = save_results(X_matrix, vectorizer_model, cluster_list, MODULARITY_META)
+    # Save individual cluster results and get aggregated top 3 scores
+    top_three_scores = save_results(X_matrix, feature_names, cluster_list, MODULARITY_META)
 
-# Plot the combined top 3 scores
-plot_top_three_scores_combined(top_three_scores, MODULARITY_META)
+    # Plot the combined top 3 scores
+    plot_top_three_scores_combined(top_three_scores, MODULARITY_META)
 
-print("\nScript execution successful!")
\ No newline at end of file
+    print("\nScript execution successful!")
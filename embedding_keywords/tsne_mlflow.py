@@ -1,15 +1,28 @@
 
 import mlflow
 from itertools import product
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 import tempfile
 import os 
 import numpy as np
 from pathlib import Path
 import pandas as pd
+from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
+from sklearn.neighbors import NearestNeighbors
 import plotly.express as px
 from tqdm import tqdm
+from embedding_keywords.category_classifier import vectors_from_strings
+from embedding_keywords.projection import PCA_COMPONENTS, pca_reduce
 RANDOM_SEED = 42
+TRACKING_URI = "mlexperiments"
+EXPERIMENT_NAME = "tsne_experiment"
+# Plot artifacts: points are binned on a GRID_SIZE x GRID_SIZE grid and at most
+# MAX_POINTS_PER_CELL points per (cell, category) are drawn
+GRID_SIZE = 256
+MAX_POINTS_PER_CELL = 20
 cluster_label_color_map = {
     'A. Neuroscience & Neuroanatomy': '#D98DFF',  # light purple
     'B. Neuropharmacology & Biochemistry': '#6AC500',  # green
@@ -38,69 +51,190 @@ cluster_label_color_map = {
     'Z. Unclassified': '#8B8B8B'  # gray
 }
 
-def str_to_vector(s):
-    # remove brackets and split by whitespace
-    s = s.strip("[]")
-    return np.array([float(x) for x in s.split()])
+def pca_init(reduced: np.ndarray) -> np.ndarray:
+    """The same "pca" initialization TSNE computes internally, done once for the whole sweep."""
+    pca = PCA(n_components=2, svd_solver="randomized", random_state=RANDOM_SEED)
+    init = pca.fit_transform(reduced).astype(np.float32, copy=False)
+    return init / np.std(init[:, 0]) * 1e-4
 
-mlflow.set_tracking_uri("mlexperiments")
-mlflow.set_experiment("tsne_experiment")
-root_folder = Path('embedding_keywords')
 
+def knn_squared_distances(reduced: np.ndarray, perplexity: float):
+    """
+    Sparse kNN graph with squared euclidean distances, as TSNE builds it for
+    Barnes-Hut. Passed with metric="precomputed" it is shared by all learning
+    rates of one perplexity.
+    """
+    n_neighbors = min(len(reduced) - 1, int(3.0 * perplexity + 1))
+    # each sample is its own first neighbor here, as in KNeighborsTransformer
+    knn = NearestNeighbors(n_neighbors=n_neighbors + 1, metric="euclidean")
+    knn.fit(reduced)
+    graph = knn.kneighbors_graph(reduced, mode="distance")
+    graph.data **= 2
+    return graph
 
-embedded_keywords_df = pd.read_csv(root_folder/"classified_embedded_keywords.csv", sep="\t")
-embedded_keywords_df['Keywords_embedding_Vector'] = embedded_keywords_df['Keywords_embedding_Vector'].apply(str_to_vector)
 
-perplexities = np.arange(5, 60, 5)
-learning_rates = np.arange(50.0, 100.0, 50.0)
-for combination in tqdm(product(perplexities, learning_rates)):
-    perplexity, learning_rate = combination
-    with mlflow.start_run():
-        mlflow.log_param("perplexity", perplexity)
-        mlflow.log_param("learning_rate", learning_rate)
-        embeddings = np.array(embedded_keywords_df['Keywords_embedding_Vector'].tolist())
-        
-        tsne = TSNE(n_components=2, random_state=RANDOM_SEED, perplexity=perplexity, learning_rate=learning_rate)
-        embeddings_2d = tsne.fit_transform(embeddings)
+def downsample_dense(xy: np.ndarray, categories: np.ndarray, grid_size: int = GRID_SIZE,
+                     max_per_cell: int = MAX_POINTS_PER_CELL, seed: int = RANDOM_SEED):
+    """
+    Thin out dense regions of a scatter plot.
 
-        embedded_keywords_df['tsne_x'] = embeddings_2d[:, 0]
-        embedded_keywords_df['tsne_y'] = embeddings_2d[:, 1]
+    Returns the indices of the points to draw and, for each of them, how many
+    points of its (cell, category) bin it stands for.
+    """
+    if len(xy) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    lo = xy.min(axis=0)
+    span = np.maximum(xy.max(axis=0) - lo, 1e-12)
+    cells = np.minimum(((xy - lo) / span * grid_size).astype(np.int64), grid_size - 1)
+    _, category_codes = np.unique(categories, return_inverse=True)
+    bins = (cells[:, 0] * grid_size + cells[:, 1]) * (category_codes.max() + 1) + category_codes
 
-        
-        # Now use this in your plot
-        fig = px.scatter(
-            embedded_keywords_df,
-            x='tsne_x',
-            y='tsne_y',
-            color='predicted_category',       # this contains the label names
-            # size=1,         
-            hover_data=['Keywords', 'predicted_category', 'similarity_score'],
-            title='t-SNE Visualization (Colored by Selected Clusters and Sized by Degree)',
-            color_discrete_map=cluster_label_color_map,  # map labels to colors
-        )
+    # random order inside each bin, then keep the first max_per_cell of every bin
+    shuffled = np.random.default_rng(seed).permutation(len(xy))
+    order = shuffled[np.argsort(bins[shuffled], kind="stable")]
+    sorted_bins = bins[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    keep = rank < max_per_cell
+    kept_per_bin = np.minimum(sizes, max_per_cell)
+    weight = np.repeat(sizes / kept_per_bin, sizes)
+    return order[keep], np.round(weight[keep]).astype(np.int64)
 
-        fig.update_layout(
-            hoverlabel=dict(
-                bgcolor="white",
-                font_size=12
-            ),
-            legend=dict(
-                orientation="v",
-                yanchor="middle",
-                y=0.5,
-                xanchor="left",
-                x=1.02
-            )
-        )
-                        # Use temporary files that get automatically cleaned up
+
+def log_shared_metadata(metadata: pd.DataFrame) -> str:
+    """Log the per-keyword metadata once, in its own run; returns that run's id."""
+    with mlflow.start_run(run_name="tsne_metadata") as run:
+        mlflow.log_param("n_keywords", len(metadata))
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Save HTML file temporarily
-            html_path = os.path.join(temp_dir, f"tsne_p{perplexity}_lr{learning_rate}.html")
-            fig.write_html(html_path, include_plotlyjs="cdn")
-            mlflow.log_artifact(html_path, "plots")
-            
-            # Save CSV file temporarily  
-            csv_path = os.path.join(temp_dir, f"tsne_data_p{perplexity}_lr{learning_rate}.csv")
-            embedded_keywords_df.to_csv(csv_path, sep="\t", index=False)
-            mlflow.log_artifact(csv_path, "data")
-            
\ No newline at end of file
+            metadata_path = os.path.join(temp_dir, "keywords_metadata.tsv.gz")
+            metadata.to_csv(metadata_path, sep="\t", index=False)
+            mlflow.log_artifact(metadata_path, "data")
+    return run.info.run_id
+
+
+# Per-worker state, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, shape, dtype, init, metadata, metadata_run_id):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm  # keep the mapping alive
+    _worker['reduced'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker['init'] = init
+    _worker['metadata'] = metadata
+    _worker['metadata_run_id'] = metadata_run_id
+    mlflow.set_tracking_uri(TRACKING_URI)
+    mlflow.set_experiment(EXPERIMENT_NAME)
+
+
+def run_perplexity(perplexity, learning_rates):
+    """Fit and log one t-SNE per learning rate, reusing the kNN graph of this perplexity."""
+    reduced = _worker['reduced']
+    distances = knn_squared_distances(reduced, perplexity)
+    for learning_rate in learning_rates:
+        with mlflow.start_run():
+            mlflow.log_param("perplexity", perplexity)
+            mlflow.log_param("learning_rate", learning_rate)
+            mlflow.log_param("pca_components", reduced.shape[1])
+            mlflow.set_tag("metadata_run_id", _worker['metadata_run_id'])
+
+            tsne = TSNE(n_components=2, random_state=RANDOM_SEED, perplexity=perplexity,
+                        learning_rate=learning_rate, metric="precomputed", init=_worker['init'])
+            embeddings_2d = tsne.fit_transform(distances)
+            log_tsne_run(_worker['metadata'], embeddings_2d, perplexity, learning_rate)
+    return perplexity
+
+
+def log_tsne_run(metadata, embeddings_2d, perplexity, learning_rate):
+    """
+    Log the 2D coordinates as a float32 .npy (row order of the shared metadata)
+    and a downsampled WebGL scatter plot.
+    """
+    embeddings_2d = np.asarray(embeddings_2d, dtype=np.float32)
+    categories = metadata['predicted_category'].to_numpy()
+    keep, represents = downsample_dense(embeddings_2d, categories)
+    mlflow.log_metric("plotted_points", len(keep))
+
+    plot_df = metadata.iloc[keep][['Keywords', 'predicted_category']].copy()
+    plot_df['tsne_x'] = embeddings_2d[keep, 0]
+    plot_df['tsne_y'] = embeddings_2d[keep, 1]
+    plot_df['represents'] = represents
+    
+    # Now use this in your plot
+    fig = px.scatter(
+        plot_df,
+        x='tsne_x',
+        y='tsne_y',
+        color='predicted_category',       # this contains the label names
+        hover_name='Keywords',
+        hover_data={'tsne_x': False, 'tsne_y': False, 'represents': True},
+        title='t-SNE Visualization (Colored by Selected Clusters and Sized by Degree)',
+        color_discrete_map=cluster_label_color_map,  # map labels to colors
+        render_mode='webgl',
+    )
+
+    fig.update_layout(
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12
+        ),
+        legend=dict(
+            orientation="v",
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.02
+        )
+    )
+                    # Use temporary files that get automatically cleaned up
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Save HTML file temporarily
+        html_path = os.path.join(temp_dir, f"tsne_p{perplexity}_lr{learning_rate}.html")
+        fig.write_html(html_path, include_plotlyjs="cdn")
+        mlflow.log_artifact(html_path, "plots")
+        
+        # Coordinates only; keywords and categories live in the metadata run
+        coords_path = os.path.join(temp_dir, f"tsne_coords_p{perplexity}_lr{learning_rate}.npy")
+        np.save(coords_path, embeddings_2d)
+        mlflow.log_artifact(coords_path, "data")
+
+
+def main(max_workers=None):
+    root_folder = Path('embedding_keywords')
+    # create the experiment here so workers don't race to create it
+    mlflow.set_tracking_uri(TRACKING_URI)
+    mlflow.set_experiment(EXPERIMENT_NAME)
+
+    embedded_keywords_df = pd.read_csv(root_folder/"classified_embedded_keywords.csv", sep="\t")
+    # Parse the vectors once for the whole sweep and keep only the metadata in the DataFrame
+    embeddings = vectors_from_strings(embedded_keywords_df.pop('Keywords_embedding_Vector'))
+    metadata = embedded_keywords_df[['Keywords', 'predicted_category', 'similarity_score']]
+
+    reduced = pca_reduce(embeddings, PCA_COMPONENTS, cache_dir=root_folder/"projection_cache")
+    init = pca_init(reduced)
+    metadata_run_id = log_shared_metadata(metadata)
+
+    perplexities = np.arange(5, 60, 5)
+    learning_rates = np.arange(50.0, 100.0, 50.0)
+    # group combinations by perplexity so each worker builds the kNN graph once
+    jobs = defaultdict(list)
+    for perplexity, learning_rate in product(perplexities, learning_rates):
+        jobs[perplexity.item()].append(learning_rate.item())
+
+    shm = shared_memory.SharedMemory(create=True, size=reduced.nbytes)
+    try:
+        np.ndarray(reduced.shape, dtype=reduced.dtype, buffer=shm.buf)[:] = reduced
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(shm.name, reduced.shape, reduced.dtype, init, metadata,
+                                           metadata_run_id)) as pool:
+            futures = [pool.submit(run_perplexity, perplexity, lrs) for perplexity, lrs in jobs.items()]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""Incremental runner for the replication chain described in REPLICATION.md.
+
+Every stage declares the files it reads and writes. Stages depend on the
+stages that write their inputs, and the resulting DAG is run with
+independent stages in parallel (e.g. the MeSH histograms next to the
+embedding and synonym work).
+
+A stage is re-run only when it is stale:
+  - one of its outputs is missing, or
+  - the content hash (SHA-256) of an input or output differs from the one
+    recorded after its last successful run, or
+  - its command changed.
+The scripts a stage runs are part of its inputs, together with the repository
+modules they import (found by parsing the scripts, transitively), so editing
+a script or a helper such as scripts/term_counting.py re-runs its stages and,
+through the changed outputs, everything downstream of them.
+
+Hashes, commands and per-stage timings are kept in `replication_state.json`.
+Hashes of unchanged files (same size and mtime) are reused instead of
+re-reading the files.
+
+Manual stages (the hand edit of step 3, preparing the embedding keyword list)
+are never run; they only check that their output exists.
+
+Usage:
+    python run_replication.py                 # bring every stage up to date
+    python run_replication.py mesh_histograms # one stage and what it needs
+    python run_replication.py --dry-run       # list the stale stages
+    python run_replication.py --jobs 4 --force synonyms
+"""
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+STATE_FILE = Path("replication_state.json")
+REPO_ROOT = Path(__file__).resolve().parent
+
+GEXF = "filtered.gexf"
+TRANSFERRED_GEXF = "filtered.gexf_with_transferred_mesh.gexf"
+FIXED_GEXF = "filtered_with_transferred_mesh_fixed.gexf"
+FIXED_COMMAS_GEXF = "filtered_with_transferred_mesh_fixed_fix_commas.gexf"
+MESH_CSV = "MeSH_complete.csv"
+
+
+class Stage(NamedTuple):
+    """One step of the chain: a command with the files it reads and writes."""
+    name: str
+    command: list
+    inputs: list
+    outputs: list
+    manual: bool = False
+
+
+# Paths are relative to the repository root, where the scripts expect to run; the ones in
+# scripts/ and embedding_keywords/ run as modules (python -m) for their package imports.
+STAGES = [
+    Stage("fetch_mesh", ["python", "add_mesh_node_attributtes.py"],
+          ["add_mesh_node_attributtes.py", "node_attributes.csv"],
+          ["node_attributes_with_mesh.csv"]),
+    Stage("transfer_mesh", ["python", "transfer_mesh_column_to_gexf.py"],
+          ["transfer_mesh_column_to_gexf.py", GEXF, "node_attributes_with_mesh.csv"],
+          [TRANSFERRED_GEXF]),
+    # step 3: attribute ids restored by hand
+    Stage("manual_edit", [], [TRANSFERRED_GEXF], [FIXED_GEXF], manual=True),
+    Stage("mesh_csv", ["python", "-m", "scripts.parse_mesh_ascii_to_csv", "d2025.bin", MESH_CSV],
+          ["scripts/parse_mesh_ascii_to_csv.py", "d2025.bin"],
+          [MESH_CSV]),
+    Stage("fix_commas", ["python", "-m", "scripts.fix_gexf_mesh_using_mesh_csv", FIXED_GEXF, MESH_CSV],
+          ["scripts/fix_gexf_mesh_using_mesh_csv.py", FIXED_GEXF, MESH_CSV],
+          [FIXED_COMMAS_GEXF]),
+    # mesh_histograms and raw_keywords run side by side and fill the same .split_cache next to
+    # the GEXF (keywords_histograms reuses the keywords split); split_cache.py writes its files
+    # through unique temporary files, so the two can save there at once.
+    Stage("mesh_histograms", ["python", "-m", "scripts.mesh_histograms_by_modularity", FIXED_COMMAS_GEXF],
+          ["scripts/mesh_histograms_by_modularity.py", FIXED_COMMAS_GEXF],
+          ["mesh_histograms/all_mesh_terms_processed.txt"]),
+    Stage("raw_keywords",
+          ["python", "-m", "scripts.histogram_pipeline", FIXED_COMMAS_GEXF, "keywords_histograms", "--outputs", "keywords"],
+          ["scripts/histogram_pipeline.py", FIXED_COMMAS_GEXF],
+          ["keywords_histograms/all_keywords_processed.txt"]),
+    Stage("classify_keywords", ["python", "classify_keywords.py"],
+          ["classify_keywords.py", "keywords_histograms/all_keywords_processed.txt"],
+          ["keyword_classification_25_categories.csv"]),
+    # the embedder reads a tab-separated table with a Keywords column
+    Stage("keyword_list", [], ["keywords_histograms/all_keywords_processed.txt"],
+          ["embedding_keywords/all_keywords_processed.txt"], manual=True),
+    Stage("embed_keywords", ["python", "-m", "embedding_keywords.embedder"],
+          ["embedding_keywords/embedder.py", "embedding_keywords/all_keywords_processed.txt"],
+          ["embedding_keywords/embedded_keywords.csv"]),
+    Stage("embed_categories", ["python", "-m", "embedding_keywords.embed_categories"],
+          ["embedding_keywords/embed_categories.py", "embedding_keywords/categories.json"],
+          ["embedding_keywords/embedded_categories.csv"]),
+    Stage("synonyms", ["python", "-m", "embedding_keywords.find_synonyms"],
+          ["embedding_keywords/find_synonyms.py", "embedding_keywords/embedded_keywords.csv"],
+          ["embedding_keywords/keyword_synonyms_0.99.json",
+           "embedding_keywords/keyword_synonyms_0.99_with_transitivity.json"]),
+    Stage("classify_embedded", ["python", "-m", "embedding_keywords.classify_embedded_keywords"],
+          ["embedding_keywords/classify_embedded_keywords.py", "embedding_keywords/embedded_keywords.csv",
+           "embedding_keywords/embedded_categories.csv"],
+          ["embedding_keywords/classified_embedded_keywords.csv"]),
+    Stage("keywords_histograms", ["python", "-m", "scripts.keywords_histograms_by_modularity", FIXED_COMMAS_GEXF],
+          ["scripts/keywords_histograms_by_modularity.py", FIXED_COMMAS_GEXF,
+           "embedding_keywords/keyword_synonyms_0.97_with_transitivity.json",
+           "keyword_classification_25_categories.csv"],
+          ["keywords_histograms_0.97/all_canonical_keywords_processed.txt"]),
+    Stage("tfidf", ["python", "-m", "embedding_keywords.td_idf_to_keywords_per_cluster"],
+          ["embedding_keywords/td_idf_to_keywords_per_cluster.py", FIXED_COMMAS_GEXF,
+           "embedding_keywords/keyword_synonyms_0.99_with_transitivity.json"],
+          ["td-idf_results-per-cluster-0.99-claude-only-cluster-mean-top-3/tfidf_vocabulary.json"]),
+]
+
+
+def imported_modules(script, root: Path = REPO_ROOT) -> list:
+    """
+    Repository modules imported by a script, directly or through other modules.
+
+    Imports anywhere in the file count (also ones inside functions). Modules
+    are package-qualified (`scripts.term_counting`) and looked up from the
+    repository root.
+
+    Returns:
+        sorted paths relative to root, without the script itself
+    """
+    found = set()
+    todo = [root / script]
+    while todo:
+        path = todo.pop()
+        if path in found or not path.exists():
+            continue
+        found.add(path)
+        names = []
+        for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'))):
+            if isinstance(node, ast.Import):
+                names += [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.append(node.module)
+                # `from package import module`
+                names += [f"{node.module}.{alias.name}" for alias in node.names]
+        for name in names:
+            relative = Path(*name.split('.')).with_suffix('.py')
+            todo.append(root / relative)
+    found.discard(root / script)
+    return sorted(str(p.relative_to(root)) for p in found)
+
+
+def with_imported_modules(stage: Stage) -> Stage:
+    """stage with the modules imported by its scripts added to its inputs."""
+    modules = {m for p in stage.inputs if p.endswith('.py') for m in imported_modules(p)}
+    return stage._replace(inputs=stage.inputs + sorted(modules - set(stage.inputs)))
+
+
+STAGES = [with_imported_modules(stage) for stage in STAGES]
+
+
+class HashCache:
+    """SHA-256 of files, reusing recorded hashes while size and mtime are unchanged."""
+
+    def __init__(self, recorded: dict):
+        self.recorded = recorded
+
+    def digest(self, path):
+        """Hex digest of path, or None if it does not exist."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        stat = path.stat()
+        entry = self.recorded.get(str(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        self.recorded[str(path)] = {"sha256": sha.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return sha.hexdigest()
+
+
+def load_state(path=STATE_FILE) -> dict:
+    if Path(path).exists():
+        with open(path) as f:
+            return json.load(f)
+    return {"files": {}, "stages": {}}
+
+
+def save_state(state: dict, path=STATE_FILE):
+    tmp_path = Path(str(path) + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    tmp_path.replace(path)
+
+
+def dependencies(stages) -> dict:
+    """Dict stage name -> names of the stages writing its inputs."""
+    producer = {out: stage.name for stage in stages for out in stage.outputs}
+    return {stage.name: sorted({producer[i] for i in stage.inputs if i in producer}) for stage in stages}
+
+
+def select_stages(stages, targets) -> list:
+    """The target stages and everything upstream of them, in declaration order."""
+    if not targets:
+        return list(stages)
+    deps = dependencies(stages)
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(deps[name])
+    return [stage for stage in stages if stage.name in needed]
+
+
+def stale_reason(stage: Stage, state: dict, hashes: HashCache):
+    """Why stage has to run, or None when it is up to date."""
+    missing = [out for out in stage.outputs if not Path(out).exists()]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    if stage.manual:
+        return None
+    record = state["stages"].get(stage.name)
+    if record is None:
+        return "never run"
+    if record["command"] != stage.command:
+        return "command changed"
+    for kind, paths in (("input", stage.inputs), ("output", stage.outputs)):
+        for path in paths:
+            if hashes.digest(path) != record[kind + "s"].get(path):
+                return f"{kind} {path} changed"
+    return None
+
+
+def newer_inputs(stage: Stage) -> list:
+    """Inputs modified after the oldest output of a stage."""
+    oldest = min(Path(out).stat().st_mtime for out in stage.outputs)
+    return [p for p in stage.inputs if Path(p).exists() and Path(p).stat().st_mtime > oldest]
+
+
+def run_stage(stage: Stage) -> tuple:
+    """Run a stage's command, returning (exit code, seconds)."""
+    # "python" is the interpreter running this script (e.g. the pixi environment)
+    command = [sys.executable if part == "python" else part for part in stage.command]
+    start = time.perf_counter()
+    code = subprocess.call(command)
+    return code, time.perf_counter() - start
+
+
+def run(stages, state: dict, jobs: int = 2, force=(), dry_run: bool = False) -> int:
+    """
+    Run the stale stages of a DAG, independent ones in parallel.
+
+    Args:
+        stages: Stage list (each stage's producers must be in it, or be sources)
+        state: loaded state, updated in place and saved after every stage
+        jobs: stages running at once
+        force: names of stages to run even if up to date
+        dry_run: only print what would run
+
+    Returns:
+        0 when every stage is up to date afterwards, 1 otherwise
+    """
+    hashes = HashCache(state.setdefault("files", {}))
+    deps = dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    pending = [stage.name for stage in stages]
+    done, failed, would_run = set(), set(), set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            progressed = False
+            # start every stage whose upstream stages are done
+            for name in list(pending):
+                if any(d in failed for d in deps[name]):
+                    print(f"[{name}] skipped: upstream stage failed")
+                    pending.remove(name)
+                    failed.add(name)
+                    continue
+                if not all(d in done for d in deps[name] if d in by_name):
+                    continue
+                pending.remove(name)
+                progressed = True
+                stage = by_name[name]
+                if stage.manual:
+                    reason = stale_reason(stage, state, hashes)
+                    if reason is None and newer_inputs(stage):
+                        print(f"[{name}] note: inputs are newer than the manual output, redo it if needed")
+                elif name in force:
+                    reason = "forced"
+                elif any(d in would_run for d in deps[name]):
+                    reason = "upstream stage would run"
+                else:
+                    reason = stale_reason(stage, state, hashes)
+                if reason is None:
+                    print(f"[{name}] up to date")
+                    done.add(name)
+                elif stage.manual:
+                    print(f"[{name}] manual stage, {reason}: see REPLICATION.md")
+                    failed.add(name)
+                elif dry_run:
+                    print(f"[{name}] would run ({reason}): {' '.join(stage.command)}")
+                    would_run.add(name)
+                    done.add(name)
+                else:
+                    print(f"[{name}] running ({reason}): {' '.join(stage.command)}")
+                    running[pool.submit(run_stage, stage)] = name
+            if not running:
+                if not progressed:
+                    raise RuntimeError(f"Stages {pending} wait on each other")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = by_name[name]
+                code, seconds = future.result()
+                missing = [out for out in stage.outputs if not Path(out).exists()]
+                if code != 0 or missing:
+                    print(f"[{name}] failed after {seconds:.1f}s (exit code {code}"
+                          + (f", missing {', '.join(missing)})" if missing else ")"))
+                    failed.add(name)
+                    continue
+                state["stages"][name] = {
+                    "command": stage.command,
+                    "inputs": {p: hashes.digest(p) for p in stage.inputs},
+                    "outputs": {p: hashes.digest(p) for p in stage.outputs},
+                    "seconds": round(seconds, 3),
+                    "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                }
+                save_state(state)
+                print(f"[{name}] done in {seconds:.1f}s")
+                done.add(name)
+
+    if not dry_run:
+        save_state(state)
+    print("\nStage timings (last successful run):")
+    for stage in stages:
+        record = state["stages"].get(stage.name)
+        if record:
+            print(f"  {stage.name:20s} {record['seconds']:10.1f}s  {record['finished']}")
+    return 1 if failed else 0
+
+
+def main(argv):
+    jobs = 2
+    force = set()
+    targets = []
+    dry_run = "--dry-run" in argv
+    i = 1
+    while i < len(argv):
+        if argv[i] == "--jobs" and i + 1 < len(argv):
+            jobs = int(argv[i + 1])
+            i += 2
+        elif argv[i] == "--force" and i + 1 < len(argv):
+            force.add(argv[i + 1])
+            i += 2
+        else:
+            if not argv[i].startswith("--"):
+                targets.append(argv[i])
+            i += 1
+
+    names = {stage.name for stage in STAGES}
+    unknown = [t for t in targets + sorted(force) if t not in names]
+    if unknown:
+        print(f"Unknown stages: {', '.join(unknown)}")
+        print(f"Stages: {', '.join(stage.name for stage in STAGES)}")
+        return 1
+
+    # the stage commands and paths are relative to the repository root
+    os.chdir(Path(__file__).resolve().parent)
+    state = load_state()
+    return run(select_stages(STAGES, targets), state, jobs=jobs, force=force, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
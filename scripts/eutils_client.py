@@ -0,0 +1,135 @@
+"""Minimal PubMed E-utilities client (esearch + efetch) with a configurable base URL.
+
+It offers the two calls get_mesh_terms() in add_mesh_node_attributtes.py makes
+on metapub's PubMedFetcher, pmids_for_query() and article_by_pmid(), with
+articles whose `mesh` has metapub's layout:
+
+  {descriptor UI: {"descriptor_name", "descriptor_major_topic", "qualifiers"}}
+
+The base URL comes from the EUTILS_BASE_URL environment variable when set, so
+the retrieval can be pointed at a local stand-in server such as
+benchmarks/fake_eutils_server.py. 429 responses are retried after their
+Retry-After delay, 5xx responses and connection errors with exponential
+backoff; the counts are kept in `stats`.
+"""
+import os
+import time
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from lxml import etree
+
+NCBI_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def default_base_url() -> str:
+    return os.environ.get("EUTILS_BASE_URL", NCBI_EUTILS_URL)
+
+
+class PubMedArticle(NamedTuple):
+    pmid: str
+    title: Optional[str]
+    doi: Optional[str]
+    mesh: dict
+
+
+def parse_pubmed_article(article) -> PubMedArticle:
+    """PubMedArticle from a <PubmedArticle> element of an efetch response."""
+    mesh = {}
+    for heading in article.iterfind('.//MeshHeadingList/MeshHeading'):
+        descriptor = heading.find('DescriptorName')
+        if descriptor is None:
+            continue
+        mesh[descriptor.get('UI')] = {
+            'descriptor_name': descriptor.text,
+            'descriptor_major_topic': descriptor.get('MajorTopicYN') == 'Y',
+            'qualifiers': [{'qualifier_name': q.text, 'qualifier_ui': q.get('UI'),
+                            'qualifier_major_topic': q.get('MajorTopicYN') == 'Y'}
+                           for q in heading.iterfind('QualifierName')],
+        }
+    title = article.find('.//ArticleTitle')
+    doi = article.find(".//ArticleIdList/ArticleId[@IdType='doi']")
+    return PubMedArticle(
+        pmid=article.findtext('.//MedlineCitation/PMID'),
+        title=''.join(title.itertext()) if title is not None else None,
+        doi=doi.text if doi is not None else None,
+        mesh=mesh,
+    )
+
+
+class EUtilsFetcher:
+    """PubMed search and fetch over E-utilities, retrying rate limits and server errors."""
+
+    def __init__(self, base_url: str = None, api_key: str = None, timeout: float = 30.0,
+                 max_retries: int = 5, backoff: float = 1.0, tool: str = "mesh_experiments"):
+        """
+        Args:
+            base_url: E-utilities root (default: EUTILS_BASE_URL or NCBI)
+            api_key: NCBI API key, sent with every request
+            timeout: seconds per HTTP request
+            max_retries: retries of one request before its error is raised
+            backoff: first retry delay in seconds, doubled on every retry
+            tool: tool name reported to NCBI
+        """
+        self.base_url = (base_url or default_base_url()).rstrip('/') + '/'
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.tool = tool
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _get(self, endpoint: str, params: dict) -> bytes:
+        params = dict(params, tool=self.tool)
+        if self.api_key:
+            params['api_key'] = self.api_key
+        url = f"{self.base_url}{endpoint}?{urllib.parse.urlencode(params)}"
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            try:
+                with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                    return response.read()
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUSES or attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                self._count(f'http_{e.code}')
+                retry_after = e.headers.get('Retry-After') if e.code == 429 else None
+                delay = float(retry_after) if retry_after else self.backoff * 2 ** attempt
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                self._count('connection_errors')
+                delay = self.backoff * 2 ** attempt
+            self._count('retries')
+            time.sleep(delay)
+
+    def pmids_for_query(self, query: str, retmax: int = 20) -> list:
+        """PMIDs of the PubMed search for `query`."""
+        root = etree.fromstring(self._get('esearch.fcgi', {'db': 'pubmed', 'term': query, 'retmax': retmax}))
+        return [pmid.text for pmid in root.iterfind('IdList/Id')]
+
+    def articles_by_pmids(self, pmids) -> list:
+        """PubMedArticle of every PMID found, in one efetch request."""
+        if not pmids:
+            return []
+        root = etree.fromstring(self._get('efetch.fcgi', {'db': 'pubmed', 'retmode': 'xml',
+                                                          'id': ','.join(map(str, pmids))}))
+        return [parse_pubmed_article(article) for article in root.iterfind('PubmedArticle')]
+
+    def article_by_pmid(self, pmid) -> PubMedArticle:
+        articles = self.articles_by_pmids([pmid])
+        if not articles:
+            raise LookupError(f"PMID {pmid} not found")
+        return articles[0]
@@ -12,12 +12,25 @@ The script writes a CSV log `gexf_mesh_fix_logs.csv` with columns:
 
 And appends missing UI identifiers to `errors.txt` with the node id and label.
 
+Graphs whose `mesh` attributes are JSON arrays (written via mesh_lists.py by
+the current retrieval pipeline) have no comma ambiguity and are left as is;
+this repair pass is only needed for older comma-joined files.
+
 Important: the script edits only the `value` attribute of the existing
-`<attvalue for="mesh" .../>` elements in the GEXF text, leaving the
-attributes declaration block unchanged.
+`<attvalue for="mesh" .../>` elements, leaving the attributes declaration
+block unchanged. The GEXF is streamed with lxml, so the output is
+re-serialized (e.g. `<a/>` instead of `<a />`) but otherwise equivalent.
+
+Instead of the CSV, a vocabulary database from `mesh_vocabulary.py`
+(`.sqlite`) can be given; it is opened without parsing the whole CSV.
+
+With --processes N the <nodes> section is split into chunks processed on N
+worker processes (see gexf_chunks.py).
 
 Usage:
-  python scripts/fix_gexf_mesh_using_mesh_csv.py filtered_with_transferred_mesh_fixed.gexf MeSH_complete.csv
+  python -m scripts.fix_gexf_mesh_using_mesh_csv filtered_with_transferred_mesh_fixed.gexf MeSH_complete.csv
+  python -m scripts.fix_gexf_mesh_using_mesh_csv filtered_with_transferred_mesh_fixed.gexf MeSH_vocabulary.sqlite
+  python -m scripts.fix_gexf_mesh_using_mesh_csv filtered_with_transferred_mesh_fixed.gexf MeSH_complete.csv --processes 8
 
 Output:
   - writes a new GEXF file named `<input>.mesh_fixed.gexf`
@@ -27,11 +40,20 @@ Output:
 from pathlib import Path
 import sys
 import csv
-import re
-from xml.sax.saxutils import escape as xml_escape
+from xml.sax.saxutils import quoteattr
+
+from lxml import etree
+
+from scripts.mesh_lists import is_mesh_list
 
 
 def load_mesh_mapping(mesh_csv_path):
+    """UI -> main heading, from a MeSH CSV or a vocabulary built by mesh_vocabulary.py."""
+    if Path(mesh_csv_path).suffix in ('.sqlite', '.db'):
+        from scripts.mesh_vocabulary import MeshVocabulary
+        with MeshVocabulary(mesh_csv_path) as vocabulary:
+            return vocabulary.heading_map()
+
     mapping = {}
     with open(mesh_csv_path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -59,11 +81,104 @@ def load_mesh_mapping(mesh_csv_path):
     return mapping
 
 
+# elements streamed as open/close tags; everything else is written whole
+CONTAINER_TAGS = frozenset(['gexf', 'graph', 'nodes', 'edges'])
+# iterparse only reports these (children of nodes/edges come along with them)
+STREAMED_TAGS = ['{*}' + t for t in sorted(CONTAINER_TAGS | {'meta', 'attributes', 'node', 'edge'})]
+# rows buffered before writing to the log and errors files
+LOG_BATCH_SIZE = 1000
+
+
+def _localname(el):
+    return el.tag.rpartition('}')[2]
+
+
+def _start_tag(el, nsmap=None):
+    """Serialize the opening tag of el, declaring nsmap (only used for the root)."""
+    prefixes = {uri: prefix for prefix, uri in (nsmap or el.nsmap).items()}
+    parts = ['<' + _localname(el)]
+    for prefix, uri in (nsmap or {}).items():
+        parts.append(f' xmlns{":" + prefix if prefix else ""}={quoteattr(uri)}')
+    for key, value in el.attrib.items():
+        qname = etree.QName(key)
+        if qname.namespace and prefixes.get(qname.namespace):
+            key = f'{prefixes[qname.namespace]}:{qname.localname}'
+        parts.append(f' {key}={quoteattr(value)}')
+    return ''.join(parts) + '>'
+
+
+def _attribute_ids(attributes_el, mesh_for, mesh_id_for):
+    """Resolve the attvalue `for` ids of mesh and mesh_id from an <attributes> block."""
+    if attributes_el.get('class', 'node') != 'node':
+        return mesh_for, mesh_id_for
+    for attribute in attributes_el.iter('{*}attribute'):
+        title = attribute.get('title')
+        if title == 'mesh':
+            mesh_for = attribute.get('id')
+        elif title == 'mesh_id':
+            mesh_id_for = attribute.get('id')
+    return mesh_for, mesh_id_for
+
+
+def fix_node(node, mesh_map: dict, mesh_for: str = 'mesh', mesh_id_for: str = 'mesh_id'):
+    """Rebuild the `mesh` attvalue of one <node> element in place if needed.
+
+    When the comma-separated counts of mesh and mesh_id differ, mesh is replaced
+    by the headings of the mesh_id UIs joined with '; '.
+
+    Returns:
+        (1 if the node has both attvalues else 0,
+         [node_label, node_id, mesh_before, mesh_after] if changed else None,
+         list of UIs missing from mesh_map)
+    """
+    mm = mid = None
+    for attvalue in node.iter('{*}attvalue'):
+        if attvalue.get('for') == mesh_for:
+            mm = attvalue
+        elif attvalue.get('for') == mesh_id_for:
+            mid = attvalue
+    if mm is None or mid is None:
+        return 0, None, []
+
+    mesh_before = mm.get('value', '')
+    if is_mesh_list(mesh_before):
+        # JSON arrays (mesh_lists.py) are unambiguous, nothing to repair
+        return 1, None, []
+    # compute counts
+    mesh_count = len([s for s in mesh_before.split(',') if s.strip()])
+    mesh_ids = [s.strip() for s in mid.get('value', '').split(',') if s.strip()]
+    if mesh_count == len(mesh_ids):
+        return 1, None, []
+
+    # rebuild mesh from mesh_id UIs
+    mh_list = []
+    missing = []
+    for ui in mesh_ids:
+        if mesh_map.get(ui):
+            mh_list.append(mesh_map[ui])
+        else:
+            missing.append(ui)
+    mesh_after = '; '.join(mh_list)
+    mm.set('value', mesh_after)
+    return 1, [node.get('label', ''), node.get('id', ''), mesh_before, mesh_after], missing
+
+
 def process_gexf(in_path: Path, out_path: Path, mesh_map: dict, logs_path: Path, errors_path: Path):
-    node_buf = []
-    inside_node = False
+    """Stream the GEXF through lxml.iterparse, rewriting `mesh` where counts differ.
+
+    Only the container elements (gexf, graph, nodes, edges) are kept open; every
+    other element is serialized when it ends and then cleared, so memory stays
+    constant. Attribute order and line breaks inside tags do not matter, and the
+    `mesh`/`mesh_id` attvalues are found by id or by their declared title.
+    """
     changed_count = 0
     total_checked = 0
+    mesh_for, mesh_id_for = 'mesh', 'mesh_id'
+    root_nsmap = None
+    ns_decls = b''
+    depth = 0
+    log_rows = []
+    error_lines = []
 
     # prepare logs
     logs_file = open(logs_path, 'a', newline='', encoding='utf-8')
@@ -73,90 +188,95 @@ def process_gexf(in_path: Path, out_path: Path, mesh_map: dict, logs_path: Path,
 
     errors_file = open(errors_path, 'a', encoding='utf-8')
 
-    with open(in_path, 'r', encoding='utf-8', errors='replace') as inp, open(out_path, 'w', encoding='utf-8') as out:
-        for line in inp:
-            if line.lstrip().startswith('<node '):
-                inside_node = True
-                node_buf = [line]
-                continue
-
-            if inside_node:
-                node_buf.append(line)
-                if line.lstrip().startswith('</node>'):
-                    # process node block
-                    block = ''.join(node_buf)
-
-                    # extract node id and label from opening tag
-                    mnode = re.search(r'<node\s+[^>]*id="(?P<id>[^"]+)"\s+label="(?P<label>[^"]*)"', block)
-                    node_id = mnode.group('id') if mnode else ''
-                    node_label = mnode.group('label') if mnode else ''
-
-                    # find mesh and mesh_id attvalues
-                    mm = re.search(r'<attvalue\s+for="mesh"\s+value="(?P<mesh>[^"]*)"\s*/>', block)
-                    mid = re.search(r'<attvalue\s+for="mesh_id"\s+value="(?P<mesh_id>[^"]*)"\s*/>', block)
-
-                    if mm and mid:
-                        mesh_before = mm.group('mesh')
-                        mesh_id_raw = mid.group('mesh_id')
-                        # compute counts
-                        mesh_count = len([s for s in mesh_before.split(',') if s.strip()])
-                        mesh_id_count = len([s for s in mesh_id_raw.split(',') if s.strip()])
-                        total_checked += 1
-                        if mesh_count != mesh_id_count:
-                            # rebuild mesh from mesh_id UIs
-                            mesh_ids = [s.strip() for s in mesh_id_raw.split(',') if s.strip()]
-                            mh_list = []
-                            missing = []
-                            for ui in mesh_ids:
-                                if ui in mesh_map and mesh_map[ui]:
-                                    mh_list.append(mesh_map[ui])
-                                else:
-                                    missing.append(ui)
-                            if mh_list:
-                                mesh_after = '; '.join(mh_list)
-                            else:
-                                mesh_after = ''
-
-                            # log change
-                            logs_writer.writerow([node_label, node_id, mesh_before, mesh_after])
-                            logs_file.flush()
-
-                            # log missing IDs
-                            for ui in missing:
-                                errors_file.write(f'{ui}\t{node_id}\t{node_label}\n')
-                            errors_file.flush()
-
-                            # replace mesh value in block (escape for XML)
-                            mesh_after_escaped = xml_escape(mesh_after, {'"': '&quot;'})
-                            new_block = re.sub(r'(<attvalue\s+for="mesh"\s+value=")(?P<old>[^"]*)("\s*/>)',
-                                               r'\1' + mesh_after_escaped + r'\3',
-                                               block,
-                                               count=1)
-                            out.write(new_block)
-                            changed_count += 1
-                        else:
-                            out.write(block)
+    def flush_logs():
+        logs_writer.writerows(log_rows)
+        errors_file.writelines(error_lines)
+        log_rows.clear()
+        error_lines.clear()
+
+    with open(out_path, 'wb') as out:
+        out.write(b"<?xml version='1.0' encoding='utf-8'?>")
+        # no recover: malformed markup must stop the repair rather than drop nodes
+        context = etree.iterparse(str(in_path), events=('start', 'end'), tag=STREAMED_TAGS, huge_tree=True)
+        for event, el in context:
+            name = _localname(el)
+            if name in CONTAINER_TAGS:
+                if event == 'start':
+                    if root_nsmap is None:
+                        root_nsmap = dict(el.nsmap)
+                        # lxml repeats the in-scope declarations on every serialized subtree
+                        ns_decls = ''.join(
+                            f' xmlns{":" + prefix if prefix else ""}={quoteattr(uri)}'
+                            for prefix, uri in root_nsmap.items()
+                        ).encode('utf-8')
+                        out.write(b'\n' + _start_tag(el, root_nsmap).encode('utf-8'))
                     else:
-                        # node has no mesh or mesh_id; write unchanged
-                        out.write(block)
+                        out.write(('\n' + '  ' * depth + _start_tag(el)).encode('utf-8'))
+                    depth += 1
+                else:
+                    depth -= 1
+                    out.write(('\n' + '  ' * depth + f'</{name}>').encode('utf-8'))
+                continue
 
-                    inside_node = False
-                # continue reading
-            else:
-                out.write(line)
+            if event == 'start':
+                continue
+            parent = el.getparent()
+            if parent is None or _localname(parent) not in CONTAINER_TAGS:
+                continue
 
+            if name == 'attributes':
+                mesh_for, mesh_id_for = _attribute_ids(el, mesh_for, mesh_id_for)
+            elif name == 'node':
+                checked, log_row, missing = fix_node(el, mesh_map, mesh_for, mesh_id_for)
+                total_checked += checked
+                if log_row is not None:
+                    log_rows.append(log_row)
+                    error_lines.extend(f'{ui}\t{log_row[1]}\t{log_row[0]}\n' for ui in missing)
+                    if len(log_rows) >= LOG_BATCH_SIZE:
+                        flush_logs()
+                    changed_count += 1
+
+            data = etree.tostring(el, encoding='utf-8', with_tail=False)
+            head = b'<' + name.encode('utf-8') + ns_decls
+            if ns_decls and data.startswith(head):
+                data = b'<' + name.encode('utf-8') + data[len(head):]
+            out.write(b'\n' + b'  ' * depth + data)
+
+            # free the written element and its already written siblings
+            el.clear(keep_tail=False)
+            while el.getprevious() is not None:
+                del parent[0]
+        out.write(b'\n')
+
+    flush_logs()
     logs_file.close()
     errors_file.close()
     return total_checked, changed_count
 
 
 def main(argv):
-    if len(argv) < 3:
-        print('Usage: fix_gexf_mesh_using_mesh_csv.py input.gexf MeSH_complete.csv [out.gexf]')
+    paths = []
+    processes = None
+    valid = True
+    i = 1
+    while i < len(argv):
+        if argv[i] == '--processes' and i + 1 < len(argv):
+            processes = int(argv[i + 1])
+            i += 2
+        else:
+            if argv[i].startswith('--'):
+                # an unknown option, or --processes without its value
+                print('Invalid option:', argv[i])
+                valid = False
+            else:
+                paths.append(argv[i])
+            i += 1
+    if not valid or len(paths) < 2:
+        print('Usage: python -m scripts.fix_gexf_mesh_using_mesh_csv input.gexf MeSH_complete.csv [out.gexf] [--processes N]')
         return 1
-    in_gexf = Path(argv[1])
-    mesh_csv = Path(argv[2])
-    out_gexf = Path(argv[3]) if len(argv) > 3 else in_gexf.with_name(in_gexf.stem + '_fix_commas.gexf')
+    in_gexf = Path(paths[0])
+    mesh_csv = Path(paths[1])
+    out_gexf = Path(paths[2]) if len(paths) > 2 else in_gexf.with_name(in_gexf.stem + '_fix_commas.gexf')
 
     if not in_gexf.exists():
         print('Input GEXF not found:', in_gexf)
@@ -172,8 +292,20 @@ def main(argv):
     logs_path = Path('gexf_mesh_fix_logs.csv')
     errors_path = Path('errors.txt')
 
-    print('Processing GEXF and writing to', out_gexf)
-    total_checked, changed = process_gexf(in_gexf, out_gexf, mesh_map, logs_path, errors_path)
+    try:
+        if processes is not None:
+            from scripts.gexf_chunks import process_gexf_parallel
+            print(f'Processing GEXF in parallel chunks ({processes} processes) and writing to', out_gexf)
+            total_checked, changed = process_gexf_parallel(in_gexf, out_gexf, mesh_map, logs_path, errors_path,
+                                                           processes=processes)
+        else:
+            print('Processing GEXF and writing to', out_gexf)
+            total_checked, changed = process_gexf(in_gexf, out_gexf, mesh_map, logs_path, errors_path)
+    except (etree.XMLSyntaxError, ValueError) as e:
+        # the partly written output would be missing every node after the error
+        out_gexf.unlink(missing_ok=True)
+        print('Malformed GEXF, no output written:', e)
+        return 1
     print(f'Processed {total_checked} nodes (mesh present with mesh_id), changed {changed} nodes')
     return 0
 
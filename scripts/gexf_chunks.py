@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Process the <nodes> section of large GEXF files in parallel chunks.
+
+The file is memory-mapped and the <nodes> section is split into byte ranges
+that end on `</node>` boundaries. Each range is parsed on its own by a worker
+process, and the results are stitched back together in file order:
+
+  - process_gexf_parallel: chunked version of
+    fix_gexf_mesh_using_mesh_csv.process_gexf. Everything outside <nodes> is
+    copied byte for byte, and logs come out in the same order.
+  - count_terms_by_class: per-class term Counters for the histogram scripts;
+    the Counters of all chunks are merged.
+
+Attribute ids (`<attvalue for="...">`) are resolved to titles from the
+<attributes> declarations in the file header, and nodes without a value get
+the declaration's <default>. networkx only records those defaults, so the
+histogram scripts read their graphs with read_gexf_with_defaults() to see
+the same values on the serial path.
+
+Flat graphs only: nested <nodes> inside a <node> are not supported.
+
+Used through the --processes N option of fix_gexf_mesh_using_mesh_csv.py and
+of the histogram scripts.
+"""
+from pathlib import Path
+import csv
+import mmap
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+from typing import NamedTuple, Optional
+
+import networkx as nx
+from lxml import etree
+from networkx.readwrite.gexf import GEXFReader
+
+from scripts.fix_gexf_mesh_using_mesh_csv import fix_node
+
+# target size of one chunk; more chunks than workers keeps the pool balanced
+CHUNK_BYTES = 32 * 1024 * 1024
+NODE_INDENT = b'\n      '
+
+# per-worker state set by the pool initializers
+_mesh_map = None
+_GEXF_READER = GEXFReader()
+
+
+def node_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Split the <nodes> section of a GEXF into byte ranges.
+
+    Returns:
+        (nodes_start, nodes_end, [(start, end), ...]) where nodes_start is just
+        after the `<nodes ...>` tag, nodes_end is the offset of `</nodes>` and
+        every range ends right after a `</node>` (the last one at nodes_end)
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        open_tag = mm.find(b'<nodes')
+        if open_tag == -1:
+            raise ValueError(f'No <nodes> section in {path}')
+        nodes_start = mm.find(b'>', open_tag) + 1
+        nodes_end = mm.find(b'</nodes>', nodes_start)
+        if nodes_end == -1:
+            raise ValueError(f'Unterminated <nodes> section in {path}')
+
+        ranges = []
+        start = nodes_start
+        while start < nodes_end:
+            boundary = mm.find(b'</node>', min(start + chunk_bytes, nodes_end) - 1, nodes_end)
+            end = nodes_end if boundary == -1 else boundary + len(b'</node>')
+            ranges.append((start, end))
+            start = end
+    return nodes_start, nodes_end, ranges
+
+
+def read_gexf_with_defaults(path) -> nx.Graph:
+    """nx.read_gexf, with the declared <default> set on nodes that have no value of their own."""
+    G = nx.read_gexf(path)
+    defaults = G.graph.get('node_default', {})
+    if defaults:
+        for _, data in G.nodes(data=True):
+            for title, value in defaults.items():
+                data.setdefault(title, value)
+    return G
+
+
+class AttributeDeclaration(NamedTuple):
+    title: str
+    type: str
+    default: Optional[str]
+
+
+def attribute_declarations(path, nodes_start=None) -> dict:
+    """Dict attvalue id -> AttributeDeclaration of the node attributes declared before <nodes>."""
+    if nodes_start is None:
+        nodes_start = node_chunks(path)[0]
+    with open(path, 'rb') as f:
+        header = f.read(nodes_start)
+    # the header is a truncated document; recover parses what is there
+    root = etree.fromstring(header, parser=etree.XMLParser(recover=True, huge_tree=True))
+    declarations = {}
+    if root is None:
+        return declarations
+    for attributes in root.iter('{*}attributes'):
+        if attributes.get('class', 'node') != 'node':
+            continue
+        for attribute in attributes.iter('{*}attribute'):
+            default = attribute.find('{*}default')
+            declarations[attribute.get('id')] = AttributeDeclaration(
+                attribute.get('title'), attribute.get('type', 'string'),
+                default.text if default is not None else None)
+    return declarations
+
+
+def attribute_titles(path, nodes_start=None):
+    """Dict attvalue id -> title of the node attributes declared before <nodes>."""
+    return {i: d.title for i, d in attribute_declarations(path, nodes_start).items()}
+
+
+def _typed_value(declaration: AttributeDeclaration, value: str):
+    # the conversion nx.read_gexf applies
+    if declaration.type == 'boolean':
+        return _GEXF_READER.convert_bool[value]
+    return _GEXF_READER.python_type.get(declaration.type, str)(value)
+
+
+def first_node_attributes(path, declarations, nodes_start, nodes_end) -> dict:
+    """Attributes of the first node by title, as read_gexf_with_defaults gives them."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        boundary = mm.find(b'</node>', nodes_start, nodes_end)
+        if boundary == -1:
+            return {}
+    node = next(_read_nodes(path, nodes_start, boundary + len(b'</node>')).iterchildren('{*}node'), None)
+    if node is None:
+        return {}
+    values = {}
+    for a in node.iter('{*}attvalue'):
+        i, value = a.get('for'), a.get('value')
+        values[declarations[i].title if i in declarations else i] = \
+            _typed_value(declarations[i], value) if i in declarations else value
+    # nx.read_gexf adds the label after the attributes; defaults come last
+    values['label'] = node.get('label')
+    for d in declarations.values():
+        if d.default is not None:
+            values.setdefault(d.title, _typed_value(d, d.default))
+    return values
+
+
+def _read_nodes(path, start, end):
+    """
+    Parse a byte range of <node> elements, returning the wrapping element.
+
+    Raises:
+        ValueError: the range holds malformed markup
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # recover only stands in for the namespace prefixes (e.g. viz:) declared on the <gexf> root
+    # outside the range; any other error would silently drop nodes
+    parser = etree.XMLParser(recover=True, huge_tree=True)
+    nodes = etree.fromstring(b'<nodes>' + data + b'</nodes>', parser=parser)
+    errors = [e for e in parser.error_log if e.domain_name != 'NAMESPACE']
+    if errors:
+        raise ValueError(f'Malformed GEXF in bytes {start}-{end} of {path}: {errors[0].message}')
+    return nodes
+
+
+def _ids_for(titles, title):
+    # files edited by hand may use the title itself as id
+    return [i for i, t in titles.items() if t == title] or [title]
+
+
+def _init_fix_worker(mesh_map):
+    global _mesh_map
+    _mesh_map = mesh_map
+
+
+def _fix_chunk(args):
+    path, start, end, mesh_for, mesh_id_for = args
+    checked = 0
+    log_rows = []
+    error_lines = []
+    out = []
+    for node in _read_nodes(path, start, end).iterchildren('{*}node'):
+        node_checked, log_row, missing = fix_node(node, _mesh_map, mesh_for, mesh_id_for)
+        checked += node_checked
+        if log_row is not None:
+            log_rows.append(log_row)
+            error_lines.extend(f'{ui}\t{log_row[1]}\t{log_row[0]}\n' for ui in missing)
+        out.append(NODE_INDENT + etree.tostring(node, encoding='utf-8', with_tail=False))
+    return b''.join(out), checked, log_rows, error_lines
+
+
+def process_gexf_parallel(in_path: Path, out_path: Path, mesh_map: dict, logs_path: Path, errors_path: Path,
+                          processes=None, chunk_bytes=CHUNK_BYTES):
+    """Chunked, multi-process process_gexf with the same outputs and return value."""
+    nodes_start, nodes_end, ranges = node_chunks(in_path, chunk_bytes)
+    titles = attribute_titles(in_path, nodes_start)
+    mesh_for = _ids_for(titles, 'mesh')[0]
+    mesh_id_for = _ids_for(titles, 'mesh_id')[0]
+
+    logs_file = open(logs_path, 'a', newline='', encoding='utf-8')
+    logs_writer = csv.writer(logs_file)
+    if logs_path.stat().st_size == 0:
+        logs_writer.writerow(['node_label', 'node_id', 'mesh_before', 'mesh_after'])
+    errors_file = open(errors_path, 'a', encoding='utf-8')
+
+    total_checked = 0
+    changed_count = 0
+    jobs = [(str(in_path), start, end, mesh_for, mesh_id_for) for start, end in ranges]
+    with open(in_path, 'rb') as inp, open(out_path, 'wb') as out, \
+            Pool(processes, initializer=_init_fix_worker, initargs=(mesh_map,)) as pool:
+        out.write(inp.read(nodes_start))
+        # imap keeps the chunk order
+        for data, checked, log_rows, error_lines in pool.imap(_fix_chunk, jobs):
+            out.write(data)
+            logs_writer.writerows(log_rows)
+            errors_file.writelines(error_lines)
+            total_checked += checked
+            changed_count += len(log_rows)
+        out.write(b'\n    ')
+        inp.seek(nodes_end)
+        while True:
+            block = inp.read(chunk_bytes)
+            if not block:
+                break
+            out.write(block)
+
+    logs_file.close()
+    errors_file.close()
+    return total_checked, changed_count
+
+
+def _count_chunk(args):
+    path, start, end, class_ids, value_ids, defaults, split_fn = args
+    counts = defaultdict(Counter)
+    seen_classes = set()
+    for node in _read_nodes(path, start, end).iterchildren('{*}node'):
+        values = dict(defaults)
+        values.update((a.get('for'), a.get('value')) for a in node.iter('{*}attvalue'))
+        cls = next((values[i] for i in class_ids if i in values), None)
+        if cls is None:
+            continue
+        # normalize class to int when possible
+        try:
+            cls = int(cls)
+        except ValueError:
+            pass
+        seen_classes.add(cls)
+        # the first non-empty one, as on the serial path
+        value = next((values[i] for i in value_ids if values.get(i)), None)
+        counts[cls].update(split_fn(value))
+    return counts, seen_classes
+
+
+def count_terms_by_class(gexf_path, detect_class_attribute, value_titles, split_fn, processes=None,
+                         chunk_bytes=CHUNK_BYTES):
+    """
+    Count split attribute values per modularity class over chunks in parallel.
+
+    Args:
+        gexf_path: GEXF file
+        detect_class_attribute: function attributes of a node by title -> class
+            attribute title or None; it is given the first node, as the serial
+            path gives its detect_modularity_attribute
+        value_titles: candidate titles of the attribute to split and count
+        split_fn: module-level function str -> list of terms (must be picklable)
+        processes: pool size (None = all cores)
+
+    Returns:
+        (dict class -> Counter, set of classes seen, class attribute title or None)
+    """
+    nodes_start, nodes_end, ranges = node_chunks(gexf_path, chunk_bytes)
+    declarations = attribute_declarations(gexf_path, nodes_start)
+    class_title = detect_class_attribute(first_node_attributes(gexf_path, declarations, nodes_start, nodes_end))
+    if class_title is None:
+        return {}, set(), None
+    titles = {i: d.title for i, d in declarations.items()}
+    class_ids = _ids_for(titles, class_title)
+    value_ids = [i for t in value_titles for i in _ids_for(titles, t)]
+    defaults = {i: d.default for i, d in declarations.items()
+                if d.default is not None and i in class_ids + value_ids}
+
+    class_counts = defaultdict(Counter)
+    seen_classes = set()
+    jobs = [(str(gexf_path), start, end, class_ids, value_ids, defaults, split_fn) for start, end in ranges]
+    with Pool(processes) as pool:
+        for counts, seen in pool.imap(_count_chunk, jobs):
+            for cls, counter in counts.items():
+                class_counts[cls].update(counter)
+            seen_classes.update(seen)
+    return class_counts, seen_classes, class_title
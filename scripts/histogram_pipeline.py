@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Compute every per-class histogram from a single pass over the graph.
+
+mesh_histograms_by_modularity.py, keywords_histograms_by_modularity.py and
+embedding_keywords/keywords_histograms_with_embedding.py each load the graph,
+detect the class attribute, split, count and plot on their own. This script
+loads the graph once and counts MeSH terms, raw keywords and canonical
+(synonym grouped) keywords per class in one node pass. Broad categories are
+derived from those counts:
+
+  categories            canonical keywords classified by classify_keywords.py
+                        (or read from a classification CSV with --categories-csv)
+  embedding_categories  raw keywords classified by the embedding model
+                        (embedding_keywords/classified_embedded_keywords.csv)
+
+Outputs are declared in OUTPUTS. Only the counts needed by the requested
+outputs are computed, and every output is written by histogram_rendering
+from its count matrix. Input files (graph, synonyms, category mappings) are
+loaded through memoized loaders, so calling run_pipeline several times in one
+process reads each unchanged file only once, and split node attributes come
+from the per-graph split cache (split_cache.py).
+
+Usage:
+    python -m scripts.histogram_pipeline path/to/graph.gexf [out_dir]
+    python -m scripts.histogram_pipeline path/to/graph.gexf --outputs mesh,canonical_keywords,categories
+"""
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+import networkx as nx
+
+from scripts.gexf_chunks import read_gexf_with_defaults
+from scripts.histogram_rendering import render_figures, write_class_outputs, write_qa_report
+from scripts.keywords_histograms_by_modularity import (
+    KEYWORDS_ATTRIBUTES, SYNONYMS_THRESHOLD, classify_keywords_in_memory, load_category_mapping,
+    load_synonym_data, load_synonym_map, split_normalized_keywords,
+)
+from scripts.mesh_histograms_by_modularity import (
+    MESH_ATTRIBUTES, MODULARITY_META, detect_modularity_attribute, split_mesh_terms,
+)
+from scripts.split_cache import load_split_cache
+from scripts.term_counting import ClassTermCounter, IdRemap, incidence_from_mapping
+
+
+class OutputSpec(NamedTuple):
+    """How one count matrix is written out (see histogram_rendering.write_class_outputs)."""
+    prefix: str
+    column: str
+    what: str
+    xlabel: str = 'Frequency'
+    title_suffix: str = ''
+    color: str = '#333333'
+    display: object = None
+    plot_unmapped: bool = False
+    qa_file: str = None
+    qa_what: str = None
+
+
+# File names and plot text follow the standalone scripts; the embedding
+# categories get their own prefix so both category sets fit in one folder.
+OUTPUTS = {
+    "mesh": OutputSpec(
+        "mesh", "mesh_term", "mesh terms", plot_unmapped=True,
+        qa_file="all_mesh_terms_processed.txt", qa_what="MESH terms"),
+    "keywords": OutputSpec(
+        "keywords", "keyword", "keywords", title_suffix=" (Raw Keywords)", display=str.title,
+        qa_file="all_keywords_processed.txt", qa_what="keywords"),
+    "canonical_keywords": OutputSpec(
+        "canonical_keywords", "keyword", "canonical keywords", xlabel='Frequency (Synonyms Grouped)',
+        title_suffix=" (Canonical Keywords)", display=str.title,
+        qa_file="all_canonical_keywords_processed.txt", qa_what="CANONICAL keywords"),
+    "categories": OutputSpec(
+        "categories", "category", "broad categories",
+        xlabel='Frequency (Total Keywords Classified into Category)',
+        title_suffix=" (Broad Categories)", color='#999999'),
+    "embedding_categories": OutputSpec(
+        "embedding_categories", "category", "embedding categories",
+        xlabel='Frequency (Total Keywords Classified into Category)',
+        title_suffix=" (Embedding Categories)", color='#999999'),
+}
+
+# counts every output is derived from
+OUTPUT_SOURCES = {
+    "mesh": "mesh",
+    "keywords": "keywords",
+    "canonical_keywords": "canonical_keywords",
+    "categories": "canonical_keywords",
+    "embedding_categories": "keywords",
+}
+
+DEFAULT_SYNONYMS = Path('embedding_keywords') / f"keyword_synonyms_{SYNONYMS_THRESHOLD}_with_transitivity.json"
+DEFAULT_EMBEDDING_CATEGORIES = Path('embedding_keywords') / "classified_embedded_keywords.csv"
+
+
+def _load_embedding_categories(path: Path) -> dict:
+    from embedding_keywords.keywords_histograms_with_embedding import load_embedding_category_mapping
+    return load_embedding_category_mapping(path, sep='\t')
+
+
+LOADERS = {
+    "graph": read_gexf_with_defaults,
+    "synonyms": lambda path: load_synonym_map(load_synonym_data(path)),
+    "categories_csv": load_category_mapping,
+    "embedding_categories": _load_embedding_categories,
+}
+
+
+@lru_cache(maxsize=None)
+def _load_cached(kind: str, path: str, mtime_ns: int):
+    return LOADERS[kind](Path(path))
+
+
+def load_input(kind: str, path) -> object:
+    """
+    Load an input file with LOADERS[kind], memoized on its path and modification time.
+
+    The returned objects are shared between calls and must not be modified.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"{kind} input not found: {path}")
+    return _load_cached(kind, str(path.resolve()), path.stat().st_mtime_ns)
+
+
+def count_nodes(G: nx.Graph, attr: str, sources, synonym_map: dict = None, caches: dict = None):
+    """
+    Count the requested sources per class in one pass over the nodes.
+
+    Args:
+        G: graph with a class attribute on its nodes
+        attr: class attribute name
+        sources: subset of {"mesh", "keywords", "canonical_keywords"}
+        synonym_map: keyword -> canonical keyword, needed for "canonical_keywords"
+        caches: optional SplitTermCache per attribute ("mesh", "keywords") to
+            take the split terms from instead of splitting the attribute strings
+
+    Returns:
+        (dict source -> ClassTermMatrix, set of classes seen)
+    """
+    caches = caches or {}
+    mesh_cache = caches.get("mesh")
+    keyword_cache = caches.get("keywords")
+
+    counters = {source: ClassTermCounter() for source in sources}
+    mesh = counters.get("mesh")
+    raw = counters.get("keywords")
+    canonical = counters.get("canonical_keywords")
+    # cached term ids are mapped to counter ids when first counted, so nodes
+    # without a class add no terms; canonical forms are looked up once per keyword
+    if mesh is not None and mesh_cache is not None:
+        mesh_ids = IdRemap(mesh_cache.terms, mesh.terms)
+    if raw is not None and keyword_cache is not None:
+        raw_ids = IdRemap(keyword_cache.terms, raw.terms)
+    if canonical is not None and keyword_cache is not None:
+        canonical_ids = IdRemap(keyword_cache.terms, canonical.terms, lambda k: synonym_map.get(k, k))
+    seen_classes = set()
+
+    for node, data in G.nodes(data=True):
+        cls = data.get(attr)
+        if cls is None:
+            continue
+        # normalize class to int when possible
+        try:
+            cls = int(cls)
+        except Exception:
+            pass
+        seen_classes.add(cls)
+
+        if mesh is not None:
+            if mesh_cache is not None:
+                mesh.add_ids(cls, mesh_ids(mesh_cache.term_ids_of(node)))
+            else:
+                mesh.add(cls, split_mesh_terms(next((data[n] for n in MESH_ATTRIBUTES if data.get(n)), None)))
+        if raw is None and canonical is None:
+            continue
+        if keyword_cache is not None:
+            keyword_ids = keyword_cache.term_ids_of(node)
+            if raw is not None:
+                raw.add_ids(cls, raw_ids(keyword_ids))
+            if canonical is not None:
+                canonical.add_ids(cls, canonical_ids(keyword_ids))
+            continue
+        keywords = split_normalized_keywords(next((data[n] for n in KEYWORDS_ATTRIBUTES if data.get(n)), None))
+        if raw is not None:
+            raw.add(cls, keywords)
+        if canonical is not None:
+            canonical.add(cls, [synonym_map.get(k, k) for k in keywords])
+
+    return {source: counter.to_matrix() for source, counter in counters.items()}, seen_classes
+
+
+def run_pipeline(gexf_path: Path, out_dir: Path, outputs=tuple(OUTPUTS), top_n: int = 30,
+                 generate_plots: bool = True, processes=None, synonyms_path: Path = DEFAULT_SYNONYMS,
+                 categories_csv: Path = None, embedding_categories_path: Path = DEFAULT_EMBEDDING_CATEGORIES,
+                 use_cache: bool = True, render_processes=None):
+    """
+    Write the requested outputs of OUTPUTS for one graph.
+
+    Args:
+        gexf_path: graph with modularity classes
+        out_dir: folder for all CSVs, PNGs and QA lists
+        outputs: names from OUTPUTS
+        top_n: bars per histogram
+        generate_plots: whether to render the PNGs
+        processes: worker processes for keyword classification
+        synonyms_path: synonym groups JSON for the canonical keywords
+        categories_csv: classification CSV to use instead of classifying in memory
+        embedding_categories_path: embedding classification TSV
+        use_cache: take split terms from the per-graph split cache (split_cache.py)
+        render_processes: worker processes rendering the histograms (None = all cores)
+
+    Returns:
+        dict output name -> ClassTermMatrix, or None if no class attribute was found
+    """
+    unknown = [name for name in outputs if name not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs {unknown}; choose from {list(OUTPUTS)}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    G = load_input("graph", gexf_path)
+    attr = detect_modularity_attribute(G)
+    if not attr:
+        print("Could not detect a modularity/community attribute in nodes.")
+        return None
+    print(f"Using modularity attribute: '{attr}'")
+
+    sources = {OUTPUT_SOURCES[name] for name in outputs}
+    synonym_map = load_input("synonyms", synonyms_path) if "canonical_keywords" in sources else None
+    caches = {}
+    if use_cache:
+        if "mesh" in sources:
+            caches["mesh"] = load_split_cache(gexf_path, G, MESH_ATTRIBUTES, split_mesh_terms, "mesh")
+        if sources & {"keywords", "canonical_keywords"}:
+            caches["keywords"] = load_split_cache(gexf_path, G, KEYWORDS_ATTRIBUTES, split_normalized_keywords,
+                                                  "keywords")
+    counts, seen_classes = count_nodes(G, attr, sources, synonym_map, caches)
+
+    matrices = {}
+    for name in outputs:
+        source = counts[OUTPUT_SOURCES[name]]
+        if name == "categories":
+            if categories_csv is not None:
+                mapping = load_input("categories_csv", categories_csv)
+            else:
+                mapping = classify_keywords_in_memory(source.terms, processes=processes)
+        elif name == "embedding_categories":
+            mapping = load_input("embedding_categories", embedding_categories_path)
+        else:
+            matrices[name] = source
+            continue
+        # categories are looked up once per distinct keyword and summed by a sparse product
+        incidence, categories, unclassified = incidence_from_mapping(source.terms, mapping)
+        matrices[name] = source.aggregate(incidence, categories)
+        with open(out_dir / f"{name}_unclassified_keywords.txt", 'w') as f:
+            f.writelines(f"{term}\n" for term in sorted(unclassified))
+
+    jobs = []
+    for name, matrix in matrices.items():
+        spec = OUTPUTS[name]
+        print(f"\n--- {name} ---")
+        jobs += write_class_outputs(matrix, out_dir, seen_classes, MODULARITY_META, spec.prefix, spec.column,
+                                    top_n=top_n, display=spec.display, xlabel=spec.xlabel,
+                                    title_suffix=spec.title_suffix, color=spec.color, plot=generate_plots,
+                                    plot_unmapped=spec.plot_unmapped, what=spec.what)
+        if spec.qa_file:
+            write_qa_report(matrix.terms_seen(), out_dir / spec.qa_file, spec.qa_what, display=spec.display)
+    if generate_plots:
+        render_figures(jobs, out_dir, processes=render_processes)
+    return matrices
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: python -m scripts.histogram_pipeline path/to/graph.gexf [out_dir] [options]")
+        print("\nOptions:")
+        print(f"  --outputs A,B,...          Outputs to write (default: all of {','.join(OUTPUTS)})")
+        print("  --no-plots                 Write CSVs and QA lists only")
+        print("  --processes N              Worker processes for keyword classification")
+        print("  --render-processes N       Worker processes rendering the histograms (default: all cores)")
+        print("  --synonyms PATH            Synonym groups JSON (default: embedding_keywords/keyword_synonyms_...json)")
+        print("  --categories-csv PATH      Rule categories from this CSV instead of classifying in memory")
+        print("  --embedding-categories PATH  Embedding classification TSV")
+        print("  --no-cache                 Split the node attributes again instead of using the split cache")
+        return 1
+
+    # Parse arguments: flags (with their values) first, then positional ones
+    options = {"--outputs": ",".join(OUTPUTS), "--processes": None, "--render-processes": None, "--synonyms": DEFAULT_SYNONYMS,
+               "--categories-csv": None, "--embedding-categories": DEFAULT_EMBEDDING_CATEGORIES}
+    positional = []
+    i = 1
+    while i < len(argv):
+        if argv[i] in options and i + 1 < len(argv):
+            options[argv[i]] = argv[i + 1]
+            i += 2
+        else:
+            if not argv[i].startswith("--"):
+                positional.append(argv[i])
+            i += 1
+
+    if not positional:
+        print("Missing path/to/graph.gexf")
+        return 1
+    gexf_path = Path(positional[0])
+    if not gexf_path.exists():
+        print(f"GEXF file not found: {gexf_path}")
+        return 1
+    out_dir = Path(positional[1]) if len(positional) > 1 else gexf_path.parent / "histograms"
+
+    outputs = [name.strip() for name in options["--outputs"].split(",") if name.strip()]
+    unknown = [name for name in outputs if name not in OUTPUTS]
+    if unknown:
+        print(f"Unknown outputs: {', '.join(unknown)} (choose from {', '.join(OUTPUTS)})")
+        return 1
+    processes = int(options["--processes"]) if options["--processes"] else None
+    render_processes = int(options["--render-processes"]) if options["--render-processes"] else None
+    categories_csv = Path(options["--categories-csv"]) if options["--categories-csv"] else None
+
+    try:
+        result = run_pipeline(gexf_path, out_dir, outputs, generate_plots="--no-plots" not in argv,
+                              processes=processes, synonyms_path=Path(options["--synonyms"]),
+                              categories_csv=categories_csv,
+                              embedding_categories_path=Path(options["--embedding-categories"]),
+                              use_cache="--no-cache" not in argv, render_processes=render_processes)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0 if result is not None else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
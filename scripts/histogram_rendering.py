@@ -0,0 +1,179 @@
+"""Per-class outputs of the modularity histogram scripts.
+
+Every output (full counts CSV, top-N histogram PNG, QA term list) is written
+from one ClassTermMatrix, for classes in MODULARITY_META and for classes
+present in the graph but missing from it ("unmapped") alike.
+
+CSVs are written right away; histograms are collected as FigureJobs and
+rendered afterwards by render_figures, on a process pool with the Agg
+backend. A manifest in the output folder keeps the hash of the data behind
+every PNG, so figures whose counts did not change are not rendered again.
+"""
+import hashlib
+import json
+import os
+import re
+from multiprocessing import Pool
+from pathlib import Path
+from typing import NamedTuple
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+UNMAPPED_COLOR = "#666666"
+DPI = 150
+RENDER_MANIFEST = "render_manifest.json"
+
+
+class FigureJob(NamedTuple):
+    """Everything needed to draw one histogram, picklable for the render pool."""
+    labels: list
+    values: list
+    color: str
+    xlabel: str
+    title: str
+    png_path: Path
+
+    def digest(self) -> str:
+        """Hash of the plotted data and styling (not of the output path)."""
+        payload = json.dumps([self.labels, self.values, self.color, self.xlabel, self.title, DPI])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def sanitize_filename(s: str) -> str:
+    """Return a filename-safe version of string s."""
+    s = s.replace("\n", " ")
+    s = re.sub(r"[^A-Za-z0-9 _-]", "", s)
+    s = re.sub(r"\s+", "_", s).strip("_ ")
+    return s
+
+
+def plot_histogram(labels, values, color, xlabel, title, png_path: Path):
+    """Horizontal bar chart of labels/values, largest at the top."""
+    plt.figure(figsize=(10, max(4, len(labels) * 0.25)))
+    plt.barh(labels[::-1], values[::-1], color=color)
+    plt.xlabel(xlabel)
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(png_path, dpi=DPI)
+    plt.close()
+
+
+def _render(job: FigureJob):
+    plot_histogram(job.labels, job.values, job.color, job.xlabel, job.title, job.png_path)
+
+
+def render_figures(jobs, out_dir: Path, processes=None, force: bool = False):
+    """
+    Render histogram jobs, skipping those whose PNG is up to date.
+
+    Args:
+        jobs: FigureJobs, e.g. as returned by write_class_outputs
+        out_dir: folder holding the render manifest
+        processes: render pool size (None = all cores, 1 = in this process)
+        force: render every job regardless of the manifest
+
+    Returns:
+        number of figures rendered
+    """
+    manifest_path = Path(out_dir) / RENDER_MANIFEST
+    manifest = {}
+    if manifest_path.exists() and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    digests = {job.png_path.name: job.digest() for job in jobs}
+    todo = [job for job in jobs
+            if manifest.get(job.png_path.name) != digests[job.png_path.name] or not job.png_path.exists()]
+    n_workers = min(processes or os.cpu_count() or 1, len(todo))
+    if todo:
+        if n_workers == 1:
+            for job in todo:
+                _render(job)
+        else:
+            with Pool(n_workers) as pool:
+                # chunksize 1: figure sizes vary a lot with the number of bars
+                for _ in pool.imap_unordered(_render, todo):
+                    pass
+
+    manifest.update(digests)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    print(f"Rendered {len(todo)} histograms ({len(jobs) - len(todo)} unchanged, skipped)")
+    return len(todo)
+
+
+def write_class_outputs(matrix, out_dir: Path, seen_classes, modularity_meta: dict, prefix: str, column: str,
+                        top_n: int = 30, display=None, xlabel: str = 'Frequency', title_suffix: str = '',
+                        color: str = '#333333', plot: bool = True, plot_unmapped: bool = True,
+                        what: str = 'terms'):
+    """
+    Write `<prefix>_counts_mod_<class>_<label>.csv` per class and collect the
+    `<prefix>_hist_mod_<class>_<label>.png` histograms to render.
+
+    Args:
+        matrix: ClassTermMatrix with the counts
+        out_dir: output folder
+        seen_classes: classes present in the graph
+        modularity_meta: class -> {"label", "displaylabel", "color"}
+        prefix: file name prefix, e.g. "mesh" or "canonical_keywords"
+        column: name of the term column in the CSV
+        top_n: bars per histogram
+        display: optional function applied to term labels before writing
+        xlabel, title_suffix: plot text
+        color: bar color of mapped classes without a color in the mapping
+        plot: whether to collect PNGs at all
+        plot_unmapped: whether unmapped classes get a PNG (their CSV is always written)
+        what: name of the counted items in progress messages
+
+    Returns:
+        list of FigureJob for render_figures
+    """
+    jobs = []
+    unmapped = [c for c in seen_classes if c not in modularity_meta]
+    targets = [(cls, meta, False) for cls, meta in modularity_meta.items()]
+    targets += [(cls, {"label": f"Modularity_{cls}"}, True) for cls in unmapped]
+
+    for cls, meta, is_unmapped in targets:
+        if cls not in seen_classes:
+            print(f"Class {cls} not present in graph, skipping")
+            continue
+        rows = matrix.row(cls)
+        if not rows:
+            if not is_unmapped:
+                print(f"No {what} found for class {cls}, skipping plot")
+            continue
+
+        label = sanitize_filename(meta['label'])
+        csv_path = out_dir / f"{prefix}_counts_mod_{cls}_{label}.csv"
+        df = pd.DataFrame(rows, columns=[column, "count"])
+        if display is not None:
+            df[column] = df[column].map(display)
+        df.to_csv(csv_path, index=False)
+        kind = "unmapped class" if is_unmapped else "class"
+        print(f"Saved {what} CSV for {kind} {cls}: {csv_path}")
+
+        if not plot or (is_unmapped and not plot_unmapped):
+            continue
+        top = df.head(top_n)
+        if is_unmapped:
+            bar_color, title = UNMAPPED_COLOR, meta['label']
+        else:
+            bar_color = meta.get('color', color)
+            title = meta.get('displaylabel', meta.get('label', f'Modularity {cls}')) + title_suffix
+        png_path = out_dir / f"{prefix}_hist_mod_{cls}_{label}.png"
+        jobs.append(FigureJob(top[column].tolist(), top['count'].tolist(), bar_color, xlabel, title, png_path))
+    return jobs
+
+
+def write_qa_report(terms, qa_path: Path, what: str, display=None):
+    """Sorted list of every distinct term processed, with a count header."""
+    terms_sorted = sorted(terms)
+    with open(qa_path, 'w') as f:
+        f.write(f"Total unique {what} processed: {len(terms_sorted)}\n")
+        f.write("=" * 80 + "\n\n")
+        for term in terms_sorted:
+            f.write(f"{display(term) if display else term}\n")
+    print(f"\nQA report saved to: {qa_path}")
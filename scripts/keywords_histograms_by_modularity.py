@@ -2,21 +2,27 @@
 """Generate one histogram per modularity class counting canonical keyword frequencies.
 
 Usage:
-    python scripts/keywords_histograms_by_modularity.py path/to/graph.gexf
+    python -m scripts.keywords_histograms_by_modularity path/to/graph.gexf
 
 The script will create PNG files (one per modularity class present in the
 graph and defined in the mapping) and CSV files with full keyword counts, 
 grouped by synonyms.
+
+The split keywords of every node are cached per graph (split_cache.py) in a
+.split_cache folder next to the GEXF; --no-cache disables this.
 """
-import re
 import sys
 import json # New import for JSON loading
 from pathlib import Path
-from collections import Counter, defaultdict
+from collections import Counter
 
 import networkx as nx
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from scripts.gexf_chunks import count_terms_by_class, read_gexf_with_defaults
+from scripts.histogram_rendering import render_figures, write_class_outputs, write_qa_report
+from scripts.split_cache import load_split_cache
+from scripts.term_counting import ClassTermCounter, IdRemap, incidence_from_mapping
 
 SYNONYMS_THRESHOLD = 0.97
 # Mapping provided by the user: keys are modularity class ids (ints)
@@ -64,12 +70,17 @@ MODULARITY_META = {
 }
 
 
-def sanitize_filename(s: str) -> str:
-    """Return a filename-safe version of string s."""
-    s = s.replace("\n", " ")
-    s = re.sub(r"[^A-Za-z0-9 _-]", "", s)
-    s = re.sub(r"\s+", "_", s).strip("_ ")
-    return s
+# Node attributes that may hold the modularity/community id, in order of preference
+MODULARITY_ATTRIBUTES = [
+    "modularity_class",
+    "modularity class",
+    "community",
+    "mod",
+    "partition",
+    "community_id",
+    "communityId",
+]
+KEYWORDS_ATTRIBUTES = ["keywords", "Keywords", "KEYWORDS"]
 
 
 def detect_modularity_attribute(G: nx.Graph):
@@ -79,17 +90,15 @@ def detect_modularity_attribute(G: nx.Graph):
     """
     if G.number_of_nodes() == 0:
         return None
-    sample = next(iter(G.nodes(data=True)))[1]
-    candidates = [
-        "modularity_class",
-        "modularity class",
-        "community",
-        "mod",
-        "partition",
-        "community_id",
-        "communityId",
-    ]
-    for c in candidates:
+    return modularity_attribute_of(next(iter(G.nodes(data=True)))[1])
+
+
+def modularity_attribute_of(sample: dict):
+    """The modularity/community attribute among the attributes of one node, or None.
+
+    Also the rule of the chunked reader (gexf_chunks.count_terms_by_class).
+    """
+    for c in MODULARITY_ATTRIBUTES:
         if c in sample:
             return c
         # fallback: try any integer-like attribute among node attrs
@@ -156,6 +165,11 @@ def normalize_keyword(keyword: str) -> str:
     return keyword.lower()
 
 
+def split_normalized_keywords(keywords_value: str):
+    """split_keywords followed by normalize_keyword (used by the chunked GEXF reader)."""
+    return [normalize_keyword(t) for t in split_keywords(keywords_value)]
+
+
 # --- New Function to Load Synonym Data ---
 def load_synonym_data(json_path: Path) -> dict:
     """Load the synonym dictionary from a JSON file."""
@@ -230,8 +244,18 @@ def load_category_mapping(csv_path: Path) -> dict:
     return mapping
 
 
-def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30):
-    G = nx.read_gexf(gexf_path)
+def classify_keywords_in_memory(keywords, processes=None) -> dict:
+    """Classify keywords with classify_keywords.py directly, without its CSV round trip."""
+    from classify_keywords import classify_keywords
+
+    mapping = classify_keywords(keywords, processes=processes, unknown_words_path=None)
+    print(f"Classified {len(mapping)} canonical keywords in memory.")
+    return mapping
+
+
+def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30,
+                    classify_in_memory: bool = False, processes=None, use_cache: bool = True,
+                    render_processes=None):
     out_dir.mkdir(parents=True, exist_ok=True)
     
     # 1. Load Synonym Data and Create Map
@@ -243,181 +267,141 @@ def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30):
     synonym_map = load_synonym_map(synonym_data)
     print(f"Created canonical map for {len(synonym_map)} unique keyword variants.")
     
-    # 2. Load the broad category mapping
-    category_csv_path = Path("keyword_classification_25_categories.csv")
-    category_mapping = load_category_mapping(category_csv_path)
-
-    attr = detect_modularity_attribute(G)
+    # 2. Load the broad category mapping (or classify the graph's keywords below)
+    if not classify_in_memory:
+        category_csv_path = Path("keyword_classification_25_categories.csv")
+        category_mapping = load_category_mapping(category_csv_path)
+
+    if processes is not None:
+        # count straight from the XML in parallel chunks, without building the graph
+        class_term_counts, seen_classes, attr = count_terms_by_class(
+            gexf_path, modularity_attribute_of, KEYWORDS_ATTRIBUTES, split_normalized_keywords, processes=processes)
+    else:
+        G = read_gexf_with_defaults(gexf_path)
+        attr = detect_modularity_attribute(G)
     if not attr:
         print("Could not detect a modularity/community attribute in nodes.")
         return
 
     print(f"Using modularity attribute: '{attr}'")
 
-    # Collect canonical keywords and broad categories per class
-    class_canonical_keyword_counts = defaultdict(Counter) 
-    class_category_counts = defaultdict(Counter)
-    seen_classes = set()
-
-    terms_not_found_in_categories = set([])
-
-    for _, data in G.nodes(data=True):
-        cls = data.get(attr)
-        if cls is None:
-            continue
-        # normalize class to int when possible
-        try:
-            cls_int = int(cls)
-        except Exception:
-            cls_int = cls
-        seen_classes.add(cls_int)
-        
-        keywords = data.get("keywords") or data.get("Keywords") or data.get("KEYWORDS")
-        terms = split_keywords(keywords)
-        
-        # Process terms: normalize and find canonical form
-        normalized_terms = [normalize_keyword(t) for t in terms]
-        canonical_terms = []
-        for term in normalized_terms:
-            # Get the canonical form, falling back to the term itself if not in the synonym list
-            canonical_term = synonym_map.get(term, term)
-            canonical_terms.append(canonical_term)
-            
-            # Use the canonical term for looking up broad categories
-            broad_categories = category_mapping.get(canonical_term)
-            if broad_categories:
-                 class_category_counts[cls_int].update(broad_categories)
-            else: 
-                 terms_not_found_in_categories.add(canonical_term)
-
-        # Count the canonical forms
-        class_canonical_keyword_counts[cls_int].update(canonical_terms)
-        
+    # Collect canonical keywords per class, as interned term ids
+    canonical_counter = ClassTermCounter()
+
+    if processes is not None:
+        for cls_int, term_counts in class_term_counts.items():
+            canonical_counts = Counter()
+            for term, count in term_counts.items():
+                canonical_counts[synonym_map.get(term, term)] += count
+            canonical_counter.add_counts(cls_int, canonical_counts)
+    else:
+        cache = None
+        if use_cache:
+            # split keywords come from the per-graph cache; their canonical
+            # ids are looked up once per distinct keyword, when first counted
+            cache = load_split_cache(gexf_path, G, KEYWORDS_ATTRIBUTES, split_normalized_keywords, "keywords")
+            canonical_ids = IdRemap(cache.terms, canonical_counter.terms, lambda t: synonym_map.get(t, t))
+
+        seen_classes = set()
+        for node, data in G.nodes(data=True):
+            cls = data.get(attr)
+            if cls is None:
+                continue
+            # normalize class to int when possible
+            try:
+                cls_int = int(cls)
+            except Exception:
+                cls_int = cls
+            seen_classes.add(cls_int)
+            if cache is not None:
+                canonical_counter.add_ids(cls_int, canonical_ids(cache.term_ids_of(node)))
+                continue
+
+            keywords = data.get("keywords") or data.get("Keywords") or data.get("KEYWORDS")
+            terms = split_keywords(keywords)
+
+            # Process terms: normalize and find canonical form
+            normalized_terms = [normalize_keyword(t) for t in terms]
+            canonical_terms = []
+            for term in normalized_terms:
+                # Get the canonical form, falling back to the term itself if not in the synonym list
+                canonical_term = synonym_map.get(term, term)
+                canonical_terms.append(canonical_term)
+
+            # Count the canonical forms
+            canonical_counter.add(cls_int, canonical_terms)
+
+    canonical_matrix = canonical_counter.to_matrix()
+
+    if classify_in_memory:
+        category_mapping = classify_keywords_in_memory(set(canonical_matrix.terms), processes=processes)
+
+    # Broad categories are looked up once per distinct canonical term; the
+    # (classes x categories) counts are the canonical counts @ (terms x categories)
+    incidence, categories, terms_not_found_in_categories = incidence_from_mapping(
+        canonical_matrix.terms, category_mapping)
+    category_matrix = canonical_matrix.aggregate(incidence, categories)
+
     with open("errors_in_classifying_keywords.txt", 'w') as f:
         f.write("Canonical keywords not found in 'keyword_classification_25_categories.csv':\n")
         for term in sorted(terms_not_found_in_categories):
             f.write(term)
             f.write('\n')
-    
-    # --- PLOTTING LOOP: Canonical Keywords (Synonym Groups) ---
+
+    # Mapped classes get CSV + histogram, unmapped ones (by class id) the CSV only
     print("\n--- Generating Canonical Keyword Histograms (Synonym Groups) ---")
-    for cls, meta in MODULARITY_META.items():
-        if cls not in seen_classes:
-            print(f"Class {cls} not present in graph, skipping")
-            continue
-
-        counts = class_canonical_keyword_counts.get(cls, Counter())
-        if not counts:
-            print(f"No canonical keywords found for class {cls}, skipping plot")
-            continue
-
-        # Save full counts to CSV
-        csv_path = out_dir / f"canonical_keywords_counts_mod_{cls}_{sanitize_filename(meta['label'])}.csv" 
-        df = pd.DataFrame(counts.most_common(), columns=["keyword", "count"]) 
-        df["keyword"] = df["keyword"].str.title() 
-        df.to_csv(csv_path, index=False)
-
-        # Plot top N
-        top = df.head(top_n)
-        labels = top['keyword'].tolist()[::-1]
-        values = top['count'].tolist()[::-1]
-
-        plt.figure(figsize=(10, max(4, len(labels) * 0.25)))
-        color = meta.get('color', '#333333')
-        plt.barh(labels, values, color=color)
-        plt.xlabel('Frequency (Synonyms Grouped)') 
-        plt.title(meta.get('displaylabel', meta.get('label', f'Modularity {cls}')) + " (Canonical Keywords)")
-        plt.tight_layout()
-
-        png_path = out_dir / f"canonical_keywords_hist_mod_{cls}_{sanitize_filename(meta['label'])}.png"
-        plt.savefig(png_path, dpi=150)
-        plt.close()
-
-        print(f"Saved canonical histogram and CSV for class {cls}: {png_path}, {csv_path}")
-
-    # --- PLOTTING LOOP: Broad Categories (Remains the same) ---
-    print("\n--- Generating Broad Category Histograms ---")
-    for cls, meta in MODULARITY_META.items():
-        if cls not in seen_classes:
-            continue
-
-        counts = class_category_counts.get(cls, Counter())
-        if not counts:
-            print(f"No broad categories found for class {cls}, skipping plot")
-            continue
-
-        # Save full counts to CSV
-        csv_path = out_dir / f"categories_counts_mod_{cls}_{sanitize_filename(meta['label'])}.csv"
-        df = pd.DataFrame(counts.most_common(), columns=["category", "count"]) 
-        df.to_csv(csv_path, index=False)
-
-        # Plot top N 
-        top = df.head(top_n)
-        labels = top['category'].tolist()[::-1]
-        values = top['count'].tolist()[::-1]
-
-        plt.figure(figsize=(10, max(4, len(labels) * 0.25)))
-        color = meta.get('color', '#999999')
-        plt.barh(labels, values, color=color)
-        plt.xlabel('Frequency (Total Keywords Classified into Category)')
-        plt.title(meta.get('displaylabel', meta.get('label', f'Modularity {cls}')) + " (Broad Categories)")
-        plt.tight_layout()
-
-        png_path = out_dir / f"categories_hist_mod_{cls}_{sanitize_filename(meta['label'])}.png"
-        plt.savefig(png_path, dpi=150)
-        plt.close()
-
-        print(f"Saved broad category histogram and CSV for class {cls}: {png_path}, {csv_path}")
-
-
-    # Handle unmapped classes (Modified to include both canonical and broad category saving)
-    unmapped = [c for c in seen_classes if c not in MODULARITY_META]
-    for cls in unmapped:
-      # 1. Canonical Keywords
-      counts_kw = class_canonical_keyword_counts.get(cls, Counter())
-      if counts_kw:
-          label = f"Modularity_{cls}"
-          csv_path = out_dir / f"canonical_keywords_counts_mod_{cls}_{sanitize_filename(label)}.csv"
-          df = pd.DataFrame(counts_kw.most_common(), columns=["keyword", "count"]) 
-          df["keyword"] = df["keyword"].str.title()
-          df.to_csv(csv_path, index=False)
-          # Plotting logic for unmapped class           
-      # 2. Broad Categories
-      counts_cat = class_category_counts.get(cls, Counter())
-      if counts_cat:
-          label = f"Modularity_{cls}"
-          csv_path = out_dir / f"categories_counts_mod_{cls}_{sanitize_filename(label)}.csv"
-          df = pd.DataFrame(counts_cat.most_common(), columns=["category", "count"]) 
-          df.to_csv(csv_path, index=False)
-          # Plotting logic for unmapped class
+    jobs = write_class_outputs(canonical_matrix, out_dir, seen_classes, MODULARITY_META,
+                               "canonical_keywords", "keyword", top_n=top_n, display=str.title,
+                               xlabel='Frequency (Synonyms Grouped)', title_suffix=" (Canonical Keywords)",
+                               plot_unmapped=False, what="canonical keywords")
 
-    # Generate QA report: all unique CANONICAL keywords processed
-    all_keywords = set()
-    for counts in class_canonical_keyword_counts.values():
-        all_keywords.update(counts.keys())
+    print("\n--- Generating Broad Category Histograms ---")
+    jobs += write_class_outputs(category_matrix, out_dir, seen_classes, MODULARITY_META, "categories", "category",
+                                top_n=top_n, xlabel='Frequency (Total Keywords Classified into Category)',
+                                title_suffix=" (Broad Categories)", color='#999999', plot_unmapped=False,
+                                what="broad categories")
 
-    all_keywords_sorted = sorted(all_keywords)
-    qa_path = out_dir / "all_canonical_keywords_processed.txt"
-    with open(qa_path, 'w') as f:
-        f.write(f"Total unique CANONICAL keywords processed: {len(all_keywords_sorted)}\n")
-        f.write("=" * 80 + "\n\n")
-        for kw in all_keywords_sorted:
-            f.write(f"{kw.title()}\n")
-    print(f"\nQA report saved to: {qa_path}")
+    # Both figure sets go through one render pool
+    render_figures(jobs, out_dir, processes=render_processes)
 
+    # Generate QA report: all unique CANONICAL keywords processed
+    write_qa_report(canonical_matrix.terms_seen(), out_dir / "all_canonical_keywords_processed.txt",
+                    "CANONICAL keywords", display=str.title)
 
 def main(argv):
     if len(argv) < 2:
-        print("Usage: python scripts/keywords_histograms_by_modularity.py path/to/graph.gexf [out_dir]")
+        print("Usage: python -m scripts.keywords_histograms_by_modularity path/to/graph.gexf [out_dir] [--classify] [--processes N] [--render-processes N]")
+        print("\nOptions:")
+        print("  --classify       Classify keywords in memory with classify_keywords.py instead of")
+        print("                   reading 'keyword_classification_25_categories.csv'")
+        print("  --processes N    Worker processes used by --classify and to read the GEXF in chunks")
+        print("  --render-processes N  Worker processes rendering the histograms (default: all cores)")
+        print("  --no-cache       Split the keywords again instead of using the per-graph split cache")
         return 1
     gexf_path = Path(argv[1])
     if not gexf_path.exists():
         print(f"GEXF file not found: {gexf_path}")
         return 1
-    out_dir = Path(argv[2]) if len(argv) > 2 else gexf_path.parent / f"keywords_histograms_{SYNONYMS_THRESHOLD}"
+    classify_in_memory = "--classify" in argv
+    processes = None
+    render_processes = None
+    positional = []
+    i = 1
+    while i < len(argv):
+        if argv[i] == "--processes" and i + 1 < len(argv):
+            processes = int(argv[i + 1])
+            i += 2
+        elif argv[i] == "--render-processes" and i + 1 < len(argv):
+            render_processes = int(argv[i + 1])
+            i += 2
+        else:
+            if not argv[i].startswith("--"):
+                positional.append(argv[i])
+            i += 1
+    out_dir = Path(positional[1]) if len(positional) > 1 else gexf_path.parent / f"keywords_histograms_{SYNONYMS_THRESHOLD}"
     
     # Check for required files
-    if not Path("keyword_classification_25_categories.csv").exists():
+    if not classify_in_memory and not Path("keyword_classification_25_categories.csv").exists():
         print("Error: Required classification file 'keyword_classification_25_categories.csv' not found.")
         return 1
         
@@ -426,7 +410,8 @@ def main(argv):
         return 1
         
     # --- Execute the histogram generation ---
-    make_histograms(gexf_path, out_dir)
+    make_histograms(gexf_path, out_dir, classify_in_memory=classify_in_memory, processes=processes,
+                    use_cache="--no-cache" not in argv, render_processes=render_processes)
     return 0
 
 
@@ -2,19 +2,39 @@
 """Generate one histogram per modularity class counting MESH term frequencies.
 
 Usage:
-    python scripts/mesh_histograms_by_modularity.py path/to/graph.gexf
+    python -m scripts.mesh_histograms_by_modularity path/to/graph.gexf
+    python -m scripts.mesh_histograms_by_modularity path/to/graph.gexf --rollup-depth 2 --mesh-vocab MeSH_complete.csv
+    python -m scripts.mesh_histograms_by_modularity path/to/graph.gexf --resolve-ids --mesh-vocab MeSH_vocabulary.sqlite
 
 The script will create PNG files (one per modularity class present in the
 graph and defined in the mapping) and CSV files with full term counts.
+
+With --rollup-depth N, every term is counted under its MeSH tree ancestors
+cut at N levels (e.g. depth 2: F01.145.500 -> F01.145), using the MN tree
+numbers of a MeSH CSV from parse_mesh_ascii_to_csv.py or a vocabulary
+database from mesh_vocabulary.py.
+
+With --resolve-ids, the `mesh_id` UIs are counted instead of the names in
+`mesh` and named through the --mesh-vocab file afterwards. Values stored as
+JSON arrays (mesh_lists.py) are read as lists, without comma splitting.
+
+The split terms of every node are cached per graph (split_cache.py) in a
+.split_cache folder next to the GEXF, so later runs on the same file skip
+the string parsing; --no-cache disables this.
 """
-import re
 import sys
 from pathlib import Path
-from collections import Counter, defaultdict
 
+import numpy as np
 import networkx as nx
 import pandas as pd
-import matplotlib.pyplot as plt
+import scipy.sparse as sp
+
+from scripts.gexf_chunks import count_terms_by_class, read_gexf_with_defaults
+from scripts.histogram_rendering import render_figures, write_class_outputs, write_qa_report
+from scripts.mesh_lists import decode_mesh_list
+from scripts.split_cache import load_split_cache
+from scripts.term_counting import ClassTermCounter, ClassTermMatrix, IdRemap, TermDictionary
 
 
 # Mapping provided by the user: keys are modularity class ids (ints)
@@ -62,12 +82,18 @@ MODULARITY_META = {
 }
 
 
-def sanitize_filename(s: str) -> str:
-    """Return a filename-safe version of string s."""
-    s = s.replace("\n", " ")
-    s = re.sub(r"[^A-Za-z0-9 _-]", "", s)
-    s = re.sub(r"\s+", "_", s).strip("_ ")
-    return s
+# Node attributes that may hold the modularity/community id, in order of preference
+MODULARITY_ATTRIBUTES = [
+    "modularity_class",
+    "modularity class",
+    "community",
+    "mod",
+    "partition",
+    "community_id",
+    "communityId",
+]
+MESH_ATTRIBUTES = ["mesh", "MESH", "Mesh"]
+MESH_ID_ATTRIBUTES = ["mesh_id", "MESH_ID", "Mesh_id"]
 
 
 def detect_modularity_attribute(G: nx.Graph):
@@ -77,17 +103,15 @@ def detect_modularity_attribute(G: nx.Graph):
     """
     if G.number_of_nodes() == 0:
         return None
-    sample = next(iter(G.nodes(data=True)))[1]
-    candidates = [
-        "modularity_class",
-        "modularity class",
-        "community",
-        "mod",
-        "partition",
-        "community_id",
-        "communityId",
-    ]
-    for c in candidates:
+    return modularity_attribute_of(next(iter(G.nodes(data=True)))[1])
+
+
+def modularity_attribute_of(sample: dict):
+    """The modularity/community attribute among the attributes of one node, or None.
+
+    Also the rule of the chunked reader (gexf_chunks.count_terms_by_class).
+    """
+    for c in MODULARITY_ATTRIBUTES:
         if c in sample:
             return c
     # fallback: try any integer-like attribute among node attrs
@@ -101,31 +125,123 @@ def detect_modularity_attribute(G: nx.Graph):
 
 
 def split_mesh_terms(mesh_value: str):
-    """Split a mesh string into individual terms. Returns list of cleaned terms.
-    
-    Prefers semicolon splitting if present, otherwise falls back to comma splitting.
+    """Split a mesh value into individual terms. Returns list of cleaned terms.
+
+    JSON arrays (see mesh_lists.py) are decoded as is. Older comma-joined
+    strings prefer semicolon splitting if present, otherwise fall back to
+    comma splitting.
+    """
+    return decode_mesh_list(mesh_value)
+
+
+def resolve_mesh_ids(matrix: ClassTermMatrix, vocab_path: Path) -> ClassTermMatrix:
+    """Replace MeSH UIs by their headings in a class x UI count matrix.
+
+    Only the distinct UIs that were counted are looked up, in a .sqlite
+    vocabulary from mesh_vocabulary.py or a MeSH CSV. Unknown UIs are kept.
     """
-    if mesh_value is None:
-        return []
-    if pd.isna(mesh_value):
-        return []
-    s = str(mesh_value).strip()
-    if not s:
-        return []
-    # If semicolon is present, split by semicolon; otherwise split by comma
-    if ';' in s:
-        parts = [p.strip() for p in s.split(';')]
+    uis = matrix.terms
+    if Path(vocab_path).suffix in ('.sqlite', '.db'):
+        from scripts.mesh_vocabulary import MeshVocabulary
+        with MeshVocabulary(vocab_path) as vocabulary:
+            names = [vocabulary.heading(ui) or ui for ui in uis]
     else:
-        parts = [p.strip() for p in s.split(',')]
-    parts = [p for p in parts if p]
-    return parts
+        from scripts.fix_gexf_mesh_using_mesh_csv import load_mesh_mapping
+        mapping = load_mesh_mapping(vocab_path)
+        names = [mapping.get(ui) or ui for ui in uis]
+
+    # UIs sharing a heading are merged by the (UIs x headings) product
+    headings = TermDictionary()
+    cols = headings.intern_many(names)
+    incidence = sp.csr_matrix((np.ones(len(uis), dtype=np.int64), (np.arange(len(uis)), cols)),
+                              shape=(len(uis), len(headings)))
+    return matrix.aggregate(incidence, headings.terms)
+
+
+def load_tree_numbers(vocab_path: Path):
+    """Return dict MeSH heading -> list of MN tree numbers.
+
+    vocab_path is either a MeSH CSV (MH and MN columns, '||'-joined values) or
+    a .sqlite vocabulary from mesh_vocabulary.py.
+    """
+    vocab_path = Path(vocab_path)
+    if vocab_path.suffix in ('.sqlite', '.db'):
+        from scripts.mesh_vocabulary import MeshVocabulary
+        with MeshVocabulary(vocab_path) as vocabulary:
+            return vocabulary.tree_number_map()
+
+    df = pd.read_csv(vocab_path, usecols=['MH', 'MN'], dtype=str, keep_default_na=False)
+    tree_numbers = {}
+    for mh, mn in zip(df['MH'], df['MN']):
+        mh = mh.split('||', 1)[0].strip()
+        if mh and mn:
+            tree_numbers[mh] = [t.strip() for t in mn.split('||') if t.strip()]
+    return tree_numbers
+
+
+def ancestor_incidence(terms, tree_numbers: dict, depth: int):
+    """Binary (terms x ancestors) matrix mapping each term to its tree ancestors at `depth`.
+
+    Tree numbers are cut to their first `depth` dot-separated levels; a term
+    under several branches gets one column per distinct ancestor. Terms that
+    are not in tree_numbers (also tried case-insensitively) have empty rows.
+
+    Returns:
+        (csr matrix, ancestor tree numbers, unresolved terms)
+    """
+    lowered = {mh.lower(): mns for mh, mns in tree_numbers.items()}
+    rows, prefixes, unresolved = [], [], []
+    for i, term in enumerate(terms):
+        mns = tree_numbers.get(term) or lowered.get(term.lower())
+        if not mns:
+            unresolved.append(term)
+            continue
+        for prefix in {'.'.join(mn.split('.')[:depth]) for mn in mns}:
+            rows.append(i)
+            prefixes.append(prefix)
+
+    ancestors, cols = np.unique(np.asarray(prefixes, dtype=object), return_inverse=True)
+    incidence = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (np.asarray(rows, dtype=np.int64), cols.ravel())),
+        shape=(len(terms), len(ancestors)),
+    )
+    return incidence, ancestors.tolist(), unresolved
 
 
-def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30, generate_plots: bool = True):
-    G = nx.read_gexf(gexf_path)
+def rollup_counts(matrix: ClassTermMatrix, tree_numbers: dict, depth: int):
+    """Aggregate per-class term counts up to MeSH tree ancestors at `depth`.
+
+    All classes are rolled up at once as (classes x terms) @ (terms x ancestors).
+    Ancestors are labelled "<tree number> <heading>" when the heading is known.
+
+    Returns:
+        (ClassTermMatrix of ancestor labels, sorted unresolved terms)
+    """
+    incidence, ancestors, unresolved = ancestor_incidence(matrix.terms, tree_numbers, depth)
+    rolled = (matrix.counts @ incidence).tocsr()
+    rolled.eliminate_zeros()
+    rolled.sort_indices()
+
+    heading_of = {mn: mh for mh, mns in tree_numbers.items() for mn in mns}
+    labels = [f"{a} {heading_of[a]}" if a in heading_of else a for a in ancestors]
+    # ties between ancestors are broken by tree number
+    return ClassTermMatrix(rolled, list(matrix.classes), labels), sorted(unresolved)
+
+
+def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30, generate_plots: bool = True,
+                    rollup_depth: int = None, tree_numbers: dict = None, processes: int = None,
+                    resolve_ids_from: Path = None, use_cache: bool = True, render_processes: int = None):
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    attr = detect_modularity_attribute(G)
+    if processes is not None:
+        # count straight from the XML in parallel chunks, without building the graph
+        class_mesh_counts, seen_classes, attr = count_terms_by_class(
+            gexf_path, modularity_attribute_of, MESH_ID_ATTRIBUTES if resolve_ids_from else MESH_ATTRIBUTES,
+            split_mesh_terms, processes=processes)
+        matrix = ClassTermMatrix.from_counters(class_mesh_counts)
+    else:
+        G = read_gexf_with_defaults(gexf_path)
+        attr = detect_modularity_attribute(G)
     if not attr:
         print("Could not detect a modularity/community attribute in nodes.\n"
               "Please ensure your GEXF contains a community attribute (e.g. 'modularity_class').")
@@ -133,122 +249,135 @@ def make_histograms(gexf_path: Path, out_dir: Path, top_n: int = 30, generate_pl
 
     print(f"Using modularity attribute: '{attr}'")
 
-    # Collect meshes per class
-    class_mesh_counts = defaultdict(Counter)
-    seen_classes = set()
+    if processes is None:
+        # Collect meshes per class as interned term ids; with the split cache
+        # the ids of every node come straight from the cache file
+        names = MESH_ID_ATTRIBUTES if resolve_ids_from else MESH_ATTRIBUTES
+        cache = None
+        if use_cache:
+            cache = load_split_cache(gexf_path, G, names, split_mesh_terms, "mesh_id" if resolve_ids_from else "mesh")
+        counter = ClassTermCounter()
+        if cache is not None:
+            to_counter_ids = IdRemap(cache.terms, counter.terms)
+        seen_classes = set()
 
-    for _, data in G.nodes(data=True):
-        cls = data.get(attr)
-        if cls is None:
-            continue
-        # normalize class to int when possible
-        try:
-            cls_int = int(cls)
-        except Exception:
-            cls_int = cls
-        seen_classes.add(cls_int)
-        mesh = data.get("mesh") or data.get("MESH") or data.get("Mesh")
-        terms = split_mesh_terms(mesh)
-        class_mesh_counts[cls_int].update(terms)
-
-    if generate_plots:
-        # Iterate over modularity mapping (only those present in the graph)
-        for cls, meta in MODULARITY_META.items():
-            if cls not in seen_classes:
-                print(f"Class {cls} not present in graph, skipping")
+        for node, data in G.nodes(data=True):
+            cls = data.get(attr)
+            if cls is None:
                 continue
-
-            counts = class_mesh_counts.get(cls, Counter())
-            if not counts:
-                print(f"No mesh terms found for class {cls}, skipping plot")
+            # normalize class to int when possible
+            try:
+                cls_int = int(cls)
+            except Exception:
+                cls_int = cls
+            seen_classes.add(cls_int)
+            if cache is not None:
+                counter.add_ids(cls_int, to_counter_ids(cache.term_ids_of(node)))
                 continue
+            mesh = next((data[n] for n in names if data.get(n)), None)
+            terms = split_mesh_terms(mesh)
+            counter.add(cls_int, terms)
+        matrix = counter.to_matrix()
 
-            # Save full counts to CSV
-            csv_path = out_dir / f"mesh_counts_mod_{cls}_{sanitize_filename(meta['label'])}.csv"
-            df = pd.DataFrame(counts.most_common(), columns=["mesh_term", "count"]) 
-            df.to_csv(csv_path, index=False)
-
-            # Plot top N
-            top = df.head(top_n)
-            labels = top['mesh_term'].tolist()[::-1]
-            values = top['count'].tolist()[::-1]
-
-            plt.figure(figsize=(10, max(4, len(labels) * 0.25)))
-            color = meta.get('color', '#333333')
-            plt.barh(labels, values, color=color)
-            plt.xlabel('Frequency')
-            plt.title(meta.get('displaylabel', meta.get('label', f'Modularity {cls}')))
-            plt.tight_layout()
-
-            png_path = out_dir / f"mesh_hist_mod_{cls}_{sanitize_filename(meta['label'])}.png"
-            plt.savefig(png_path, dpi=150)
-            plt.close()
-
-            print(f"Saved histogram and CSV for class {cls}: {png_path}, {csv_path}")
-
-        # Handle classes present in graph but not in mapping: create files using class id
-        unmapped = [c for c in seen_classes if c not in MODULARITY_META]
-        for cls in unmapped:
-            counts = class_mesh_counts.get(cls, Counter())
-            if not counts:
-                continue
-            label = f"Modularity_{cls}"
-            csv_path = out_dir / f"mesh_counts_mod_{cls}_{sanitize_filename(label)}.csv"
-            df = pd.DataFrame(counts.most_common(), columns=["mesh_term", "count"]) 
-            df.to_csv(csv_path, index=False)
-            top = df.head(top_n)
-            labels = top['mesh_term'].tolist()[::-1]
-            values = top['count'].tolist()[::-1]
-            plt.figure(figsize=(10, max(4, len(labels) * 0.25)))
-            plt.barh(labels, values, color="#666666")
-            plt.xlabel('Frequency')
-            plt.title(label)
-            plt.tight_layout()
-            png_path = out_dir / f"mesh_hist_mod_{cls}_{sanitize_filename(label)}.png"
-            plt.savefig(png_path, dpi=150)
-            plt.close()
-            print(f"Saved histogram and CSV for unmapped class {cls}: {png_path}, {csv_path}")
+    if resolve_ids_from:
+        # counted by UI, names are only looked up for the UIs seen
+        matrix = resolve_mesh_ids(matrix, resolve_ids_from)
+
+    # QA report lists the literal terms, also when rolling up
+    all_terms = matrix.terms_seen()
+
+    prefix = "mesh"
+    if rollup_depth is not None:
+        matrix, unresolved = rollup_counts(matrix, tree_numbers, rollup_depth)
+        prefix = f"mesh_depth{rollup_depth}"
+        unresolved_path = out_dir / f"{prefix}_terms_without_tree_numbers.txt"
+        with open(unresolved_path, 'w') as f:
+            f.write("\n".join(unresolved) + ("\n" if unresolved else ""))
+        print(f"Rolled up MeSH terms to tree depth {rollup_depth}; "
+              f"{len(unresolved)} terms without tree numbers listed in {unresolved_path}")
+
+    if generate_plots:
+        # mapped classes (only those present in the graph), then unmapped ones by class id
+        jobs = write_class_outputs(matrix, out_dir, seen_classes, MODULARITY_META, prefix, "mesh_term",
+                                   top_n=top_n, what="mesh terms")
+        render_figures(jobs, out_dir, processes=render_processes)
     else:
         print("Skipping histogram and CSV generation (--no-plots flag used)")
-    
+
     # Generate QA report: all unique mesh terms processed
-    all_terms = set()
-    for counts in class_mesh_counts.values():
-        all_terms.update(counts.keys())
-    
-    all_terms_sorted = sorted(all_terms)
-    qa_path = out_dir / "all_mesh_terms_processed.txt"
-    with open(qa_path, 'w') as f:
-        f.write(f"Total unique MESH terms processed: {len(all_terms_sorted)}\n")
-        f.write("=" * 80 + "\n\n")
-        for term in all_terms_sorted:
-            f.write(f"{term}\n")
-    print(f"\nQA report saved to: {qa_path}")
+    write_qa_report(all_terms, out_dir / "all_mesh_terms_processed.txt", "MESH terms")
 
 
 def main(argv):
     if len(argv) < 2:
-        print("Usage: python scripts/mesh_histograms_by_modularity.py path/to/graph.gexf [out_dir] [--no-plots]")
+        print("Usage: python -m scripts.mesh_histograms_by_modularity path/to/graph.gexf [out_dir] [--no-plots]")
         print("\nOptions:")
         print("  --no-plots    Skip histogram and CSV generation (QA report will still be created)")
+        print("  --rollup-depth N    Count terms under their MeSH tree ancestors at depth N")
+        print("  --mesh-vocab PATH   MeSH CSV or .sqlite vocabulary with tree numbers (needed for --rollup-depth)")
+        print("  --processes N       Count terms over chunks of the GEXF on N worker processes")
+        print("  --render-processes N  Render histograms on N worker processes (default: all cores)")
+        print("  --resolve-ids       Count the mesh_id UIs and name them through --mesh-vocab")
+        print("  --no-cache          Split the mesh attributes again instead of using the per-graph split cache")
         return 1
-    gexf_path = Path(argv[1])
+
+    # Parse arguments: flags (with their values) first, then positional ones
+    generate_plots = "--no-plots" not in argv
+    rollup_depth = None
+    vocab_path = None
+    processes = None
+    render_processes = None
+    positional = []
+    i = 1
+    while i < len(argv):
+        if argv[i] == "--rollup-depth" and i + 1 < len(argv):
+            rollup_depth = int(argv[i + 1])
+            i += 2
+        elif argv[i] == "--processes" and i + 1 < len(argv):
+            processes = int(argv[i + 1])
+            i += 2
+        elif argv[i] == "--render-processes" and i + 1 < len(argv):
+            render_processes = int(argv[i + 1])
+            i += 2
+        elif argv[i] == "--mesh-vocab" and i + 1 < len(argv):
+            vocab_path = Path(argv[i + 1])
+            i += 2
+        else:
+            if not argv[i].startswith("--"):
+                positional.append(argv[i])
+            i += 1
+
+    if not positional:
+        print("Missing path/to/graph.gexf")
+        return 1
+    gexf_path = Path(positional[0])
     if not gexf_path.exists():
         print(f"GEXF file not found: {gexf_path}")
         return 1
-    
-    # Parse arguments
-    generate_plots = "--no-plots" not in argv
-    out_dir_idx = 2
-    if generate_plots and len(argv) > 2:
-        out_dir = Path(argv[out_dir_idx])
-    elif not generate_plots and len(argv) > 2:
-        # Check if argv[2] is a flag or directory
-        out_dir = Path(argv[out_dir_idx]) if argv[out_dir_idx] != "--no-plots" else gexf_path.parent / "mesh_histograms"
-    else:
-        out_dir = gexf_path.parent / "mesh_histograms"
-    
-    make_histograms(gexf_path, out_dir, generate_plots=generate_plots)
+    out_dir = Path(positional[1]) if len(positional) > 1 else gexf_path.parent / "mesh_histograms"
+
+    tree_numbers = None
+    if rollup_depth is not None:
+        if rollup_depth < 1:
+            print("--rollup-depth must be at least 1")
+            return 1
+        if vocab_path is None or not vocab_path.exists():
+            print("--rollup-depth needs an existing --mesh-vocab file (MeSH CSV or .sqlite vocabulary)")
+            return 1
+        tree_numbers = load_tree_numbers(vocab_path)
+        print(f"Loaded tree numbers for {len(tree_numbers)} MeSH headings from {vocab_path}")
+
+    resolve_ids_from = None
+    if "--resolve-ids" in argv:
+        if vocab_path is None or not vocab_path.exists():
+            print("--resolve-ids needs an existing --mesh-vocab file (MeSH CSV or .sqlite vocabulary)")
+            return 1
+        resolve_ids_from = vocab_path
+
+    make_histograms(gexf_path, out_dir, generate_plots=generate_plots,
+                    rollup_depth=rollup_depth, tree_numbers=tree_numbers, processes=processes,
+                    resolve_ids_from=resolve_ids_from, use_cache="--no-cache" not in argv,
+                    render_processes=render_processes)
     return 0
 
 
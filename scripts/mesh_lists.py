@@ -0,0 +1,71 @@
+"""Comma-safe storage of MeSH descriptor lists.
+
+Many MeSH headings contain commas ("Behavior, Animal"), so joining them with
+', ' is ambiguous. MeSH terms and UIs are stored as JSON arrays instead, both
+in CSV columns and in GEXF string attributes, and as list<string> columns in
+Parquet. Values written by the old pipeline (comma or semicolon separated)
+are still decoded.
+"""
+import json
+
+import pandas as pd
+
+
+def encode_mesh_list(values) -> str:
+    """JSON array string for a list of MeSH terms or UIs."""
+    return json.dumps(list(values), ensure_ascii=False)
+
+
+def _json_array(s: str):
+    """The list a JSON array string decodes to, or None if it is not one."""
+    if not s.startswith('['):
+        return None
+    try:
+        decoded = json.loads(s)
+    except json.JSONDecodeError:
+        # legacy values such as '[Behavior, Animal]' only look like JSON
+        return None
+    return decoded if isinstance(decoded, list) else None
+
+
+def is_mesh_list(value) -> bool:
+    """Whether a stored value is a JSON array written by encode_mesh_list."""
+    return isinstance(value, str) and _json_array(value.strip()) is not None
+
+
+def decode_mesh_list(value) -> list:
+    """
+    Decode a stored MeSH value into a list of strings.
+
+    Args:
+        value: JSON array string, list, legacy '; ' / ', ' joined string, or NaN
+
+    Returns:
+        list of stripped, non-empty strings
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if pd.isna(value):
+        return []
+    s = str(value).strip()
+    if not s:
+        return []
+    decoded = _json_array(s)
+    if decoded is not None:
+        return [str(v).strip() for v in decoded if str(v).strip()]
+    if s.startswith('[') and s.endswith(']'):
+        s = s[1:-1]
+    # legacy strings: semicolons when repaired, commas otherwise
+    parts = s.split(';') if ';' in s else s.split(',')
+    return [p.strip() for p in parts if p.strip()]
+
+
+def mesh_lists_to_parquet(df: pd.DataFrame, path, columns=('MESH', 'MESH_ID')):
+    """Write df to Parquet with the given MeSH columns as list<string> columns."""
+    out = df.copy()
+    for column in columns:
+        if column in out.columns:
+            out[column] = out[column].map(decode_mesh_list)
+    out.to_parquet(path, index=False)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Build and query an indexed MeSH vocabulary stored in SQLite.
+
+The vocabulary is built once from the NLM MeSH ASCII descriptor dump
+(`d2025.bin`) and keeps three indexed tables:
+
+  descriptors(ui, mh)      UI -> main heading
+  entry_terms(term, ui)    heading, ENTRY and PRINT ENTRY terms -> UI
+                           (case-insensitive lookups)
+  tree_numbers(ui, mn)     UI -> MN tree numbers
+
+Scripts open the database with `MeshVocabulary` instead of re-reading the
+MeSH CSV on every run.
+
+Usage:
+    python -m scripts.mesh_vocabulary d2025.bin [MeSH_vocabulary.sqlite]
+"""
+from pathlib import Path
+import sys
+import sqlite3
+
+from scripts.parse_mesh_ascii_to_csv import iter_mesh_records
+
+
+SCHEMA = '''
+CREATE TABLE descriptors (ui TEXT PRIMARY KEY, mh TEXT NOT NULL);
+CREATE TABLE entry_terms (term TEXT NOT NULL COLLATE NOCASE, ui TEXT NOT NULL);
+CREATE TABLE tree_numbers (ui TEXT NOT NULL, mn TEXT NOT NULL);
+'''
+INDEXES = '''
+CREATE INDEX entry_terms_term ON entry_terms (term);
+CREATE INDEX tree_numbers_ui ON tree_numbers (ui);
+CREATE INDEX descriptors_mh ON descriptors (mh COLLATE NOCASE);
+'''
+
+
+def _entry_term(value):
+    # ENTRY values may carry extra '|'-separated fields after the term itself
+    return value.split('|', 1)[0].strip()
+
+
+def build_vocabulary(mesh_ascii_path, db_path, batch_size=5000):
+    """
+    Build the SQLite vocabulary from a MeSH ASCII descriptor file.
+
+    Args:
+        mesh_ascii_path: path to d20XX.bin
+        db_path: database to (re)create
+        batch_size: records inserted per executemany call
+
+    Returns:
+        number of descriptors stored
+    """
+    db_path = Path(db_path)
+    if db_path.exists():
+        db_path.unlink()
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+
+    descriptors, terms, trees = [], [], []
+
+    def flush():
+        conn.executemany('INSERT OR REPLACE INTO descriptors VALUES (?, ?)', descriptors)
+        conn.executemany('INSERT INTO entry_terms VALUES (?, ?)', terms)
+        conn.executemany('INSERT INTO tree_numbers VALUES (?, ?)', trees)
+        descriptors.clear()
+        terms.clear()
+        trees.clear()
+
+    n = 0
+    with conn:
+        for record in iter_mesh_records(mesh_ascii_path):
+            ui = record.get('UI', [''])[0].strip()
+            mh = record.get('MH', [''])[0].strip()
+            if not ui or not mh:
+                continue
+            descriptors.append((ui, mh))
+            names = {mh}
+            for tag in ('ENTRY', 'PRINT ENTRY'):
+                names.update(_entry_term(v) for v in record.get(tag, ()))
+            terms.extend((name, ui) for name in names if name)
+            trees.extend((ui, mn.strip()) for mn in record.get('MN', ()) if mn.strip())
+            n += 1
+            if n % batch_size == 0:
+                flush()
+        flush()
+        conn.executescript(INDEXES)
+    conn.close()
+    return n
+
+
+class MeshVocabulary:
+    """
+    Read-only lookups on a vocabulary built by build_vocabulary.
+
+    Can be used as a context manager to close the connection.
+    """
+
+    def __init__(self, db_path):
+        db_path = Path(db_path)
+        if not db_path.exists():
+            raise FileNotFoundError(f'MeSH vocabulary not found: {db_path}')
+        self.conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def heading(self, ui):
+        """Main heading of a UI, or None."""
+        row = self.conn.execute('SELECT mh FROM descriptors WHERE ui = ?', (ui,)).fetchone()
+        return row[0] if row else None
+
+    def ui_for_term(self, term):
+        """UI of a heading or entry term (case-insensitive), or None."""
+        row = self.conn.execute('SELECT ui FROM entry_terms WHERE term = ? LIMIT 1', (term.strip(),)).fetchone()
+        return row[0] if row else None
+
+    def tree_numbers(self, ui):
+        """Sorted MN tree numbers of a UI."""
+        rows = self.conn.execute('SELECT mn FROM tree_numbers WHERE ui = ? ORDER BY mn', (ui,))
+        return [r[0] for r in rows]
+
+    def heading_map(self):
+        """Dict UI -> main heading for every descriptor."""
+        return dict(self.conn.execute('SELECT ui, mh FROM descriptors'))
+
+    def tree_number_map(self):
+        """Dict main heading -> list of tree numbers for every descriptor."""
+        mapping = {}
+        rows = self.conn.execute(
+            'SELECT d.mh, t.mn FROM tree_numbers t JOIN descriptors d ON d.ui = t.ui ORDER BY t.mn'
+        )
+        for mh, mn in rows:
+            mapping.setdefault(mh, []).append(mn)
+        return mapping
+
+
+def main(argv):
+    if len(argv) < 2:
+        print('Usage: python -m scripts.mesh_vocabulary d2025.bin [MeSH_vocabulary.sqlite]')
+        return 1
+    inp = Path(argv[1])
+    if not inp.exists():
+        print('Input file not found:', inp)
+        return 1
+    out = Path(argv[2]) if len(argv) > 2 else Path('MeSH_vocabulary.sqlite')
+
+    print(f'Building MeSH vocabulary from {inp} into {out}')
+    n = build_vocabulary(inp, out)
+    print(f'Stored {n} descriptors')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main(sys.argv))
@@ -11,9 +11,13 @@ MN - F01.145.500
 
 This script parses all tags found and writes a CSV where each tag is a column.
 If a tag appears multiple times for an entry, values are joined with '||'.
+Rows are streamed out while parsing, using the known descriptor schema
+(MESH_DESCRIPTOR_TAGS) or, with --discover-tags, the tags found by a quick
+pre-scan of the file. With a .parquet output path, tags are written as
+list-of-string columns instead of '||'-joined strings (needs pyarrow).
 
 Usage:
-    python scripts/parse_mesh_ascii_to_csv.py path/to/mesh_ascii.txt [out.csv]
+    python -m scripts.parse_mesh_ascii_to_csv path/to/mesh_ascii.txt [out.csv|out.parquet] [--discover-tags]
 
 """
 from pathlib import Path
@@ -23,8 +27,37 @@ import re
 from collections import defaultdict
 
 
-def parse_mesh_ascii(path):
-    entries = []
+# "TAG - value" or "TAG = value"; the tag may not contain '-', ':' or '='
+TAG_LINE_RE = re.compile(r'^(?P<tag>[^\-:=]+?)\s*[-=]\s*(?P<val>.*)$')
+WHITESPACE_RE = re.compile(r'\s+')
+_TAG_STOP_CHARS = frozenset('-:=')
+
+
+def _split_tag_line(line):
+    """Return (tag, value) for a tag line, or None if the line is not one."""
+    # fast path: the usual "TAG = value" / "TAG - value" layout
+    for delimiter in (' = ', ' - '):
+        idx = line.find(delimiter)
+        if idx > 0:
+            tag = line[:idx]
+            if _TAG_STOP_CHARS.isdisjoint(tag):
+                tag = tag.strip()
+                if tag:
+                    return tag, line[idx + 3:].strip()
+            break
+
+    m = TAG_LINE_RE.match(line)
+    if m:
+        return m.group('tag').strip(), m.group('val').strip()
+    # fallback: split on first two chars and rest (some files use fixed width)
+    if len(line) > 3 and line[2] == ' ':
+        return line[:2].strip(), line[3:].strip()
+    # unknown format: skip
+    return None
+
+
+def iter_mesh_records(path):
+    """Yield one dict (tag -> list of values) per MeSH entry, reading the file line by line."""
     cur = defaultdict(list)
     last_tag = None
 
@@ -34,82 +67,150 @@ def parse_mesh_ascii(path):
             if not line.strip():
                 # end of entry
                 if cur:
-                    entries.append(dict(cur))
+                    yield dict(cur)
                     cur = defaultdict(list)
                     last_tag = None
                 continue
 
             # continuation lines start with whitespace
-            if line.startswith(' ') or line.startswith('\t'):
+            if line[0] in ' \t':
                 if last_tag is not None and cur[last_tag]:
                     # append continuation to last value
                     cur[last_tag][-1] = cur[last_tag][-1] + ' ' + line.strip()
                 continue
 
-            # Try common delimiters: ' - ' or ' = '
-            m = re.match(r'^(?P<tag>[^\-:=]+?)\s*-\s*(?P<val>.*)$', line)
-            if not m:
-                m = re.match(r'^(?P<tag>[^\-:=]+?)\s*=\s*(?P<val>.*)$', line)
-            if not m:
-                # fallback: split on first two chars and rest (some files use fixed width)
-                if len(line) > 3 and line[2] == ' ':
-                    tag = line[:2].strip()
-                    val = line[3:].strip()
-                else:
-                    # unknown format: skip
-                    continue
-            else:
-                tag = m.group('tag').strip()
-                val = m.group('val').strip()
+            parsed = _split_tag_line(line)
+            if parsed is None:
+                continue
+            tag, val = parsed
 
             # normalize tag (keep as-is but collapse internal spaces)
-            tag = re.sub(r'\s+', ' ', tag)
+            if '  ' in tag or '\t' in tag:
+                tag = WHITESPACE_RE.sub(' ', tag)
 
             cur[tag].append(val)
             last_tag = tag
 
-    # append last entry if file doesn't end with blank line
+    # last entry if file doesn't end with blank line
     if cur:
-        entries.append(dict(cur))
+        yield dict(cur)
+
+
+def parse_mesh_ascii(path):
+    return list(iter_mesh_records(path))
+
 
-    return entries
+# Data elements of MeSH descriptor records (d20XX.bin), used as the CSV schema
+MESH_DESCRIPTOR_TAGS = (
+    'AN', 'AQ', 'CATSH', 'CX', 'DA', 'DC', 'DX', 'EC', 'ENTRY', 'FX', 'GM', 'HN',
+    'M66', 'M75', 'M80', 'M85', 'M90', 'M94', 'MED', 'MH', 'MH_TH', 'MN', 'MR', 'MS',
+    'N1', 'OL', 'PA', 'PI', 'PM', 'PRINT ENTRY', 'RECTYPE', 'RH', 'RN', 'RR', 'ST', 'UI',
+)
 
 
-def entries_to_csv(entries, out_path):
-    # collect all tags
+def discover_tags(path):
+    """Quick pre-scan returning the sorted set of tags used in the file."""
     tags = set()
-    for e in entries:
-        tags.update(e.keys())
-    tags = sorted(tags)
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.strip() or line[0] in ' \t':
+                continue
+            parsed = _split_tag_line(line.rstrip('\n'))
+            if parsed is not None:
+                tags.add(WHITESPACE_RE.sub(' ', parsed[0]))
+    return sorted(tags)
+
+
+def entries_to_csv(entries, out_path, tags=None):
+    """Write entries as CSV rows, one column per tag.
+
+    With `tags` the rows are written as they come (entries can be the
+    iter_mesh_records generator); tags outside the schema are dropped and
+    counted. Without `tags` all entries are loaded first to collect them.
+    Returns the number of rows written and the per-tag count of dropped values.
+    """
+    if tags is None:
+        entries = list(entries)
+        # collect all tags
+        tags = set()
+        for e in entries:
+            tags.update(e.keys())
+        tags = sorted(tags)
+    known = frozenset(tags)
+    dropped = defaultdict(int)
+    n_rows = 0
 
-    with open(out_path, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(out_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(tags)
         for e in entries:
-            row = []
+            for t in e.keys() - known:
+                dropped[t] += len(e[t])
+            # join multiple values with '||' to preserve commas inside
+            writer.writerow(['||'.join(e[t]) if t in e else '' for t in tags])
+            n_rows += 1
+    return n_rows, dict(dropped)
+
+
+def entries_to_parquet(entries, out_path, tags, batch_size=10000):
+    """Stream entries to Parquet with one list<string> column per tag."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Parquet output needs pyarrow (pip install pyarrow)') from e
+
+    schema = pa.schema([(t, pa.list_(pa.string())) for t in tags])
+    known = frozenset(tags)
+    dropped = defaultdict(int)
+    n_rows = 0
+    columns = {t: [] for t in tags}
+
+    def flush(writer):
+        writer.write_table(pa.table(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for e in entries:
+            for t in e.keys() - known:
+                dropped[t] += len(e[t])
             for t in tags:
-                if t in e:
-                    vals = e[t]
-                    # join multiple values with '||' to preserve commas inside
-                    row.append('||'.join(v for v in vals))
-                else:
-                    row.append('')
-            writer.writerow(row)
+                columns[t].append(e.get(t, []))
+            n_rows += 1
+            if n_rows % batch_size == 0:
+                flush(writer)
+        if n_rows % batch_size:
+            flush(writer)
+    return n_rows, dict(dropped)
 
 
 def main(argv):
-    if len(argv) < 2:
-        print('Usage: parse_mesh_ascii_to_csv.py path/to/mesh_ascii.txt [out.csv]')
+    args = [a for a in argv if not a.startswith('--')]
+    if len(args) < 2:
+        print('Usage: python -m scripts.parse_mesh_ascii_to_csv path/to/mesh_ascii.txt [out.csv|out.parquet] [--discover-tags]')
         return 1
-    inp = Path(argv[1])
+    inp = Path(args[1])
     if not inp.exists():
         print('Input file not found:', inp)
         return 1
-    out = Path(argv[2]) if len(argv) > 2 else inp.with_suffix('.csv')
-
-    entries = parse_mesh_ascii(inp)
-    print(f'Parsed {len(entries)} MeSH entries, writing CSV to {out}')
-    entries_to_csv(entries, out)
+    out = Path(args[2]) if len(args) > 2 else inp.with_suffix('.csv')
+
+    if '--discover-tags' in argv:
+        tags = discover_tags(inp)
+        print(f'Found {len(tags)} tags: {", ".join(tags)}')
+    else:
+        tags = list(MESH_DESCRIPTOR_TAGS)
+
+    print(f'Parsing MeSH entries from {inp}, writing to {out}')
+    if out.suffix == '.parquet':
+        n_rows, dropped = entries_to_parquet(iter_mesh_records(inp), out, tags)
+    else:
+        n_rows, dropped = entries_to_csv(iter_mesh_records(inp), out, tags)
+    print(f'Wrote {n_rows} MeSH entries')
+    if dropped:
+        print('Tags not in the schema were dropped (use --discover-tags to keep them):',
+              ', '.join(f'{t} ({n})' for t, n in sorted(dropped.items())))
     return 0
 
 
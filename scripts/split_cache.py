@@ -0,0 +1,187 @@
+"""Per-graph cache of split node attribute values.
+
+Splitting the `mesh` and `keywords` strings of every node (JSON decoding,
+the ';' vs ',' decision, bracket-aware comma splitting, stripping) is done
+again on every histogram and QA run, although the graph rarely changes. The
+split terms of one attribute are stored once per GEXF file as an .npz:
+
+  node_ids, node_id_offsets   UTF-8 bytes of every node id, in graph order
+  offsets                     terms of node i are term_ids[offsets[i]:offsets[i + 1]]
+  term_ids                    int32 ids into terms
+  terms, term_offsets         UTF-8 bytes of the distinct terms, first-seen order
+
+Strings are stored as one byte array plus offsets, so a single very long
+keyword does not widen every entry as a fixed-width unicode array would.
+
+The file name holds the SHA-256 of the GEXF contents, so an edited graph
+gets a new cache and stale files are never read. The digest is kept in
+digests.json in the cache folder and reused while the GEXF's size and
+mtime are unchanged, so an unchanged graph is not hashed again.
+
+Both files are written to a unique temporary file and renamed into place, so
+several processes can fill the same cache folder at once (e.g. stages run in
+parallel by run_replication.py); an unreadable digests.json is treated as
+empty.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from scripts.term_counting import TermDictionary
+
+# bump when a split function or the values given to it change
+SPLIT_CACHE_VERSION = 3
+CACHE_DIR_NAME = ".split_cache"
+DIGESTS_FILE = "digests.json"
+
+
+def file_digest(path, block_size=1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _replacing(path, mode='wb'):
+    """File object writing to a unique temporary file that replaces path once the block succeeds."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(mode, dir=path.parent, prefix=path.name + '.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            yield f
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+def _read_digests(digests_path: Path) -> dict:
+    try:
+        with open(digests_path) as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return recorded if isinstance(recorded, dict) else {}
+
+
+def cached_file_digest(path, cache_dir) -> str:
+    """file_digest of path, reusing the one recorded in cache_dir while size and mtime are unchanged."""
+    path = Path(path).resolve()
+    digests_path = Path(cache_dir) / DIGESTS_FILE
+    recorded = _read_digests(digests_path)
+    stat = path.stat()
+    entry = recorded.get(str(path))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_digest(path)
+    # re-read: another process may have recorded other files meanwhile
+    recorded = _read_digests(digests_path)
+    recorded[str(path)] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    with _replacing(digests_path, 'w') as f:
+        json.dump(recorded, f, indent=1, sort_keys=True)
+    return digest
+
+
+def _pack_strings(strings):
+    """UTF-8 bytes of all strings as one uint8 array, plus their offsets."""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> list:
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+class SplitTermCache:
+    """Split terms of one node attribute for every node of a graph."""
+
+    def __init__(self, node_ids, offsets: np.ndarray, term_ids: np.ndarray, terms):
+        self.node_ids = list(node_ids)
+        self.offsets = offsets
+        self.term_ids = term_ids
+        self.terms = list(terms)
+        self._index = {node: i for i, node in enumerate(self.node_ids)}
+
+    @classmethod
+    def build(cls, G, attributes, split_fn) -> "SplitTermCache":
+        """
+        Split the first non-empty attribute of `attributes` on every node of G.
+
+        Args:
+            G: networkx graph
+            attributes: candidate attribute names, first non-empty one wins
+            split_fn: function value -> list of terms
+        """
+        dictionary = TermDictionary()
+        node_ids, offsets, term_ids = [], [0], []
+        for node, data in G.nodes(data=True):
+            value = next((data[n] for n in attributes if data.get(n)), None)
+            term_ids.extend(dictionary.intern_many(split_fn(value)))
+            node_ids.append(node)
+            offsets.append(len(term_ids))
+        return cls(node_ids, np.asarray(offsets, dtype=np.int64), np.asarray(term_ids, dtype=np.int32),
+                   dictionary.terms)
+
+    @classmethod
+    def load(cls, path) -> "SplitTermCache":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(_unpack_strings(data['node_ids'], data['node_id_offsets']), data['offsets'], data['term_ids'],
+                       _unpack_strings(data['terms'], data['term_offsets']))
+
+    def save(self, path):
+        node_ids, node_id_offsets = _pack_strings(self.node_ids)
+        terms, term_offsets = _pack_strings(self.terms)
+        # an interrupted or concurrent run never leaves a partly written cache under path
+        with _replacing(path) as f:
+            np.savez(f, node_ids=node_ids, node_id_offsets=node_id_offsets, offsets=self.offsets,
+                     term_ids=self.term_ids, terms=terms, term_offsets=term_offsets)
+
+    def term_ids_of(self, node) -> np.ndarray:
+        i = self._index[node]
+        return self.term_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def terms_of(self, node) -> list:
+        return [self.terms[t] for t in self.term_ids_of(node)]
+
+
+def load_split_cache(gexf_path, G, attributes, split_fn, name: str, cache_dir=None) -> SplitTermCache:
+    """
+    Cached split terms of a graph attribute, built and saved on first use.
+
+    Args:
+        gexf_path: GEXF file G was read from (its hash keys the cache)
+        G: the graph read from gexf_path
+        attributes: candidate attribute names, first non-empty one wins
+        split_fn: function value -> list of terms
+        name: cache name of the attribute/split combination, e.g. "mesh"
+        cache_dir: cache folder (default: .split_cache next to the GEXF)
+
+    Returns:
+        SplitTermCache
+    """
+    gexf_path = Path(gexf_path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else gexf_path.parent / CACHE_DIR_NAME
+    digest = cached_file_digest(gexf_path, cache_dir)[:16]
+    path = cache_dir / f"{gexf_path.stem}.{name}.v{SPLIT_CACHE_VERSION}.{digest}.npz"
+    if path.exists():
+        print(f"Using cached split '{name}' terms: {path}")
+        return SplitTermCache.load(path)
+
+    cache = SplitTermCache.build(G, attributes, split_fn)
+    cache.save(path)
+    print(f"Cached split '{name}' terms of {len(cache.node_ids)} nodes: {path}")
+    return cache
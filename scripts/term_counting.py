@@ -0,0 +1,228 @@
+"""Per-class term counting on interned integer ids.
+
+Instead of updating one Counter of strings per class, every term is interned
+once into an int32 id and (class, term id) pairs are appended to compact
+arrays. Counts are then computed in one np.bincount call into a sparse
+class x term matrix (ClassTermMatrix), and ids are mapped back to strings
+only when the results are written out.
+"""
+from array import array
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class TermDictionary:
+    """Bidirectional mapping between terms and dense int32 ids."""
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+
+    def __len__(self):
+        return len(self.terms)
+
+    def intern(self, term: str) -> int:
+        """Id of term, assigning the next free id on first use."""
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def intern_many(self, terms) -> list:
+        return [self.intern(t) for t in terms]
+
+    def term(self, term_id: int) -> str:
+        return self.terms[term_id]
+
+
+class IdRemap:
+    """
+    Map ids of a fixed term list (e.g. a split cache) to ids of a TermDictionary.
+
+    A term is interned into the target (through `transform`, e.g. a synonym
+    lookup) the first time one of its ids is mapped, so the target only holds
+    terms that are actually counted, in the order they are first seen, as if
+    the terms had been interned directly.
+    """
+
+    def __init__(self, source_terms, target: TermDictionary, transform=None):
+        self.source_terms = source_terms
+        self.target = target
+        self.transform = transform
+        self.ids = np.full(len(source_terms), -1, dtype=np.int32)
+
+    def __call__(self, source_ids: np.ndarray) -> np.ndarray:
+        mapped = self.ids[source_ids]
+        if (mapped < 0).any():
+            for i in source_ids[mapped < 0].tolist():
+                if self.ids[i] < 0:
+                    term = self.source_terms[i]
+                    self.ids[i] = self.target.intern(self.transform(term) if self.transform else term)
+            mapped = self.ids[source_ids]
+        return mapped
+
+
+class ClassTermCounter:
+    """
+    Collect (class, term) occurrences and count them per class with np.bincount.
+
+    Classes can be any hashable (ints or strings); they are interned like terms.
+    """
+
+    def __init__(self, terms: TermDictionary = None):
+        self.terms = terms if terms is not None else TermDictionary()
+        self.classes = TermDictionary()
+        self._class_ids = array('i')
+        self._term_ids = array('i')
+        self._weights = array('i')
+
+    def add(self, cls, terms):
+        """Record one occurrence of each term for cls."""
+        term_ids = self.terms.intern_many(terms)
+        self._class_ids.extend([self.classes.intern(cls)] * len(term_ids))
+        self._term_ids.extend(term_ids)
+        self._weights.extend([1] * len(term_ids))
+
+    def add_ids(self, cls, term_ids: np.ndarray):
+        """Record one occurrence of each already interned term id for cls."""
+        self._class_ids.extend([self.classes.intern(cls)] * len(term_ids))
+        self._term_ids.frombytes(np.asarray(term_ids, dtype=np.int32).tobytes())
+        self._weights.extend([1] * len(term_ids))
+
+    def add_counts(self, cls, term_counts: dict):
+        """Record term -> count occurrences for cls (e.g. a Counter from a worker)."""
+        self._class_ids.extend([self.classes.intern(cls)] * len(term_counts))
+        self._term_ids.extend(self.terms.intern_many(term_counts.keys()))
+        self._weights.extend(term_counts.values())
+
+    def pairs(self):
+        """(class ids, term ids, weights) of every recorded occurrence, in order."""
+        return (np.frombuffer(self._class_ids, dtype=np.int32),
+                np.frombuffer(self._term_ids, dtype=np.int32),
+                np.frombuffer(self._weights, dtype=np.int32))
+
+    def to_matrix(self) -> "ClassTermMatrix":
+        """Sparse class x term counts of everything recorded so far."""
+        n_classes, n_terms = len(self.classes), len(self.terms)
+        class_ids, term_ids, weights = self.pairs()
+        keys = class_ids.astype(np.int64) * n_terms + term_ids
+        # np.unique sorts the pairs row-major, i.e. already in CSR order
+        pairs, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(pairs)).astype(np.int64)
+        rows = pairs // max(n_terms, 1)
+        indptr = np.searchsorted(rows, np.arange(n_classes + 1))
+        matrix = sp.csr_matrix((counts, pairs % max(n_terms, 1), indptr), shape=(n_classes, n_terms))
+        return ClassTermMatrix(matrix, list(self.classes.terms), list(self.terms.terms), first)
+
+    def to_counters(self) -> dict:
+        """Dict class -> Counter of term strings."""
+        return self.to_matrix().to_counters()
+
+
+class ClassTermMatrix:
+    """
+    Sparse (classes x terms) count matrix with its class and term labels.
+
+    Besides the counts, every stored entry keeps the rank of its first
+    occurrence, so per-class lists sorted by count break ties exactly like
+    Counter.most_common did.
+    """
+
+    def __init__(self, counts: sp.csr_matrix, classes: list, terms: list, first: np.ndarray = None):
+        """
+        Args:
+            counts: (classes x terms) CSR matrix with sorted indices
+            classes: label of every row
+            terms: label of every column
+            first: first-occurrence rank of every entry of counts.data
+                (column order when None)
+        """
+        self.counts = counts
+        self.classes = classes
+        self.terms = terms
+        self.first = counts.indices.astype(np.int64) if first is None else np.asarray(first)
+        self._row_of = {cls: r for r, cls in enumerate(classes)}
+
+    @classmethod
+    def from_counters(cls, class_counts: dict) -> "ClassTermMatrix":
+        """Build from a dict class -> Counter (e.g. merged per-chunk Counters)."""
+        counter = ClassTermCounter()
+        for class_label, counts in class_counts.items():
+            counter.add_counts(class_label, counts)
+        return counter.to_matrix()
+
+    def row(self, cls) -> list:
+        """(term, count) pairs of a class sorted by decreasing count, [] if unknown."""
+        r = self._row_of.get(cls)
+        if r is None:
+            return []
+        start, end = self.counts.indptr[r], self.counts.indptr[r + 1]
+        counts = self.counts.data[start:end]
+        order = np.lexsort((self.first[start:end], -counts))
+        columns = self.counts.indices[start:end]
+        return [(self.terms[columns[i]], int(counts[i])) for i in order]
+
+    def terms_seen(self) -> list:
+        """Labels of the terms counted at least once in any class."""
+        return [self.terms[t] for t in np.unique(self.counts.indices)]
+
+    def to_counters(self) -> dict:
+        return {cls: Counter(dict(self.row(cls))) for cls in self.classes}
+
+    def aggregate(self, incidence: sp.csr_matrix, new_terms: list) -> "ClassTermMatrix":
+        """
+        Map terms onto new terms with a (terms x new terms) incidence matrix.
+
+        Counts become counts @ incidence (entries of incidence are multiplicities).
+        The first occurrence of a new term is that of its earliest source term,
+        then its position in that term's incidence row.
+        """
+        # row entry order is kept: it decides ties between new terms of one source term
+        incidence = incidence.tocsr()
+        counts = (self.counts @ incidence).tocsr()
+        counts.eliminate_zeros()
+        counts.sort_indices()
+
+        # expand every stored (class, term) entry into its incidence row
+        coo_rows = np.repeat(np.arange(self.counts.shape[0]), np.diff(self.counts.indptr))
+        lengths = np.diff(incidence.indptr)[self.counts.indices]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        gather = np.repeat(incidence.indptr[self.counts.indices], lengths) + offsets
+        keys = np.repeat(coo_rows, lengths).astype(np.int64) * len(new_terms) + incidence.indices[gather]
+        ranks = np.repeat(self.first, lengths) * (int(lengths.max(initial=0)) + 1) + offsets
+
+        # keep the smallest rank per key; keys sorted row-major match the CSR order
+        order = np.lexsort((ranks, keys))
+        keys, ranks = keys[order], ranks[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = keys[1:] != keys[:-1]
+        return ClassTermMatrix(counts, list(self.classes), list(new_terms), ranks[keep])
+
+
+def incidence_from_mapping(terms: list, mapping: dict):
+    """
+    (terms x targets) incidence matrix of a term -> list of targets mapping.
+
+    A target listed several times for one term counts that many times, like
+    Counter.update(targets) did. New terms are numbered in first-seen order.
+
+    Returns:
+        (csr incidence, target labels, terms without targets)
+    """
+    targets = TermDictionary()
+    rows, cols, values = [], [], []
+    unmapped = []
+    for term_id, term in enumerate(terms):
+        term_targets = mapping.get(term)
+        if not term_targets:
+            unmapped.append(term)
+            continue
+        for target, n in Counter(term_targets).items():
+            rows.append(term_id)
+            cols.append(targets.intern(target))
+            values.append(n)
+    incidence = sp.csr_matrix((np.asarray(values, dtype=np.int64), (rows, cols)), shape=(len(terms), len(targets)))
+    return incidence, targets.terms, unmapped
@@ -1,6 +1,7 @@
 import pandas as pd
 import re
 from pathlib import Path
+from scripts.mesh_lists import decode_mesh_list
 
 def normalize_string(s):
     """
@@ -138,7 +139,7 @@ def transfer_mesh_terms(source_file, target_file, output_file=None):
     print("Processing papers...")
     for idx in range(len(target_df)):
         # Skip if already has MESH terms
-        if pd.notna(target_df.loc[idx, 'MESH']) and target_df.loc[idx, 'MESH'].strip():
+        if decode_mesh_list(target_df.loc[idx, 'MESH']):
             stats['already_had_mesh'] += 1
             continue
         
@@ -185,7 +186,7 @@ def transfer_mesh_terms(source_file, target_file, output_file=None):
         print(f"Unmatched papers saved to: {unmatched_path}")
     
     print("\nSample of transferred MESH terms:")
-    sample = target_df[target_df['MESH'] != ''][['Label', 'MESH', 'MESH_ID']].head(5)
+    sample = target_df[target_df['MESH'].map(decode_mesh_list).map(bool)][['Label', 'MESH', 'MESH_ID']].head(5)
     if not sample.empty:
         print(sample.to_string())
     
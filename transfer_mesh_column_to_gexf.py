@@ -3,6 +3,7 @@ import pandas as pd
 import re
 from pathlib import Path
 from tqdm import tqdm
+from scripts.mesh_lists import decode_mesh_list
 
 def normalize_string(s):
     """
@@ -20,7 +21,8 @@ def find_mesh_for_node_optimized(node_label, node_doi, csv_df, normalized_labels
     """
     Find matching MESH terms from CSV based on node label (title) or DOI
     Uses pre-computed normalized labels cache for faster lookup.
-    Returns (mesh_terms, mesh_ids) or (None, None) if not found
+    Returns (mesh_terms, mesh_ids) as stored in the CSV (JSON arrays from
+    add_mesh_node_attributtes.py) or (None, None) if not found
     """
     # Strategy 1: Try DOI match (most reliable)
     if pd.notna(node_doi) and str(node_doi).strip():
@@ -30,7 +32,7 @@ def find_mesh_for_node_optimized(node_label, node_doi, csv_df, normalized_labels
             row = matches.iloc[0]
             mesh = row.get('MESH', '')
             mesh_id = row.get('MESH_ID', '')
-            if pd.notna(mesh) and str(mesh).strip():
+            if decode_mesh_list(mesh):
                 return str(mesh), str(mesh_id) if pd.notna(mesh_id) else ''
     
     # Strategy 2: Try exact label (title) match
@@ -41,7 +43,7 @@ def find_mesh_for_node_optimized(node_label, node_doi, csv_df, normalized_labels
             row = matches.iloc[0]
             mesh = row.get('MESH', '')
             mesh_id = row.get('MESH_ID', '')
-            if pd.notna(mesh) and str(mesh).strip():
+            if decode_mesh_list(mesh):
                 return str(mesh), str(mesh_id) if pd.notna(mesh_id) else ''
     
     # Strategy 3: Try normalized label match using pre-computed cache (O(1) lookup)
@@ -52,7 +54,7 @@ def find_mesh_for_node_optimized(node_label, node_doi, csv_df, normalized_labels
             row = csv_df.iloc[idx]
             mesh = row.get('MESH', '')
             mesh_id = row.get('MESH_ID', '')
-            if pd.notna(mesh) and str(mesh).strip():
+            if decode_mesh_list(mesh):
                 return str(mesh), str(mesh_id) if pd.notna(mesh_id) else ''
     
     return None, None
@@ -136,7 +138,7 @@ def add_mesh_to_gexf(gexf_file, csv_file, output_file=None):
     print("\nProcessing nodes...")
     for i, (node_id, node_data) in enumerate(tqdm(G.nodes(data=True), total=G.number_of_nodes(), desc="Processing nodes")):
         # Check if already has MESH attribute
-        if 'mesh' in node_data and node_data['mesh']:
+        if decode_mesh_list(node_data.get('mesh')):
             stats['already_had_mesh'] += 1
             continue
         